@@ -1,52 +1,303 @@
 import argparse
-import logging
+import sys
+from pathlib import Path
+from typing import Optional
 import deflate.errors as errors
-from deflate.handlers.compressor import Compressor
-from deflate.handlers.decompressor import Decompressor
+from deflate.handlers import archive, containers
 
+# кодеки, json и logging импортируются в функциях операций: для --help
+# и для коротких запусков не грузится то, что операции не нужно
 
-def compress(path: str, archive_name: str):
-    compressor = Compressor()
-    data_to_decode = compressor.read_from_file(path)
-    encoded_data, time = compressor.compress(data_to_decode, path)
-    compressor.write_archive(archive_name, encoded_data)
-    compress_ratio = compressor.calculate_compress_ratio(len(data_to_decode),
-                                                         len(encoded_data))
+
+def load_dictionary(dictionary_path: str):
+    if not dictionary_path:
+        return None
+    from deflate.handlers import dictionary
+    return dictionary.Dictionary.load(dictionary_path)
+
+
+def compress(path: str, archive_name: str, level: Optional[int], jobs: int,
+             codec: str, container: str, dictionary_path: str,
+             stats_path: str = None, append: bool = False,
+             checksum_type: str = archive.MD5, block_checksums: bool = False):
+    from deflate.handlers.compressor import Compressor, DEFAULT_LEVEL
+    if level is None:
+        level = DEFAULT_LEVEL
+    container = container or containers.get_container(archive_name)
+    preset_dictionary = load_dictionary(dictionary_path)
+    archive_path = Compressor.get_archive_path(archive_name, container)
+    # архив, открытый для записи, обнулил бы сжимаемый файл
+    if archive_path.resolve() == (Path.cwd() / path).resolve():
+        raise errors.ArchiveOverSourceError()
+    # дописывать можно только в уже созданный архив
+    append = append and archive_path.exists()
+    if append and codec is None:
+        codec = get_archive_codec(archive_path, container,
+                                  preset_dictionary)
+    compressor = Compressor(level, codec, container, preset_dictionary,
+                            stats=bool(stats_path),
+                            checksum_type=checksum_type,
+                            block_checksums=block_checksums)
+    if (Path.cwd() / path).is_dir():
+        if append:
+            raise errors.NotAppendableError()
+        with archive_path.open('wb') as dst:
+            original_size, compressed_size, time = \
+                compressor.compress_directory(path, dst, jobs)
+        checksum = 'every file has own checksum'
+    else:
+        with open(Path.cwd() / path, 'rb') as src, \
+                archive_path.open('r+b' if append else 'wb') as dst:
+            compress_stream = compressor.append_stream if append \
+                else compressor.compress_stream
+            original_size, compressed_size, time = \
+                compress_stream(src, dst, path, jobs=jobs)
+        checksum = compressor.checksum.hex() or 'none'
+    compress_ratio = compressor.calculate_compress_ratio(original_size,
+                                                         compressed_size)
     print(f'Compress ratio: {compress_ratio}%\n'
           f'Time: {time}\n'
-          f'Checksum: {compressor.checksum.hex()}\n'
-          f'Archive successfully created')
+          f'Checksum: {checksum}\n'
+          f'Archive successfully {"appended" if append else "created"}')
+    if stats_path:
+        write_stats(stats_path, dict(compressor.stats.to_dict(),
+                                     original_size=original_size,
+                                     compressed_size=compressed_size,
+                                     seconds=time))
+
+
+def get_archive_codec(archive_path: Path, container: str, preset_dictionary):
+    """Get codec of blocks of existing archive."""
+
+    if container != containers.DFA:
+        return None
+    from deflate.handlers.decompressor import Decompressor
+    decompressor = Decompressor(preset_dictionary)
+    with archive_path.open('rb') as src:
+        decompressor.read_header(src, container)
+    if decompressor.flags & archive.DEFLATE_BLOCKS:
+        return archive.DEFLATE_CODEC
+    return archive.LZ77_CODEC
+
+
+def write_stats(stats_path: str, stats: dict):
+    """Write statistics as JSON to file or to stdout, if path is -."""
+
+    import json
+    if stats_path == '-':
+        json.dump(stats, sys.stdout, indent=2)
+        print()
+    else:
+        with open(Path.cwd() / stats_path, 'w') as file:
+            json.dump(stats, file, indent=2)
+
+
+def decode(path: str, jobs: int, container: str, dictionary_path: str,
+           entry: str):
+    from deflate.handlers.compressor import TimeMeasure
+    from deflate.handlers.decompressor import Decompressor
+    decompressor = Decompressor(load_dictionary(dictionary_path))
+    with TimeMeasure() as measure:
+        if decompressor.is_entries_archive(path):
+            if entry:
+                file = Path.cwd() / entry
+                file.parent.mkdir(parents=True, exist_ok=True)
+                with file.open('wb') as dst:
+                    decompressor.extract_entry(path, entry, dst)
+            else:
+                names = decompressor.extract_all(path, jobs=jobs)
+                print(f'Files: {len(names)}')
+        else:
+            with decompressor.map_archive(path) as src:
+                file = decompressor.read_header(
+                    src, container or containers.get_container(path, None))
+                if file is None:
+                    file = Path(path).with_suffix('')
+                with open(Path.cwd() / file, 'wb') as dst:
+                    decompressor.decompress_blocks(src, dst, jobs)
+    print(f'Time: {measure.work_time}\n'
+          f'Archive successfully decompressed')
+
 
+def test(path: str, jobs: int, container: str, dictionary_path: str):
+    from deflate.handlers.compressor import TimeMeasure
+    from deflate.handlers.decompressor import Decompressor
+    decompressor = Decompressor(load_dictionary(dictionary_path))
+    with TimeMeasure() as measure:
+        size = decompressor.test_archive(
+            path, jobs, container or containers.get_container(path, None))
+    print(f'Size: {size}\n'
+          f'Time: {measure.work_time}\n'
+          f'Archive is OK')
 
-def decode(path: str):
-    decompressor = Decompressor()
-    data = decompressor.read_from_archive(path)
-    file, decoded_data = decompressor.decompress(data)
-    decompressor.write_file(file, decoded_data)
-    print('Archive successfully decompressed')
+
+def train(path: str, dictionary_name: str, level: Optional[int],
+          codec: str, size: int):
+    from deflate.handlers import dictionary
+    from deflate.handlers.compressor import Compressor, DEFAULT_LEVEL
+    compressor = Compressor(DEFAULT_LEVEL if level is None else level,
+                            codec)
+    source = Path.cwd() / path
+    # образцы - файлы каталога или строки файла
+    if source.is_dir():
+        samples = [file.read_bytes() for file in sorted(source.rglob('*'))
+                   if file.is_file()]
+    else:
+        samples = source.read_bytes().splitlines(keepends=True)
+    lz77_codec = compressor.create_lz77_codec() \
+        if compressor.codec == archive.LZ77_CODEC else None
+    trained = dictionary.train(samples, size or compressor.history_length,
+                               lz77_codec)
+    dictionary_path = trained.save(dictionary_name or 'dictionary')
+    print(f'Samples: {len(samples)}\n'
+          f'Dictionary size: {len(trained.content)}\n'
+          f'Dictionary ID: {trained.id:08x}\n'
+          f'Dictionary {dictionary_path.name} successfully created')
+
+
+def jobs_count(value: str) -> int:
+    """Parse count of processes: 0 means all CPUs, negative is error."""
+
+    jobs = int(value)
+    if jobs < 0:
+        raise argparse.ArgumentTypeError('count of jobs must not be'
+                                         ' negative')
+    return jobs
 
 
 def create_cmd_parser():
     parser = argparse.ArgumentParser()
-    parser.add_argument('path', default=None,
-                        help='path to file')
+    parser.add_argument('path', nargs='?', default=None,
+                        help='path to file or directory')
     parser.add_argument('-d', '--decode', action='store_true', dest='decode',
                         help='to decode file')
     parser.add_argument('-n', '--name', default="", dest='name',
                         help='to set name for archive')
+    parser.add_argument('-l', '--level', type=int, default=None,
+                        choices=range(1, 10), dest='level',
+                        help='compression level from 1 (fastest)'
+                             ' to 9 (best), 6 by default; 9 uses optimal'
+                             ' parsing, about 4 times slower than 6'
+                             ' with lz77 codec and 15-20 times with'
+                             ' deflate')
+    parser.add_argument('-j', '--jobs', type=jobs_count, default=None,
+                        dest='jobs',
+                        help='to compress independent blocks in parallel'
+                             ' processes, 0 for all CPUs')
+    parser.add_argument('-c', '--codec', default=None, choices=archive.CODECS,
+                        dest='codec',
+                        help='format of blocks: lz77 codewords or'
+                             ' deflate bitstream (RFC 1951), lz77 for dfa'
+                             ' and deflate for gzip and zlib by default')
+    parser.add_argument('-f', '--format', default=None,
+                        choices=containers.CONTAINERS, dest='container',
+                        help='container of archive, by extension of'
+                             ' archive name by default: .dfa, .gz or .zz')
+    parser.add_argument('-t', '--test', action='store_true', dest='test',
+                        help='to check archive by decoding without'
+                             ' writing of files')
+    parser.add_argument('-e', '--entry', default="", dest='entry',
+                        help='to decode only this file of archive'
+                             ' of directory')
+    parser.add_argument('-D', '--dictionary', default="", dest='dictionary',
+                        help='path to preset dictionary (.dfd)')
+    parser.add_argument('--train', action='store_true', dest='train',
+                        help='to train dictionary on samples: files of'
+                             ' directory or lines of file')
+    parser.add_argument('--dictionary-size', type=int, default=None,
+                        dest='dictionary_size',
+                        help='size of trained dictionary, window of codec'
+                             ' by default')
+    parser.add_argument('-a', '--append', action='store_true',
+                        dest='append',
+                        help='to append file to the end of existing archive'
+                             ' without recompression of its data')
+    parser.add_argument('--checksum', default=archive.MD5,
+                        choices=archive.CHECKSUM_TYPES, dest='checksum',
+                        help='checksum of data of dfa archive, md5'
+                             ' by default')
+    parser.add_argument('--block-checksums', action='store_true',
+                        dest='block_checksums',
+                        help='to store CRC-32 of every block of dfa'
+                             ' archive, so damaged block is found early')
+    parser.add_argument('--stats', nargs='?', const='-', default=None,
+                        dest='stats',
+                        help='to write statistics of compression stages'
+                             ' as JSON to file, to stdout by default')
+    parser.add_argument('--batch', nargs='?', const='-', default=None,
+                        dest='batch',
+                        help='to process files, listed one per line in'
+                             ' file (stdin by default), in one process'
+                             ' with the same options')
 
     return parser
 
 
+def run(args, path: str, archive_name: str):
+    """Do operation of command line arguments with file of path."""
+
+    if args.train:
+        train(path, args.name, args.level, args.codec,
+              args.dictionary_size)
+    elif args.test:
+        test(path, args.jobs, args.container, args.dictionary)
+    elif args.decode:
+        decode(path, args.jobs, args.container, args.dictionary,
+               args.entry)
+    else:
+        compress(path, archive_name, args.level, args.jobs,
+                 args.codec, args.container, args.dictionary, args.stats,
+                 args.append, args.checksum, args.block_checksums)
+
+
+def batch(args, list_path: str) -> int:
+    """
+    Do operation with every file of list (stdin, if list_path is -),
+    modules are imported once for all files. Archive of file is named
+    by its path (file.txt.dfa), with --append all files are appended
+    to archive of --name. Error of file is logged, the next files
+    are processed. Return count of failed files.
+    """
+
+    # суффикс добавляется всегда: у file.gz архив file.gz.dfa, а не он сам
+    suffix = containers.SUFFIXES[args.container or containers.DFA]
+    lines = sys.stdin if list_path == '-' \
+        else (Path.cwd() / list_path).read_text().splitlines()
+    failed = 0
+    for line in lines:
+        path = line.rstrip('\r\n')
+        if not path:
+            continue
+        print(f'File: {path}')
+        try:
+            run(args, path, args.name if args.append else path + suffix)
+        except errors.DeflateError as e:
+            log_error(f'{path}: {e.message}')
+            failed += 1
+        except OSError as e:
+            log_error(f'{path}: {e}')
+            failed += 1
+    return failed
+
+
+def log_error(message: str):
+    import logging
+    logging.basicConfig(level=logging.INFO)
+    logging.error(message)
+
+
 if __name__ == '__main__':
     cmd_parser = create_cmd_parser()
     args = cmd_parser.parse_args()
+    if args.batch is not None:
+        if args.path is not None or args.train:
+            cmd_parser.error('--batch can not be used with path'
+                             ' and --train')
+        exit(1 if batch(args, args.batch) else 0)
+    if args.path is None:
+        cmd_parser.error('path or --batch is required')
     try:
-        if args.decode:
-            decode(args.path)
-        else:
-            compress(args.path, args.name)
+        run(args, args.path, args.name)
     except errors.DeflateError as e:
-        logging.basicConfig(level=logging.INFO)
-        logging.error(e.message)
+        log_error(e.message)
         exit(1)
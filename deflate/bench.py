@@ -0,0 +1,483 @@
+"""
+Benchmarks for deflate codecs.
+Run with `python -m deflate.bench [benchmark ...] [-s size]`,
+results of suite can be saved as JSON with `--json path`
+to compare them between releases.
+"""
+import argparse
+import collections
+import functools
+import json
+import os
+import platform
+import random
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import zlib
+from pathlib import Path
+from deflate.codecs.deflate import DeflateCodec
+from deflate.codecs.huffman import HuffmanCodec, MAX_CODE_LENGTH
+from deflate.codecs.lz77 import LZ77Codec, Codeword
+from deflate.handlers import archive, containers
+from deflate.handlers.compressor import Compressor
+from deflate.handlers.decompressor import Decompressor
+from deflate.handlers.session import CompressionSession
+
+WORDS = (b'the', b'deflate', b'archive', b'window', b'of', b'huffman',
+         b'code', b'and', b'data', b'match', b'length', b'offset', b'a',
+         b'compress', b'stream', b'block', b'table', b'to', b'in', b'is')
+
+
+def generate_text(size: int, seed: int = 0) -> bytes:
+    """Generate text-like data from small vocabulary."""
+
+    rnd = random.Random(seed)
+    data = bytearray()
+    while len(data) < size:
+        data.extend(rnd.choice(WORDS))
+        data.extend(b'\n' if rnd.random() < 0.1 else b' ')
+    return bytes(data[:size])
+
+
+def generate_binary(size: int, seed: int = 0) -> bytes:
+    """Generate random binary data, which can not be compressed."""
+
+    return random.Random(seed).randbytes(size)
+
+
+def generate_repetitive(size: int, seed: int = 0) -> bytes:
+    """Generate data with long repeated runs and rare changes."""
+
+    rnd = random.Random(seed)
+    pattern = bytearray(b'0123456789abcdef' * 4)
+    data = bytearray()
+    while len(data) < size:
+        data.extend(pattern)
+        pattern[rnd.randrange(len(pattern))] = rnd.randrange(256)
+    return bytes(data[:size])
+
+
+def generate_structured(size: int, seed: int = 0) -> bytes:
+    """
+    Generate binary-like data: fixed-size records of growing ids,
+    small counters and floats, like tables of databases.
+    """
+
+    rnd = random.Random(seed)
+    record = struct.Struct('<IHHd')
+    data = bytearray()
+    index = 0
+    while len(data) < size:
+        data.extend(record.pack(index, rnd.randrange(16), 0x8000,
+                                round(rnd.random(), 2)))
+        index += 1
+    return bytes(data[:size])
+
+
+def generate_records(size: int, seed: int = 0) -> list:
+    """Generate small JSON-like records of size bytes in total."""
+
+    rnd = random.Random(seed)
+    records = []
+    while size > 0:
+        record = b'{"id": %d, "name": "%s", "score": %d, "tags": ["%s"]}' % (
+            rnd.randrange(10 ** 6), rnd.choice(WORDS), rnd.randrange(100),
+            rnd.choice(WORDS))
+        records.append(record)
+        size -= len(record)
+    return records
+
+
+def generate_skewed(size: int, seed: int = 0) -> bytes:
+    """
+    Generate data with geometric distribution of bytes,
+    its huffman codes of rare bytes are very long.
+    """
+
+    rnd = random.Random(seed)
+    return bytes(min(int(rnd.expovariate(0.5)), 255) for _ in range(size))
+
+
+CORPORA = {
+    'text': generate_text,
+    'binary': generate_binary,
+    'repetitive': generate_repetitive,
+    'structured': generate_structured,
+    'skewed': generate_skewed,
+}
+# режимы набора тестов: кодек и контейнер
+SUITE_MODES = (('lz77', containers.DFA), ('deflate', containers.DFA),
+               ('deflate', containers.ZLIB))
+SUITE_LEVELS = (1, 6, 9)
+
+
+def measure(function, *args) -> tuple:
+    """Call function and return its result and duration in seconds."""
+
+    start_time = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start_time
+
+
+def measure_peak_memory(function, *args) -> int:
+    """
+    Call function again and return peak size in bytes
+    of memory, allocated by Python while it works.
+    Duration is measured separately, tracing slows allocations.
+    """
+
+    tracemalloc.start()
+    try:
+        function(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def scan_encode(data: bytes, window_length: int) -> list:
+    """
+    Encode data with exhaustive scan of all offsets in window.
+    Reference for the hash chain match finder.
+    """
+
+    codewords = []
+    position = 0
+    while position < len(data):
+        longest_match_length = 0
+        longest_match_offset = 0
+        start_offset = 1
+        while start_offset < window_length and position - start_offset >= 0:
+            match_length = 0
+            while position + match_length + 1 < len(data) \
+                    and match_length < window_length - 1 \
+                    and data[position - start_offset + match_length] == \
+                    data[position + match_length]:
+                match_length += 1
+            if match_length > longest_match_length:
+                longest_match_length = match_length
+                longest_match_offset = start_offset
+            start_offset += 1
+        codewords.append(Codeword(longest_match_offset, longest_match_length,
+                                  data[position + longest_match_length]))
+        position += longest_match_length + 1
+    return codewords
+
+
+def count_by_loop(data: bytes) -> dict:
+    """Count bytes by Python loop, reference for bulk counting."""
+
+    weights = collections.defaultdict(int)
+    for byte in data:
+        weights[byte] += 1
+    return weights
+
+
+def halve_code_lengths(weights: dict, max_length: int) -> dict:
+    """
+    Limit code lengths by halving of weights, while tree of nodes
+    is too deep. Reference for package-merge, codes are not optimal.
+    """
+
+    codec = HuffmanCodec()
+    while True:
+        code_lengths = codec.get_code_lengths(codec.create_tree(weights))
+        if max(code_lengths.values()) <= max_length:
+            return code_lengths
+        weights = {char: (weight + 1) // 2
+                   for char, weight in weights.items()}
+
+
+def print_row(*columns) -> None:
+    print(''.join(f'{column:<14}' for column in columns))
+
+
+def bench_lz77(size: int) -> None:
+    """Compare hash chain match finder with exhaustive window scan."""
+
+    print_row('corpus', 'finder', 'codewords', 'seconds', 'KB/s')
+    for name, generate in CORPORA.items():
+        data = generate(size)
+        finders = (('scan', lambda: scan_encode(data, 256)),
+                   ('hash chain', lambda: LZ77Codec(256).encode(data)))
+        for finder, encode in finders:
+            codewords, duration = measure(encode)
+            print_row(name, finder, len(codewords), f'{duration:.3f}',
+                      f'{size / 1024 / duration:.1f}')
+
+
+def bench_huffman(size: int) -> None:
+    """Compare decoding with string codes table and canonical decoder."""
+
+    print_row('corpus', 'decoder', 'seconds', 'KB/s')
+    for name, generate in CORPORA.items():
+        data = generate(size)
+        encoded_data, codes_table = HuffmanCodec().encode(data)
+        encoded_bytes = encoded_data.tobytes()
+        string_table = {char: code.to01()
+                        for char, code in codes_table.items()}
+        code_lengths = {char: len(code)
+                        for char, code in codes_table.items()}
+        decoders = (
+            ('string codes', lambda: HuffmanCodec.decode(
+                string_table, encoded_bytes, len(encoded_data))),
+            ('canonical', lambda: HuffmanCodec.decode_canonical(
+                HuffmanCodec.create_decoder(code_lengths),
+                encoded_bytes, len(encoded_data))),
+        )
+        for decoder, decode in decoders:
+            decoded, duration = measure(decode)
+            assert decoded == data
+            print_row(name, decoder, f'{duration:.4f}',
+                      f'{size / 1024 / duration:.1f}')
+
+
+def bench_huffman_tables(size: int, repeats: int = 20) -> None:
+    """
+    Compare counting of bytes by loop and by Counter
+    and building of code lengths limited by MAX_CODE_LENGTH
+    by halving of weights and by package-merge.
+    """
+
+    print_row('corpus', 'step', 'method', 'seconds', 'max length', 'bits')
+    for name, generate in CORPORA.items():
+        data = generate(size)
+        counters = (('loop', count_by_loop),
+                    ('Counter', HuffmanCodec.count_frequencies))
+        for method, count in counters:
+            weights, duration = measure(count, data)
+            print_row(name, 'count', method, f'{duration:.4f}')
+        builders = (('halving', halve_code_lengths),
+                    ('package-merge',
+                     HuffmanCodec().get_limited_code_lengths))
+        for method, build in builders:
+            _, duration = measure(lambda: [build(weights, MAX_CODE_LENGTH)
+                                           for _ in range(repeats)])
+            code_lengths = build(weights, MAX_CODE_LENGTH)
+            print_row(name, 'table', method, f'{duration / repeats:.5f}',
+                      max(code_lengths.values()),
+                      sum(weights[char] * length
+                          for char, length in code_lengths.items()))
+
+
+def bench_checksums(size: int) -> None:
+    """Compare speed of checksum types of dfa archive."""
+
+    print_row('checksum', 'seconds', 'MB/s')
+    data = generate_binary(size)
+    for checksum_type in archive.CHECKSUM_TYPES:
+        def update():
+            checksum = archive.create_checksum(checksum_type)
+            checksum.update(data)
+            return checksum.digest()
+
+        _, duration = measure(update)
+        print_row(checksum_type, f'{duration:.4f}',
+                  f'{size / 1024 / 1024 / max(duration, 1e-9):.1f}')
+
+
+def bench_lz77_decode(size: int) -> None:
+    """Show that LZ77 decoding time grows linearly with output size."""
+
+    print_row('corpus', 'size', 'seconds', 'ns/byte')
+    for name, generate in CORPORA.items():
+        for scale in (1, 2, 4, 8, 16):
+            data = generate(size * scale)
+            codewords = LZ77Codec(256).encode(data)
+            decoded, duration = measure(LZ77Codec.decode, codewords)
+            assert decoded == data
+            print_row(name, len(data), f'{duration:.4f}',
+                      f'{duration * 1e9 / len(data):.1f}')
+
+
+def bench_deflate(size: int) -> None:
+    """Compare DEFLATE codec with zlib by ratio and speed."""
+
+    print_row('corpus', 'codec', 'size', 'ratio', 'enc KB/s', 'dec KB/s')
+    for name, generate in CORPORA.items():
+        data = generate(size)
+        encoded, encode_duration = measure(DeflateCodec().encode, data)
+        decoded, decode_duration = measure(DeflateCodec.decode, encoded)
+        assert decoded == data and zlib.decompress(encoded, -15) == data
+        zlib_encoded, zlib_encode_duration = measure(zlib.compress, data)
+        zlib_decoded, zlib_decode_duration = measure(zlib.decompress,
+                                                     zlib_encoded)
+        assert zlib_decoded == data
+        rows = (('deflate', encoded, encode_duration, decode_duration),
+                ('zlib', zlib_encoded, zlib_encode_duration,
+                 zlib_decode_duration))
+        for codec, result, encode_time, decode_time in rows:
+            print_row(name, codec, len(result),
+                      f'{len(result) / size:.3f}',
+                      f'{size / 1024 / encode_time:.1f}',
+                      f'{size / 1024 / decode_time:.1f}')
+
+
+def bench_session(size: int) -> None:
+    """
+    Compare compression of many small records
+    by new Compressor for every record and by one session.
+    """
+
+    records = generate_records(size)
+    print(f'{len(records)} records')
+    print_row('codec', 'container', 'api', 'size', 'records/s')
+    for codec, container in (('lz77', containers.DFA),
+                             ('deflate', containers.DFA),
+                             ('deflate', containers.ZLIB)):
+        apis = (
+            ('compressor', lambda: [
+                Compressor(codec=codec, container=container).compress(
+                    record, '')[0] for record in records]),
+            ('session', lambda: list(CompressionSession(
+                codec=codec, container=container).compress_many(records))),
+        )
+        for api, compress in apis:
+            compressed, duration = measure(compress)
+            print_row(codec, container, api,
+                      sum(len(archive) for archive in compressed),
+                      f'{len(records) / duration:.0f}')
+
+
+def run_cli(*args, cwd: str, stdin: bytes = b'') -> None:
+    """Run command line of package in new interpreter, like user does."""
+
+    root = str(Path(__file__).resolve().parent.parent)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(
+        filter(None, (root, os.environ.get('PYTHONPATH')))))
+    subprocess.run((sys.executable, '-m', 'deflate') + args, cwd=cwd,
+                   env=env, input=stdin, stdout=subprocess.DEVNULL,
+                   check=True)
+
+
+def bench_startup(size: int, files_count: int = 20) -> dict:
+    """
+    Measure startup of command line: --help and compression
+    of small files by process for every file and by one --batch process.
+    """
+
+    print_row('command', 'processes', 'seconds', 's/file')
+    result = {}
+    with tempfile.TemporaryDirectory() as directory:
+        names = [f'file{index}.txt' for index in range(files_count)]
+        for index, name in enumerate(names):
+            Path(directory, name).write_bytes(generate_text(size, index))
+        _, duration = measure(lambda: run_cli('--help', cwd=directory))
+        result['help_seconds'] = duration
+        print_row('--help', 1, f'{duration:.3f}')
+        _, duration = measure(lambda: [run_cli(name, cwd=directory)
+                                       for name in names])
+        result['process_per_file_seconds'] = duration / files_count
+        print_row('compress', files_count, f'{duration:.3f}',
+                  f'{duration / files_count:.4f}')
+        _, duration = measure(lambda: run_cli(
+            '--batch', cwd=directory, stdin='\n'.join(names).encode()))
+        result['batch_seconds'] = duration / files_count
+        print_row('--batch', 1, f'{duration:.3f}',
+                  f'{duration / files_count:.4f}')
+    return result
+
+
+def bench_suite(size: int, levels: tuple = SUITE_LEVELS) -> list:
+    """
+    Compress and decompress every corpus in every mode and level,
+    compare with zlib of the same level.
+    Return rows of results for JSON report.
+    """
+
+    print_row('corpus', 'mode', 'level', 'ratio', 'enc MB/s', 'dec MB/s',
+              'enc peak KB', 'dec peak KB')
+    rows = []
+    for name, generate in CORPORA.items():
+        data = generate(size)
+        for level in levels:
+            modes = [(f'{codec}/{container}',
+                      Compressor(level, codec, container).compress,
+                      functools.partial(Decompressor().decompress,
+                                        container=container))
+                     for codec, container in SUITE_MODES]
+            modes.append(('zlib', zlib.compress, zlib.decompress))
+            for mode, compress, decompress in modes:
+                arguments = (data, level) if mode == 'zlib' else (data, '')
+                compressed, encode_duration = measure(compress, *arguments)
+                if mode != 'zlib':
+                    compressed = compressed[0]
+                decoded, decode_duration = measure(decompress, compressed)
+                if mode != 'zlib':
+                    decoded = decoded[1]
+                assert decoded == data
+                row = {
+                    'corpus': name,
+                    'mode': mode,
+                    'level': level,
+                    'size': size,
+                    'compressed_size': len(compressed),
+                    'ratio': len(compressed) / size,
+                    'compress_mb_s': size / 1e6 / encode_duration,
+                    'decompress_mb_s': size / 1e6 / decode_duration,
+                    'compress_peak_bytes': measure_peak_memory(compress,
+                                                               *arguments),
+                    'decompress_peak_bytes': measure_peak_memory(decompress,
+                                                                 compressed),
+                }
+                rows.append(row)
+                print_row(name, mode, level, f'{row["ratio"]:.3f}',
+                          f'{row["compress_mb_s"]:.3f}',
+                          f'{row["decompress_mb_s"]:.3f}',
+                          row['compress_peak_bytes'] // 1024,
+                          row['decompress_peak_bytes'] // 1024)
+    return rows
+
+
+BENCHMARKS = {
+    'lz77': bench_lz77,
+    'huffman': bench_huffman,
+    'huffman_tables': bench_huffman_tables,
+    'checksums': bench_checksums,
+    'lz77_decode': bench_lz77_decode,
+    'deflate': bench_deflate,
+    'session': bench_session,
+    'startup': bench_startup,
+    'suite': bench_suite,
+}
+
+
+def create_cmd_parser():
+    parser = argparse.ArgumentParser(prog='python -m deflate.bench')
+    parser.add_argument('benchmarks', nargs='*', metavar='benchmark',
+                        help=f'benchmarks to run: {", ".join(BENCHMARKS)};'
+                             f' all by default')
+    parser.add_argument('-s', '--size', type=int, default=16 * 1024,
+                        dest='size', help='size of every corpus in bytes')
+    parser.add_argument('-l', '--levels', type=int, nargs='+',
+                        default=SUITE_LEVELS, choices=range(1, 10),
+                        dest='levels', help='levels of suite benchmark')
+    parser.add_argument('--json', default=None, dest='json',
+                        help='to save results of benchmarks,'
+                             ' which have them, to JSON file')
+    return parser
+
+
+if __name__ == '__main__':
+    cmd_parser = create_cmd_parser()
+    args = cmd_parser.parse_args()
+    for benchmark in args.benchmarks:
+        if benchmark not in BENCHMARKS:
+            cmd_parser.error(f'unknown benchmark: {benchmark}')
+    benchmarks = dict(BENCHMARKS, suite=functools.partial(
+        bench_suite, levels=tuple(args.levels)))
+    results = {}
+    for benchmark in args.benchmarks or BENCHMARKS:
+        result = benchmarks[benchmark](args.size)
+        if result is not None:
+            results[benchmark] = result
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump({'python': platform.python_version(),
+                       'machine': platform.machine(),
+                       'size': args.size,
+                       'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                       'results': results}, file, indent=2)
@@ -0,0 +1,686 @@
+import collections
+import functools
+import io
+from typing import BinaryIO, Iterator, NamedTuple, Optional
+from bitarray import bitarray
+from bitarray.util import int2ba
+from deflate.codecs.huffman import HuffmanCodec, check_code_lengths, \
+    estimate_codes_size, split_blocks, SPLIT_LENGTH
+from deflate.codecs.lz77 import LZ77Codec, CodewordArray, estimate_bit_costs
+from deflate import errors
+
+WINDOW_LENGTH = 32 * 1024
+MIN_MATCH = 3
+MAX_MATCH = 258
+MAX_STORED_LENGTH = 0xffff
+MAX_CODE_LENGTH = 15
+MAX_CODE_LENGTHS_CODE_LENGTH = 7
+
+STORED_BLOCK = 0
+FIXED_BLOCK = 1
+DYNAMIC_BLOCK = 2
+
+FIXED_STRATEGY = 'fixed'
+DYNAMIC_STRATEGY = 'dynamic'
+
+END_OF_BLOCK = 256
+FIRST_LENGTH_CODE = 257
+LITERAL_CODES_COUNT = 286
+DISTANCE_CODES_COUNT = 30
+# ключи длин и расстояний совпадений в потоке символов блока
+LENGTH_KEY = 512
+DISTANCE_KEY = 1024
+
+LENGTH_BASES = (3, 4, 5, 6, 7, 8, 9, 10, 11, 13, 15, 17, 19, 23, 27, 31,
+                35, 43, 51, 59, 67, 83, 99, 115, 131, 163, 195, 227, 258)
+LENGTH_EXTRA_BITS = (0, 0, 0, 0, 0, 0, 0, 0, 1, 1, 1, 1, 2, 2, 2, 2,
+                     3, 3, 3, 3, 4, 4, 4, 4, 5, 5, 5, 5, 0)
+DISTANCE_BASES = (1, 2, 3, 4, 5, 7, 9, 13, 17, 25, 33, 49, 65, 97, 129,
+                  193, 257, 385, 513, 769, 1025, 1537, 2049, 3073, 4097,
+                  6145, 8193, 12289, 16385, 24577)
+DISTANCE_EXTRA_BITS = (0, 0, 0, 0, 1, 1, 2, 2, 3, 3, 4, 4, 5, 5, 6, 6,
+                       7, 7, 8, 8, 9, 9, 10, 10, 11, 11, 12, 12, 13, 13)
+CODE_LENGTHS_ORDER = (16, 17, 18, 0, 8, 7, 9, 6, 10, 5,
+                      11, 4, 12, 3, 13, 2, 14, 1, 15)
+
+
+def _create_code_index(bases: tuple, max_value: int) -> list:
+    """Get code for every value from 0 to max_value by bases of codes."""
+
+    # каждый код заполняет только свой отрезок значений, это важно
+    # для времени импорта: индекс расстояний - 32 Кб элементов
+    index = [0] * bases[0]
+    ends = bases[1:] + (max_value + 1,)
+    for code, (base, end) in enumerate(zip(bases, ends)):
+        index.extend([code] * (end - base))
+    return index
+
+
+LENGTH_CODES = _create_code_index(LENGTH_BASES, MAX_MATCH)
+DISTANCE_CODES = _create_code_index(DISTANCE_BASES, WINDOW_LENGTH)
+
+FIXED_LITERAL_LENGTHS = dict.fromkeys(range(0, 144), 8)
+FIXED_LITERAL_LENGTHS.update(dict.fromkeys(range(144, 256), 9))
+FIXED_LITERAL_LENGTHS.update(dict.fromkeys(range(256, 280), 7))
+FIXED_LITERAL_LENGTHS.update(dict.fromkeys(range(280, 288), 8))
+FIXED_DISTANCE_LENGTHS = dict.fromkeys(range(30), 5)
+
+
+class BlockInfo(NamedTuple):
+    """Type and code lengths of written block, bits of dynamic table."""
+
+    block_type: int
+    literal_lengths: Optional[dict] = None
+    distance_lengths: Optional[dict] = None
+    header_length: int = 0
+
+
+class DeflateCodec:
+    """
+    Contain methods to encode and decode data
+    as DEFLATE bitstream (RFC 1951).
+    Matches are searched by LZ77Codec with 32 KiB window,
+    codes of block are canonical codes of HuffmanCodec.
+    Data is split into blocks, where statistics of symbols change,
+    every block is stored, compressed with fixed
+    or with dynamic codes, whichever is shorter;
+    fixed strategy does not try dynamic codes.
+    Bits of unfinished byte are kept until the next block.
+    """
+
+    def __init__(self, lz77_codec: Optional[LZ77Codec] = None,
+                 strategy: str = DYNAMIC_STRATEGY):
+        self.lz77_codec = lz77_codec or self.create_lz77_codec()
+        self.strategy = strategy
+        self.bits = bitarray(endian='little')
+        self.last_block = None
+
+    @staticmethod
+    def create_lz77_codec(**match_parameters) -> LZ77Codec:
+        """Create LZ77 codec with window and match lengths of DEFLATE."""
+
+        return LZ77Codec(WINDOW_LENGTH, max_length=MAX_MATCH,
+                         min_length=MIN_MATCH, char_after_match=False,
+                         cost_model=DeflateCostModel, **match_parameters)
+
+    def encode(self, data: bytes, history: bytes = b'',
+               final: bool = True) -> bytes:
+        """
+        Encode data as DEFLATE block.
+        Matches can refer to history.
+        Return encoded whole bytes, after final block
+        stream is padded to whole byte.
+        """
+
+        return self.encode_codewords(data,
+                                     self.lz77_codec.encode(data, history),
+                                     final)
+
+    def encode_codewords(self, data: bytes, codewords: CodewordArray,
+                         final: bool = True) -> bytes:
+        """
+        Encode data, already encoded by LZ77 codec, as DEFLATE blocks.
+        Only the last block is final.
+        """
+
+        blocks = self.split_blocks(codewords)
+        start = 0
+        for index, block_codewords in enumerate(blocks):
+            end = start + block_codewords.get_data_length(False)
+            self.write_block(data[start:end], block_codewords,
+                             final and index == len(blocks) - 1)
+            start = end
+        return self.flush(final)
+
+    def encode_stored(self, data: bytes, final: bool = True) -> bytes:
+        """
+        Encode data as stored blocks without search of matches.
+        Return encoded whole bytes, like encode.
+        """
+
+        self._write_stored(data, final)
+        self.last_block = BlockInfo(STORED_BLOCK)
+        return self.flush(final)
+
+    def split_blocks(self, codewords: CodewordArray) -> list:
+        """
+        Split codewords into blocks by parts of SPLIT_LENGTH codewords,
+        where statistics of symbols change, see huffman.split_blocks.
+        """
+
+        parts = [codewords[start:start + SPLIT_LENGTH]
+                 for start in range(0, len(codewords), SPLIT_LENGTH)]
+        if len(parts) < 2:
+            return [codewords]
+        starts = split_blocks([self._collect_symbols(part)[1]
+                               for part in parts],
+                              self._estimate_block_size)
+        return [codewords[start * SPLIT_LENGTH:end * SPLIT_LENGTH]
+                for start, end in zip(starts, starts[1:] + [len(parts)])]
+
+    def _estimate_block_size(self, counts: dict) -> float:
+        """
+        Estimate size in bits of the shortest block with symbols:
+        dynamic block is estimated by entropy of codes
+        and 5 bits for every code length.
+        """
+
+        literal_counts, distance_counts, extra_bits = \
+            self._count_codes(counts)
+        data_length = sum(count if key < LENGTH_KEY
+                          else (key - LENGTH_KEY) * count
+                          for key, count in counts.items()
+                          if key < DISTANCE_KEY and key != END_OF_BLOCK)
+        size = 3 + extra_bits + \
+            self._get_codes_size(literal_counts, FIXED_LITERAL_LENGTHS) + \
+            self._get_codes_size(distance_counts, FIXED_DISTANCE_LENGTHS)
+        if self.strategy == DYNAMIC_STRATEGY:
+            size = min(size, 3 + 14 + extra_bits +
+                       estimate_codes_size(literal_counts) +
+                       estimate_codes_size(distance_counts) +
+                       5 * (len(literal_counts) + len(distance_counts)))
+        return min(size, 8 * data_length + 3 + 7 + 32)
+
+    def sync(self) -> bytes:
+        """
+        Write empty stored block, so stream ends at whole byte
+        and next blocks can be encoded separately (like Z_SYNC_FLUSH).
+        Return encoded whole bytes.
+        """
+
+        self._write_stored(b'', False)
+        return self.flush()
+
+    def flush(self, final: bool = False) -> bytes:
+        """Get whole bytes of written bits, pad stream if it is final."""
+
+        if final:
+            self._pad()
+        whole_length = len(self.bits) // 8 * 8
+        flushed = self.bits[:whole_length].tobytes()
+        del self.bits[:whole_length]
+        return flushed
+
+    def write_block(self, data: bytes, codewords: CodewordArray,
+                    final: bool) -> None:
+        """Write block of data with the shortest type."""
+
+        symbols, counts = self._collect_symbols(codewords)
+        literal_counts, distance_counts, extra_bits = \
+            self._count_codes(counts)
+        fixed_size = 3 + extra_bits + \
+            self._get_codes_size(literal_counts, FIXED_LITERAL_LENGTHS) + \
+            self._get_codes_size(distance_counts, FIXED_DISTANCE_LENGTHS)
+        stored_blocks = max(1, -(-len(data) // MAX_STORED_LENGTH))
+        stored_size = 8 * len(data) + stored_blocks * (3 + 7 + 32)
+        block_type = FIXED_BLOCK
+        size = fixed_size
+        if self.strategy == DYNAMIC_STRATEGY:
+            literal_lengths = self.get_code_lengths(literal_counts)
+            distance_lengths = self.get_code_lengths(distance_counts or
+                                                     {0: 1})
+            header = self._create_dynamic_header(literal_lengths,
+                                                 distance_lengths)
+            dynamic_size = 3 + len(header) + extra_bits + \
+                self._get_codes_size(literal_counts, literal_lengths) + \
+                self._get_codes_size(distance_counts, distance_lengths)
+            if dynamic_size < size:
+                block_type = DYNAMIC_BLOCK
+                size = dynamic_size
+        if stored_size < size:
+            self._write_stored(data, final)
+            self.last_block = BlockInfo(STORED_BLOCK)
+            return
+        self._write_int(final, 1)
+        self._write_int(block_type, 2)
+        if block_type == DYNAMIC_BLOCK:
+            self.bits.extend(header)
+            self.last_block = BlockInfo(block_type, literal_lengths,
+                                        distance_lengths, len(header))
+        else:
+            literal_lengths = FIXED_LITERAL_LENGTHS
+            distance_lengths = FIXED_DISTANCE_LENGTHS
+            self.last_block = BlockInfo(block_type, literal_lengths,
+                                        distance_lengths)
+        self.bits.encode(self._create_symbol_codes(counts, literal_lengths,
+                                                   distance_lengths),
+                         symbols)
+
+    @staticmethod
+    def get_code_lengths(counts: dict) -> dict:
+        """Get huffman code lengths, not longer than DEFLATE allows."""
+
+        return HuffmanCodec().get_limited_code_lengths(counts,
+                                                       MAX_CODE_LENGTH)
+
+    @staticmethod
+    def _collect_symbols(codewords: CodewordArray) -> tuple:
+        """
+        Get symbols of block: chars, length and distance keys
+        of matches and end of block, and counts of every symbol.
+        """
+
+        symbols = []
+        for offset, length, char in zip(codewords.offsets,
+                                        codewords.lengths, codewords.chars):
+            if offset:
+                symbols.append(LENGTH_KEY + length)
+                symbols.append(DISTANCE_KEY + offset)
+            else:
+                symbols.append(char)
+        symbols.append(END_OF_BLOCK)
+        return symbols, collections.Counter(symbols)
+
+    @staticmethod
+    def _count_codes(counts: dict) -> tuple:
+        """Get counts of literal/length and distance codes and extra bits."""
+
+        literal_counts = collections.Counter()
+        distance_counts = collections.Counter()
+        extra_bits = 0
+        for key, count in counts.items():
+            if key < LENGTH_KEY:
+                literal_counts[key] += count
+            elif key < DISTANCE_KEY:
+                code = LENGTH_CODES[key - LENGTH_KEY]
+                literal_counts[FIRST_LENGTH_CODE + code] += count
+                extra_bits += LENGTH_EXTRA_BITS[code] * count
+            else:
+                code = DISTANCE_CODES[key - DISTANCE_KEY]
+                distance_counts[code] += count
+                extra_bits += DISTANCE_EXTRA_BITS[code] * count
+        return literal_counts, distance_counts, extra_bits
+
+    @staticmethod
+    def _get_codes_size(counts: dict, code_lengths: dict) -> int:
+        return sum(count * code_lengths[code]
+                   for code, count in counts.items())
+
+    @staticmethod
+    def _create_symbol_codes(counts: dict, literal_lengths: dict,
+                             distance_lengths: dict) -> dict:
+        """Get bits of every symbol of block with extra bits."""
+
+        literal_codes = HuffmanCodec.create_canonical_codes(literal_lengths)
+        distance_codes = HuffmanCodec.create_canonical_codes(
+            distance_lengths)
+        symbol_codes = {}
+        for key in counts:
+            if key < LENGTH_KEY:
+                symbol_codes[key] = literal_codes[key]
+            elif key < DISTANCE_KEY:
+                length = key - LENGTH_KEY
+                code = LENGTH_CODES[length]
+                symbol_codes[key] = literal_codes[FIRST_LENGTH_CODE + code] \
+                    + _int_to_bits(length - LENGTH_BASES[code],
+                                   LENGTH_EXTRA_BITS[code])
+            else:
+                distance = key - DISTANCE_KEY
+                code = DISTANCE_CODES[distance]
+                symbol_codes[key] = distance_codes[code] + \
+                    _int_to_bits(distance - DISTANCE_BASES[code],
+                                 DISTANCE_EXTRA_BITS[code])
+        return symbol_codes
+
+    def _create_dynamic_header(self, literal_lengths: dict,
+                               distance_lengths: dict) -> bitarray:
+        """
+        Get header of dynamic block: code lengths of both codes,
+        compressed with run-length and huffman codes.
+        """
+
+        literal_count = max(max(literal_lengths) + 1, FIRST_LENGTH_CODE)
+        distance_count = max(distance_lengths) + 1
+        lengths = [literal_lengths.get(code, 0)
+                   for code in range(literal_count)]
+        lengths.extend(distance_lengths.get(code, 0)
+                       for code in range(distance_count))
+        runs = self._encode_runs(lengths)
+        lengths_code_lengths = HuffmanCodec().get_limited_code_lengths(
+            collections.Counter(symbol for symbol, _, _ in runs),
+            MAX_CODE_LENGTHS_CODE_LENGTH)
+        lengths_codes = HuffmanCodec.create_canonical_codes(
+            lengths_code_lengths)
+        order_count = len(CODE_LENGTHS_ORDER)
+        while order_count > 4 and not lengths_code_lengths.get(
+                CODE_LENGTHS_ORDER[order_count - 1]):
+            order_count -= 1
+        header = bitarray(endian='little')
+        header.extend(_int_to_bits(literal_count - FIRST_LENGTH_CODE, 5))
+        header.extend(_int_to_bits(distance_count - 1, 5))
+        header.extend(_int_to_bits(order_count - 4, 4))
+        for symbol in CODE_LENGTHS_ORDER[:order_count]:
+            header.extend(_int_to_bits(lengths_code_lengths.get(symbol, 0),
+                                       3))
+        for symbol, extra, extra_length in runs:
+            header.extend(lengths_codes[symbol])
+            header.extend(_int_to_bits(extra, extra_length))
+        return header
+
+    @staticmethod
+    def _encode_runs(lengths: list) -> list:
+        """
+        Encode runs of code lengths with symbols 16, 17 and 18.
+        Return list of symbols with extra value and its bits count.
+        """
+
+        runs = []
+        position = 0
+        while position < len(lengths):
+            length = lengths[position]
+            run_end = position
+            while run_end < len(lengths) and lengths[run_end] == length:
+                run_end += 1
+            count = run_end - position
+            position = run_end
+            if not length:
+                while count >= 11:
+                    repeat = min(count, 138)
+                    runs.append((18, repeat - 11, 7))
+                    count -= repeat
+                if count >= 3:
+                    runs.append((17, count - 3, 3))
+                    count = 0
+            else:
+                runs.append((length, 0, 0))
+                count -= 1
+                while count >= 3:
+                    repeat = min(count, 6)
+                    runs.append((16, repeat - 3, 2))
+                    count -= repeat
+            runs.extend((length, 0, 0) for _ in range(count))
+        return runs
+
+    def _write_stored(self, data: bytes, final: bool) -> None:
+        position = 0
+        while True:
+            chunk = data[position:position + MAX_STORED_LENGTH]
+            position += len(chunk)
+            last = position >= len(data)
+            self._write_int(final and last, 1)
+            self._write_int(STORED_BLOCK, 2)
+            self._pad()
+            self._write_int(len(chunk), 16)
+            self._write_int(len(chunk) ^ 0xffff, 16)
+            self.bits.frombytes(chunk)
+            if last:
+                break
+
+    def _write_int(self, value: int, length: int) -> None:
+        self.bits.extend(_int_to_bits(value, length))
+
+    def _pad(self) -> None:
+        self.bits.fill()
+
+    @staticmethod
+    def decode(data: bytes, history: bytes = b'') -> bytes:
+        """Decode DEFLATE bitstream. Matches can refer to history."""
+
+        decoder = DeflateDecoder(BitReader.from_buffer(data), history)
+        return b''.join(decoder.decode_blocks())
+
+
+class DeflateCostModel:
+    """
+    Bit costs of literals and matches of DEFLATE for optimal parsing.
+    Costs of literal/length and distance codes are estimated
+    by their counts in codewords, extra bits are added to them.
+    """
+
+    def __init__(self, literal_costs: list, distance_costs: list):
+        self.literal_costs = literal_costs[:END_OF_BLOCK]
+        self.length_costs = [0] * MIN_MATCH + [
+            literal_costs[FIRST_LENGTH_CODE + LENGTH_CODES[length]]
+            + LENGTH_EXTRA_BITS[LENGTH_CODES[length]]
+            for length in range(MIN_MATCH, MAX_MATCH + 1)]
+        self.char_costs = ()
+        self.distance_costs = [cost + extra_bits for cost, extra_bits
+                               in zip(distance_costs, DISTANCE_EXTRA_BITS)]
+
+    def offset_cost(self, offset: int) -> float:
+        return self.distance_costs[DISTANCE_CODES[offset]]
+
+    @classmethod
+    def from_codewords(cls, codewords: CodewordArray) -> 'DeflateCostModel':
+        """Create model by counts of codes of codewords."""
+
+        counts = DeflateCodec._collect_symbols(codewords)[1]
+        literal_counts, distance_counts, _ = DeflateCodec._count_codes(counts)
+        return cls(estimate_bit_costs(literal_counts, LITERAL_CODES_COUNT),
+                   estimate_bit_costs(distance_counts, DISTANCE_CODES_COUNT))
+
+
+def _int_to_bits(value: int, length: int) -> bitarray:
+    """Get bits of value, least significant first."""
+
+    if not length:
+        return bitarray(endian='little')
+    return int2ba(value, length, endian='little')
+
+
+class BitReader:
+    """
+    Read DEFLATE bitstream from file, least significant bits first.
+    Bytes are read from file by chunks.
+    """
+
+    chunk_size = 64 * 1024
+
+    def __init__(self, src: BinaryIO):
+        self.src = src
+        self.data = b''
+        self.position = 0
+        self.bit_buffer = 0
+        self.bit_count = 0
+
+    @classmethod
+    def from_buffer(cls, data: bytes) -> 'BitReader':
+        """Create reader of bytes-like object without copying it."""
+
+        reader = cls(io.BytesIO())
+        reader.data = memoryview(data)
+        return reader
+
+    def fill(self, count: int) -> None:
+        """Read bytes to have count bits in buffer, if file has them."""
+
+        while self.bit_count < count:
+            if self.position == len(self.data):
+                self.data = self.src.read(self.chunk_size)
+                self.position = 0
+                if not self.data:
+                    return
+            self.bit_buffer |= self.data[self.position] << self.bit_count
+            self.position += 1
+            self.bit_count += 8
+
+    def read(self, count: int) -> int:
+        """Read integer of count bits."""
+
+        if self.bit_count < count:
+            self.fill(count)
+            if self.bit_count < count:
+                raise errors.BrokenArchiveError()
+        value = self.bit_buffer & ((1 << count) - 1)
+        self.bit_buffer >>= count
+        self.bit_count -= count
+        return value
+
+    def align(self) -> None:
+        """Skip bits up to byte boundary."""
+
+        self.read(self.bit_count % 8)
+
+    def read_bytes(self, count: int) -> bytes:
+        """Read count bytes after byte boundary."""
+
+        self.align()
+        result = bytearray()
+        while self.bit_count and len(result) < count:
+            result.append(self.read(8))
+        taken = self.data[self.position:self.position + count - len(result)]
+        self.position += len(taken)
+        result.extend(taken)
+        if len(result) < count:
+            result.extend(self.src.read(count - len(result)))
+        if len(result) < count:
+            raise errors.BrokenArchiveError()
+        return bytes(result)
+
+    def at_end(self) -> bool:
+        """Check if there are no bytes after byte boundary."""
+
+        self.align()
+        self.fill(8)
+        return not self.bit_count
+
+    def decode_symbol(self, table: list, max_length: int) -> int:
+        """Decode huffman code with table from create_decoding_table."""
+
+        if self.bit_count < max_length:
+            self.fill(max_length)
+        entry = table[self.bit_buffer & ((1 << max_length) - 1)]
+        length = entry & 15
+        if not length or length > self.bit_count:
+            raise errors.BrokenArchiveError()
+        self.bit_buffer >>= length
+        self.bit_count -= length
+        return entry >> 4
+
+
+def create_decoding_table(code_lengths: dict) -> tuple:
+    """
+    Get table for decoding huffman codes of DEFLATE.
+    Index of table is next max_length bits of stream,
+    item is code shifted by 4 bits with its length.
+    Return table and max_length.
+    """
+
+    max_length = max(code_lengths.values(), default=0)
+    if not max_length:
+        raise errors.BrokenArchiveError()
+    # длины из заголовка блока могут не помещаться в префиксный код
+    check_code_lengths(code_lengths)
+    table = [0] * (1 << max_length)
+    codes = HuffmanCodec.create_canonical_codes(code_lengths)
+    for symbol, code in codes.items():
+        length = len(code)
+        reversed_code = int(code.to01()[::-1], 2)
+        table[reversed_code::1 << length] = \
+            [symbol << 4 | length] * (1 << (max_length - length))
+    return table, max_length
+
+
+@functools.lru_cache(maxsize=None)
+def get_fixed_tables() -> tuple:
+    """
+    Get decoding tables of fixed codes, they are built
+    by the first fixed block, not by import of module.
+    """
+
+    return (create_decoding_table(FIXED_LITERAL_LENGTHS),
+            create_decoding_table(FIXED_DISTANCE_LENGTHS))
+
+
+class DeflateDecoder:
+    """
+    Decode DEFLATE bitstream from bit reader block by block.
+    Only last 32 KiB of decoded data are kept for matches.
+    Reader stops after final block, so data after stream
+    can be read from it.
+    """
+
+    def __init__(self, reader: BitReader, history: bytes = b''):
+        self.reader = reader
+        self.window = bytearray(history[-WINDOW_LENGTH:])
+
+    def decode_blocks(self) -> Iterator[bytes]:
+        """Decode blocks up to final one and yield their data."""
+
+        final = False
+        while not final:
+            final = self.reader.read(1)
+            block_type = self.reader.read(2)
+            start = len(self.window)
+            if block_type == STORED_BLOCK:
+                self._decode_stored()
+            elif block_type == FIXED_BLOCK:
+                self._decode_compressed(*get_fixed_tables())
+            elif block_type == DYNAMIC_BLOCK:
+                self._decode_compressed(*self._read_dynamic_tables())
+            else:
+                raise errors.BrokenArchiveError()
+            yield bytes(self.window[start:])
+            del self.window[:max(0, len(self.window) - WINDOW_LENGTH)]
+
+    def _decode_stored(self) -> None:
+        header = self.reader.read_bytes(4)
+        length = int.from_bytes(header[:2], 'little')
+        if length ^ 0xffff != int.from_bytes(header[2:], 'little'):
+            raise errors.BrokenArchiveError()
+        self.window.extend(self.reader.read_bytes(length))
+
+    def _read_dynamic_tables(self) -> tuple:
+        reader = self.reader
+        literal_count = reader.read(5) + FIRST_LENGTH_CODE
+        distance_count = reader.read(5) + 1
+        order_count = reader.read(4) + 4
+        lengths_code_lengths = {}
+        for symbol in CODE_LENGTHS_ORDER[:order_count]:
+            length = reader.read(3)
+            if length:
+                lengths_code_lengths[symbol] = length
+        table, max_length = create_decoding_table(lengths_code_lengths)
+        lengths = []
+        while len(lengths) < literal_count + distance_count:
+            symbol = reader.decode_symbol(table, max_length)
+            if symbol < 16:
+                lengths.append(symbol)
+            elif symbol == 16:
+                if not lengths:
+                    raise errors.BrokenArchiveError()
+                lengths.extend([lengths[-1]] * (reader.read(2) + 3))
+            elif symbol == 17:
+                lengths.extend([0] * (reader.read(3) + 3))
+            else:
+                lengths.extend([0] * (reader.read(7) + 11))
+        if len(lengths) != literal_count + distance_count:
+            raise errors.BrokenArchiveError()
+        literal_lengths = {code: length for code, length
+                           in enumerate(lengths[:literal_count]) if length}
+        distance_lengths = {code: length for code, length
+                            in enumerate(lengths[literal_count:]) if length}
+        return (create_decoding_table(literal_lengths),
+                create_decoding_table(distance_lengths)
+                if distance_lengths else ([0], 0))
+
+    def _decode_compressed(self, literal_table: tuple,
+                           distance_table: tuple) -> None:
+        reader = self.reader
+        window = self.window
+        literal_table, literal_max_length = literal_table
+        distance_table, distance_max_length = distance_table
+        while True:
+            symbol = reader.decode_symbol(literal_table, literal_max_length)
+            if symbol < END_OF_BLOCK:
+                window.append(symbol)
+                continue
+            if symbol == END_OF_BLOCK:
+                return
+            code = symbol - FIRST_LENGTH_CODE
+            if code >= len(LENGTH_BASES):
+                raise errors.BrokenArchiveError()
+            length = LENGTH_BASES[code] + reader.read(LENGTH_EXTRA_BITS[code])
+            code = reader.decode_symbol(distance_table, distance_max_length)
+            if code >= len(DISTANCE_BASES):
+                raise errors.BrokenArchiveError()
+            distance = DISTANCE_BASES[code] + \
+                reader.read(DISTANCE_EXTRA_BITS[code])
+            start = len(window) - distance
+            if start < 0:
+                raise errors.CodewordNotInWindowError()
+            if length <= distance:
+                window += window[start:start + length]
+            else:
+                period = window[start:]
+                window += (period * (length // distance + 1))[:length]
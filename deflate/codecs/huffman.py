@@ -1,8 +1,18 @@
 import heapq
 import collections
+import functools
+import math
 from hashlib import md5
-from bitarray import bitarray
-from typing import Optional, DefaultDict
+from bitarray import bitarray, decodetree, frozenbitarray
+from bitarray.util import ba2int, int2ba
+from typing import Callable, DefaultDict, Iterable, List, Optional
+from deflate import errors
+
+# длинные коды замедляют табличное декодирование, как в DEFLATE
+MAX_CODE_LENGTH = 15
+# данные делятся на блоки с таблицами по границам частей
+# из стольких кодовых слов
+SPLIT_LENGTH = 1024
 
 
 class Node:
@@ -25,28 +35,261 @@ class Node:
                and self.weight == other.weight
 
 
+@functools.lru_cache(maxsize=1 << 16)
+def _get_code_bits(code: int, length: int) -> frozenbitarray:
+    """
+    Get bits of code, codes of tables are the same mostly,
+    so they are created once and can not be changed.
+    """
+
+    return frozenbitarray(int2ba(code, length))
+
+
+def check_code_lengths(code_lengths: dict) -> None:
+    """
+    Check code lengths from archive by Kraft inequality: if codes
+    of these lengths do not fit in prefix code, archive is broken.
+    """
+
+    max_length = max(code_lengths.values(), default=0)
+    if sum(1 << (max_length - length) for length in code_lengths.values()) \
+            > 1 << max_length:
+        raise errors.BrokenArchiveError()
+
+
+def estimate_codes_size(counts: dict) -> float:
+    """
+    Estimate size in bits of chars, encoded by huffman codes
+    by their counts: huffman codes are not shorter than entropy.
+    """
+
+    total = sum(counts.values())
+    return sum(count * math.log2(total / count)
+               for count in counts.values() if count)
+
+
+def split_blocks(parts_counts: List[collections.Counter],
+                 estimate_size: Callable[[collections.Counter], float]
+                 ) -> List[int]:
+    """
+    Join consecutive parts of data into blocks with own tables.
+    Part is added to block, while block with it is estimated
+    not larger than block and part separately, so new block
+    starts where statistics of chars change.
+    Return indexes of the first parts of blocks.
+    """
+
+    if not parts_counts:
+        return []
+    starts = [0]
+    block_counts = collections.Counter(parts_counts[0])
+    block_size = estimate_size(block_counts)
+    for index in range(1, len(parts_counts)):
+        part_counts = parts_counts[index]
+        part_size = estimate_size(part_counts)
+        joined_counts = block_counts + part_counts
+        joined_size = estimate_size(joined_counts)
+        if joined_size <= block_size + part_size:
+            block_counts = joined_counts
+            block_size = joined_size
+        else:
+            starts.append(index)
+            block_counts = collections.Counter(part_counts)
+            block_size = part_size
+    return starts
+
+
+def get_huffman_code_lengths(counts: List[int],
+                             max_length: Optional[int] = None) -> List[int]:
+    """
+    Get code lengths of symbols by flat list of their counts,
+    symbol is index in list, absent symbols get length 0.
+    Huffman tree is built by heap of tuples without nodes,
+    if its codes are longer than max_length, lengths are
+    built by package-merge algorithm.
+    """
+
+    symbols = [symbol for symbol, count in enumerate(counts) if count]
+    lengths = [0] * len(counts)
+    if len(symbols) == 1:
+        lengths[symbols[0]] = 1
+    if len(symbols) < 2:
+        return lengths
+    # вершины: сначала листья по порядку symbols, потом внутренние
+    heap = [(counts[symbol], node) for node, symbol in enumerate(symbols)]
+    heapq.heapify(heap)
+    parents = [0] * (2 * len(symbols) - 1)
+    node = len(symbols)
+    while len(heap) > 1:
+        first_count, first = heapq.heappop(heap)
+        second_count, second = heapq.heappop(heap)
+        parents[first] = parents[second] = node
+        heapq.heappush(heap, (first_count + second_count, node))
+        node += 1
+    # родитель создан позже потомка, поэтому глубины идут от корня
+    depths = [0] * len(parents)
+    for node in range(len(parents) - 2, -1, -1):
+        depths[node] = depths[parents[node]] + 1
+    if max_length is not None and \
+            max(depths[:len(symbols)]) > max_length:
+        return package_merge(counts, max_length)
+    for node, symbol in enumerate(symbols):
+        lengths[symbol] = depths[node]
+    return lengths
+
+
+def package_merge(counts: List[int], max_length: int) -> List[int]:
+    """
+    Get optimal code lengths not longer than max_length
+    by package-merge algorithm, counts are like
+    in get_huffman_code_lengths.
+    """
+
+    leaves = sorted((count, symbol) for symbol, count in enumerate(counts)
+                    if count)
+    if len(leaves) > 1 << max_length:
+        raise ValueError(f'{len(leaves)} codes do not fit'
+                         f' in {max_length} bits')
+    # пакет - пара вершин, лист - номер символа
+    items = leaves
+    for _ in range(max_length - 1):
+        packages = [(items[index][0] + items[index + 1][0],
+                     (items[index][1], items[index + 1][1]))
+                    for index in range(0, len(items) - 1, 2)]
+        items = list(heapq.merge(leaves, packages, key=lambda item: item[0]))
+    lengths = [0] * len(counts)
+    # каждое вхождение символа в выбранные пакеты удлиняет его код
+    stack = [node for _, node in items[:2 * len(leaves) - 2]]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, tuple):
+            stack.extend(node)
+        else:
+            lengths[node] += 1
+    if len(leaves) == 1:
+        lengths[leaves[0][1]] = 1
+    return lengths
+
+
 class HuffmanCodec:
     """
     Contain methods for encode and decode bin data
-    with huffman algorithm and calculate checksum with md5
+    with huffman algorithm and calculate checksum with md5.
+    Codes are canonical, so table can be restored by code lengths,
+    they are not longer than max_length, if it is set.
     """
 
+    def __init__(self, max_length: Optional[int] = MAX_CODE_LENGTH):
+        self.max_length = max_length
+
     def encode(self, data: bytes) -> tuple:
         """Encode bin data with huffman algorithm."""
 
-        weights_nodes = self.count_frequencies(data)
-        tree = self.create_tree(weights_nodes)
-        encoded_data, codes_table = self.__encode(tree, data)
+        codes_table = self.create_canonical_codes(
+            self.get_limited_code_lengths(self.count_frequencies(data)))
+        encoded_data = bitarray()
+        encoded_data.encode(codes_table, data)
         return encoded_data, codes_table
 
+    def get_code_lengths(self, tree: Node) -> dict:
+        """
+        Get lengths of codes of all chars in bin tree.
+        Tree is walked by stack, codes themselves are not built.
+        """
+
+        if tree.left_child is None and tree.right_child is None:
+            return {tree.char: 1}
+        code_lengths = {}
+        stack = [(tree, 0)]
+        while stack:
+            node, depth = stack.pop()
+            if node.left_child is None and node.right_child is None:
+                code_lengths[node.char] = depth
+            else:
+                stack.append((node.right_child, depth + 1))
+                stack.append((node.left_child, depth + 1))
+        return code_lengths
+
+    def get_limited_code_lengths(self, weights: dict,
+                                 max_length: Optional[int] = None) -> dict:
+        """
+        Get code lengths of chars, not longer than max_length
+        (max_length of codec by default), see get_huffman_code_lengths.
+        """
+
+        if max_length is None:
+            max_length = self.max_length
+        counts = [0] * (max(weights, default=-1) + 1)
+        for char, weight in weights.items():
+            counts[char] = weight
+        return {char: length for char, length
+                in enumerate(get_huffman_code_lengths(counts, max_length))
+                if length}
+
     @staticmethod
-    def count_frequencies(data: bytes) -> collections.defaultdict:
-        """Calculate weights of current node by freq analysis."""
+    def create_canonical_codes(code_lengths: dict) -> dict:
+        """
+        Get canonical huffman codes by code lengths.
+        Shorter codes go first, codes of the same length
+        are ordered by chars.
+        """
 
-        weights = collections.defaultdict(int)
-        for byte in data:
-            weights[byte] += 1
-        return weights
+        codes_table = {}
+        code = 0
+        previous_length = 0
+        for char, length in sorted(code_lengths.items(),
+                                   key=lambda item: (item[1], item[0])):
+            code <<= length - previous_length
+            codes_table[char] = _get_code_bits(code, length)
+            code += 1
+            previous_length = length
+        return codes_table
+
+    @staticmethod
+    def pack_code_lengths(code_lengths: dict) -> bytes:
+        """
+        Pack code lengths of 256 chars to bytes.
+        First byte is count of bits for one length,
+        then every char has flag bit and length, if flag is set.
+        """
+
+        width = max(code_lengths.values(), default=0).bit_length()
+        # строка битов собирается целиком, это быстрее побитовой записи
+        bits = bitarray(''.join(
+            f'1{code_lengths[char]:0{width}b}'
+            if code_lengths.get(char) else '0' for char in range(256)))
+        return bytes([width]) + bits.tobytes()
+
+    @staticmethod
+    def unpack_code_lengths(data: bytes, offset: int = 0) -> tuple:
+        """
+        Get code lengths from packed bytes.
+        Return code lengths and offset after them.
+        """
+
+        width = data[offset]
+        bits = bitarray()
+        bits.frombytes(data[offset + 1:offset + 1 + 256 * (width + 1) // 8])
+        code_lengths = {}
+        position = 0
+        for char in range(256):
+            if position >= len(bits):
+                raise errors.BrokenArchiveError()
+            position += 1
+            if bits[position - 1]:
+                length = ba2int(bits[position:position + width])
+                if not length:
+                    raise errors.BrokenArchiveError()
+                code_lengths[char] = length
+                position += width
+        check_code_lengths(code_lengths)
+        return code_lengths, offset + 1 + (position + 7) // 8
+
+    @staticmethod
+    def count_frequencies(data: bytes) -> collections.Counter:
+        """Count every byte of data, bytes are counted by Counter in C."""
+
+        return collections.Counter(data)
 
     @staticmethod
     def create_tree(weights: DefaultDict) -> heapq:
@@ -75,7 +318,7 @@ class HuffmanCodec:
         return codes_from_tree
 
     def get_code_from_node(self, node: Node,
-                           code: tuple = None) -> collections.Iterable:
+                           code: tuple = None) -> Iterable:
         """Get Code of the node by other nodes."""
 
         if not code:
@@ -95,22 +338,51 @@ class HuffmanCodec:
             yield from self.get_code_from_node(node.right_child,
                                                code_from_node)
 
-    def __encode(self, tree: Node, data_to_encode: bytes) -> tuple:
-        codes_table = self.collect_codes_from_tree(tree)
-        encoded_data = bitarray()
-        encoded_data.encode(codes_table, data_to_encode)
-        return encoded_data, codes_table
-
     @staticmethod
     def get_checksum(data: bytes) -> bytes:
         """Get checksum by md5 hash."""
 
         return md5(data).digest()
 
+    @staticmethod
+    def create_checksum():
+        """Get md5 hash object to calculate checksum by parts."""
+
+        return md5()
+
+    @staticmethod
+    def create_decoder(code_lengths: dict) -> decodetree:
+        """
+        Get decoding tree of canonical codes by code lengths.
+        Tree is built once and can be used for many blocks.
+        """
+
+        return decodetree(HuffmanCodec.create_canonical_codes(code_lengths))
+
+    @staticmethod
+    def decode_canonical(decoder: decodetree, encoded_data: bytes,
+                         skip_length: int) -> bytes:
+        """
+        Decode binary data, encoded by canonical huffman codes,
+        with decoding tree from create_decoder.
+        """
+
+        decoded_data = bitarray()
+        decoded_data.frombytes(encoded_data)
+        # отбрасываем биты выравнивания на месте, без копии
+        del decoded_data[skip_length:]
+        try:
+            return bytes(decoded_data.decode(decoder))
+        except ValueError:
+            raise errors.BrokenArchiveError()
+
     @staticmethod
     def decode(codes_table: dict, encoded_data: bytes,
                skip_length: int) -> bytes:
-        """Decode binary data, encoded by huffman algorithm."""
+        """
+        Decode binary data, encoded by huffman algorithm.
+        Codes in table are strings of bits, like in old archives.
+        """
 
         bit_code_table = {}
         for key in codes_table:
@@ -120,6 +392,6 @@ class HuffmanCodec:
             bit_code_table[int(key)] = bits
         decoded_data = bitarray()
         decoded_data.frombytes(encoded_data)
-        decoded_data = decoded_data[:skip_length]
+        del decoded_data[skip_length:]
         decoded_data_bytes = bytes(decoded_data.decode(bit_code_table))
         return decoded_data_bytes
@@ -1,4 +1,7 @@
-from typing import List, Sequence
+import collections
+import math
+from array import array
+from typing import Iterable, Optional, Sequence
 from deflate import errors
 
 
@@ -31,86 +34,428 @@ class Codeword:
                    and self.char == other.char
 
 
+class CodewordArray:
+    """
+    Sequence of LZ77 codewords, stored in three arrays:
+    offsets, lengths and chars.
+    Codeword objects are created only when items are accessed.
+    """
+
+    def __init__(self, offsets: Iterable[int] = (),
+                 lengths: Iterable[int] = (),
+                 chars: Iterable[int] = ()):
+        # extend, т.к. array('H', bytes) читает bytes как машинные числа
+        self.offsets = array('H')
+        self.offsets.extend(offsets)
+        self.lengths = array('H')
+        self.lengths.extend(lengths)
+        self.chars = array('B')
+        self.chars.extend(chars)
+        if not len(self.offsets) == len(self.lengths) == len(self.chars):
+            raise ValueError('arrays of codewords must have the same length')
+
+    @classmethod
+    def from_codewords(cls, codewords: Iterable[Codeword]) -> 'CodewordArray':
+        """Create array from Codeword objects."""
+
+        codeword_array = cls()
+        for codeword in codewords:
+            if codeword.offset < 0:
+                raise errors.CodewordOffsetNegativeError()
+            codeword_array.append(codeword.offset, codeword.length,
+                                  codeword.char)
+        return codeword_array
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'CodewordArray':
+        """Create array from bytes of offset, length and char triples."""
+
+        if len(data) % 3 != 0:
+            raise errors.BrokenArchiveError()
+        return cls(data[0::3], data[1::3], data[2::3])
+
+    def to_bytes(self) -> bytes:
+        """Get bytes of offset, length and char triples."""
+
+        data = bytearray(3 * len(self))
+        data[0::3] = array('B', self.offsets)
+        data[1::3] = array('B', self.lengths)
+        data[2::3] = self.chars
+        return bytes(data)
+
+    def append(self, offset: int, length: int, char: int) -> None:
+        self.offsets.append(offset)
+        self.lengths.append(length)
+        self.chars.append(char)
+
+    def __len__(self):
+        return len(self.chars)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return CodewordArray(self.offsets[index], self.lengths[index],
+                                 self.chars[index])
+        return Codeword(self.offsets[index], self.lengths[index],
+                        self.chars[index])
+
+    def get_data_length(self, char_after_match: bool = True) -> int:
+        """
+        Get length of data, encoded by codewords. Match is followed
+        by char, if char_after_match, else codeword is match or char.
+        """
+
+        chars_count = len(self) if char_after_match \
+            else self.offsets.count(0)
+        return sum(self.lengths) + chars_count
+
+    def __iter__(self):
+        for offset, length, char in zip(self.offsets, self.lengths,
+                                        self.chars):
+            yield Codeword(offset, length, char)
+
+    def __eq__(self, other):
+        if isinstance(other, CodewordArray):
+            return self.offsets == other.offsets \
+                   and self.lengths == other.lengths \
+                   and self.chars == other.chars
+        return len(self) == len(other) \
+            and all(codeword == other_codeword
+                    for codeword, other_codeword in zip(self, other))
+
+
+def estimate_bit_costs(counts: dict, symbol_count: int) -> list:
+    """
+    Estimate code lengths in bits of symbols from 0 to symbol_count - 1
+    by their counts. Every symbol is counted once more,
+    so symbols, which were not met, have finite cost.
+    """
+
+    total = sum(counts.values()) + symbol_count
+    return [math.log2(total / (counts.get(symbol, 0) + 1))
+            for symbol in range(symbol_count)]
+
+
+class CodewordCostModel:
+    """
+    Bit costs of codewords for optimal parsing.
+    Offset, length and char of codeword are bytes of one huffman code,
+    cost of byte is estimated by its count in codewords.
+    Cost of literal is cost of its codeword with zero offset and length,
+    cost of match is sum of offset_cost, length_costs
+    and char_costs of char after match.
+    """
+
+    def __init__(self, byte_costs: Sequence[float]):
+        self.literal_costs = [2 * byte_costs[0] + cost
+                              for cost in byte_costs]
+        self.length_costs = byte_costs
+        self.char_costs = byte_costs
+        self.offset_costs = byte_costs
+
+    def offset_cost(self, offset: int) -> float:
+        return self.offset_costs[offset]
+
+    @classmethod
+    def from_codewords(cls, codewords: CodewordArray) -> 'CodewordCostModel':
+        """Create model by counts of bytes in codewords."""
+
+        return cls(estimate_bit_costs(
+            collections.Counter(codewords.to_bytes()), 256))
+
+
 class LZ77Codec:
     """
     Contain methods to encode and decode bin data with LZ77 algorithm.
     Requires size of sliding window.
+    Matches are searched with hash chains of 3-byte prefixes:
+    max_chain limits count of checked positions for one match and
+    search stops when match is not shorter than nice_length.
+    Matches shorter than max_lazy are compared with match
+    at next position (lazy matching), 0 means greedy search.
+    Lazy search checks max_chain / 4 positions,
+    if current match is not shorter than good_length.
+    Matches are from min_length to max_length (window_length - 1
+    by default) bytes. If char_after_match is False,
+    codewords with offset are matches only and their char is 0,
+    chars are stored in codewords without offset.
+    Optimal parsing chooses codewords with the least cost in bits
+    by cost_model, which is built by codewords of lazy parsing.
     """
 
-    def __init__(self, window_length):
+    hash_length = 3
+
+    def __init__(self, window_length: int, max_chain: int = 128,
+                 nice_length: int = 128, max_lazy: int = 0,
+                 good_length: int = 0, max_length: Optional[int] = None,
+                 min_length: int = 1, char_after_match: bool = True,
+                 optimal: bool = False,
+                 cost_model: type = CodewordCostModel):
         self.window_length = window_length
+        self.max_length = window_length - 1 if max_length is None \
+            else max_length
+        self.min_length = min_length
+        self.char_after_match = char_after_match
+        self.max_chain = max_chain
+        self.nice_length = nice_length
+        self.max_lazy = max_lazy
+        self.good_length = good_length
+        self.optimal = optimal
+        self.cost_model = cost_model
         self.buffer = None
+        self.head = {}
+        self.chain = array('l')
 
-    def encode(self, data: bytes) -> list:
+    def encode(self, data: bytes, history: bytes = b'') -> CodewordArray:
         """
         Encode bin data with LZ77 algorithm.
-        Return list of Codewords
+        History is data before the current one,
+        codewords can refer to its last window_length bytes.
+        Return array of Codewords
+        """
+
+        history = history[max(0, len(history) - self.window_length + 1):]
+        data = history + data
+        encoded_data = self.parse_lazy(data, len(history))
+        if self.optimal:
+            encoded_data = self.parse_optimal(
+                data, len(history),
+                self.cost_model.from_codewords(encoded_data))
+        return encoded_data
+
+    def reset(self, data: bytes, start: int) -> None:
+        """
+        Set buffer and add its positions before start to hash chains.
+        Array of chains is allocated once: old links are never followed,
+        because every position is linked, when it is added.
         """
 
         self.buffer = data
-        encoded_data = []
-        position = 0
+        self.head.clear()
+        if len(self.chain) != max(self.window_length, 1):
+            self.chain = array('l', [-1]) * max(self.window_length, 1)
+        self.insert_positions(0, start)
+
+    def parse_lazy(self, data: bytes, start: int) -> CodewordArray:
+        """Get codewords of data from start by greedy or lazy matching."""
+
+        self.reset(data, start)
+        encoded_data = CodewordArray()
+        position = start
         while position < len(data):
-            codeword = self.codeword_for_position(position)
-            position += len(codeword)
-            while codeword.length > self.window_length:
-                codeword_split = Codeword(codeword.offset,
-                                          self.window_length - 1,
-                                          codeword.char)
-                codeword = Codeword(codeword.offset + 1,
-                                    codeword.length -
-                                    self.window_length,
-                                    codeword.char)
-                encoded_data.append(codeword_split)
-                continue
-            encoded_data.append(codeword)
+            offset, length = self.find_match(position)
+            inserted = position
+            while 0 < length < self.max_lazy and position + 1 < len(data):
+                self.insert_positions(inserted, position + 1)
+                inserted = position + 1
+                max_chain = self.max_chain
+                if length >= self.good_length:
+                    max_chain >>= 2
+                next_offset, next_length = self.find_match(position + 1,
+                                                           max_chain)
+                if next_length <= length:
+                    break
+                encoded_data.append(0, 0, data[position])
+                position += 1
+                offset, length = next_offset, next_length
+            if self.char_after_match or not length:
+                self.insert_positions(inserted, position + length + 1)
+                encoded_data.append(offset, length, data[position + length])
+                position += length + 1
+            else:
+                self.insert_positions(inserted, position + length)
+                encoded_data.append(offset, length, 0)
+                position += length
         return encoded_data
 
-    def codeword_for_position(self, position: int) -> Codeword:
-        """Get codeword with position of sequence."""
+    def parse_optimal(self, data: bytes, start: int,
+                      cost_model) -> CodewordArray:
+        """
+        Get codewords of data from start with the least cost.
+        Cost of every position is found from costs of previous ones,
+        all lengths of found matches are checked,
+        but matches not shorter than nice_length are taken whole.
+        """
+
+        self.reset(data, start)
+        after_match = 1 if self.char_after_match else 0
+        costs = [math.inf] * (len(data) + 1)
+        costs[start] = 0
+        steps = [(0, 0)] * (len(data) + 1)
+        literal_costs = cost_model.literal_costs
+        length_costs = cost_model.length_costs
+        char_costs = cost_model.char_costs
+        for position in range(start, len(data)):
+            cost = costs[position]
+            matches = self.find_matches(position)
+            self.insert_positions(position, position + 1)
+            literal_cost = cost + literal_costs[data[position]]
+            if literal_cost < costs[position + 1]:
+                costs[position + 1] = literal_cost
+                steps[position + 1] = (0, 0)
+            min_length = self.min_length
+            for offset, max_length in matches:
+                offset_cost = cost + cost_model.offset_cost(offset)
+                if max_length >= self.nice_length:
+                    min_length = max_length
+                for length in range(min_length, max_length + 1):
+                    match_cost = offset_cost + length_costs[length]
+                    if after_match:
+                        match_cost += char_costs[data[position + length]]
+                    next_position = position + length + after_match
+                    if match_cost < costs[next_position]:
+                        costs[next_position] = match_cost
+                        steps[next_position] = (offset, length)
+                min_length = max_length + 1
 
-        longest_match_length = 0
-        longest_match_offset = 0
-        start_offset = 1
-        start_position = position - start_offset
+        parsed_steps = []
+        position = len(data)
+        while position > start:
+            offset, length = steps[position]
+            position -= length + after_match if offset else 1
+            parsed_steps.append((position, offset, length))
+        encoded_data = CodewordArray()
+        for position, offset, length in reversed(parsed_steps):
+            if not offset:
+                encoded_data.append(0, 0, data[position])
+            elif after_match:
+                encoded_data.append(offset, length, data[position + length])
+            else:
+                encoded_data.append(offset, length, 0)
+        return encoded_data
 
-        while start_offset < self.window_length and start_position >= 0:
-            match_length = self.get_max_match_len(start_position, position)
-            if match_length > longest_match_length:
-                longest_match_length = match_length
-                longest_match_offset = start_offset
-            start_position -= 1
-            start_offset += 1
+    def insert_positions(self, start: int, end: int) -> None:
+        """Add positions of buffer to hash chains."""
 
-        return Codeword(longest_match_offset, longest_match_length,
-                        self.buffer[position + longest_match_length])
+        data = self.buffer
+        head = self.head
+        chain = self.chain
+        window_length = self.window_length
+        end = min(end, len(data) - self.hash_length + 1)
+        for position in range(start, end):
+            key = data[position:position + self.hash_length]
+            chain[position % window_length] = head.get(key, -1)
+            head[key] = position
+
+    def codeword_for_position(self, position: int,
+                              max_chain: Optional[int] = None) -> Codeword:
+        """
+        Get codeword with position of sequence.
+        All previous positions must be added to hash chains.
+        """
+
+        offset, length = self.find_match(position, max_chain)
+        return Codeword(offset, length, self.buffer[position + length])
+
+    def find_match(self, position: int,
+                   max_chain: Optional[int] = None) -> tuple:
+        """
+        Get offset and length of longest match for position,
+        which leaves a char after match, if it is needed.
+        All previous positions must be added to hash chains.
+        """
+
+        matches = self.find_matches(position, max_chain)
+        return matches[-1] if matches else (0, 0)
+
+    def find_matches(self, position: int,
+                     max_chain: Optional[int] = None) -> list:
+        """
+        Get offsets and lengths of matches for position,
+        every next match is longer and further than previous one.
+        Match of any length up to length of some match
+        can be taken from it.
+        """
+
+        data = self.buffer
+        matches = []
+        limit = min(self.max_length,
+                    len(data) - position - self.char_after_match)
+        longest_match_length = 0
+        if limit >= self.hash_length:
+            candidate = self.head.get(
+                data[position:position + self.hash_length], -1)
+            chain_length = self.max_chain if max_chain is None else max_chain
+            while candidate >= 0 and chain_length > 0 \
+                    and position - candidate < self.window_length:
+                if data[candidate + longest_match_length] == \
+                        data[position + longest_match_length]:
+                    match_length = self.get_max_match_len(candidate,
+                                                          position, limit)
+                    if match_length > longest_match_length:
+                        longest_match_length = match_length
+                        matches.append((position - candidate, match_length))
+                        if match_length >= self.nice_length \
+                                or match_length == limit:
+                            break
+                candidate = self.chain[candidate % self.window_length]
+                chain_length -= 1
+        if longest_match_length < self.hash_length:
+            # короткие совпадения не попадают в цепочки, ищем их напрямую
+            start = max(0, position - self.window_length + 1)
+            for match_length in range(min(self.hash_length - 1, limit),
+                                      self.min_length - 1, -1):
+                found = data.rfind(data[position:position + match_length],
+                                   start, position + match_length - 1)
+                if found >= 0:
+                    matches.append((position - found, match_length))
+                    break
+        return matches
 
     def get_max_match_len(self, pattern_position: int,
-                          matching_position: int) -> int:
-        """Get length of max substring."""
+                          matching_position: int, limit: int) -> int:
+        """Get length of max substring, but not longer than limit."""
 
+        data = self.buffer
         match_length = 0
-        while matching_position + match_length + 1 < len(self.buffer):
-            if self.buffer[pattern_position + match_length] != \
-                    self.buffer[matching_position + match_length]:
-                break
-            match_length += 1
+        step = 64
+        while step:
+            if match_length + step <= limit \
+                    and data[pattern_position + match_length:
+                             pattern_position + match_length + step] == \
+                    data[matching_position + match_length:
+                         matching_position + match_length + step]:
+                match_length += step
+            else:
+                step >>= 1
         return match_length
 
     @staticmethod
-    def decode(codewords: List[Codeword]) -> bytes:
-        """Get decoded bin data by list of codewords."""
+    def decode(codewords: Iterable[Codeword], history: bytes = b'') -> bytes:
+        """
+        Get decoded bin data by array of codewords.
+        Codewords can refer to history, which is not included in result.
+        Data is written to buffer of known size, matches are copied
+        by slices, overlapping matches - by doubling slices.
+        """
 
-        buffer = bytes()
-        for codeword in codewords:
-            if codeword.offset > len(buffer):
+        if not isinstance(codewords, CodewordArray):
+            codewords = CodewordArray.from_codewords(codewords)
+        position = len(history)
+        buffer = bytearray(position + len(codewords) +
+                           sum(length for offset, length
+                               in zip(codewords.offsets, codewords.lengths)
+                               if offset))
+        buffer[:position] = history
+        view = memoryview(buffer)
+        for offset, length, char in zip(codewords.offsets,
+                                        codewords.lengths, codewords.chars):
+            if offset > position:
                 raise errors.CodewordNotInWindowError()
-            elif codeword.offset < 0:
-                raise errors.CodewordOffsetNegativeError()
-            elif codeword.offset > 0:
-                position = len(buffer) - codeword.offset
-                for i in range(codeword.length):
-                    buffer += bytes([buffer[position]])
-                    position += 1
-            buffer += bytes([codeword.char])
-        return buffer
+            elif offset > 0:
+                start = position - offset
+                if length <= offset:
+                    view[position:position + length] = \
+                        view[start:start + length]
+                else:
+                    # копируем период, затем удваиваем уже скопированное
+                    view[position:position + offset] = view[start:position]
+                    copied = offset
+                    while copied < length:
+                        chunk = min(copied, length - copied)
+                        view[position + copied:position + copied + chunk] = \
+                            view[position:position + chunk]
+                        copied += chunk
+                position += length
+            buffer[position] = char
+            position += 1
+        return bytes(view[len(history):])
@@ -1,3 +1,6 @@
+from typing import Optional
+
+
 class DeflateError(Exception):
     message = "Error"
 
@@ -15,8 +18,82 @@ class CodewordOffsetNegativeError(DeflateError):
 
 
 class NotArchiveError(DeflateError):
-    message = 'File extension is not .dfa'
+    message = 'File extension is not .dfa, .gz or .zz'
 
 
 class BrokenArchiveError(DeflateError):
     message = 'Can not decode data'
+
+
+class WrongLevelError(DeflateError):
+    message = 'Compression level must be from 1 to 9'
+
+
+class UnknownVersionError(DeflateError):
+    message = 'Archive version is not supported'
+
+
+class UnknownCodecError(DeflateError):
+    message = 'Codec must be lz77 or deflate'
+
+
+class UnknownContainerError(DeflateError):
+    message = 'Container must be dfa, gzip or zlib'
+
+
+class ContainerCodecError(DeflateError):
+    message = 'gzip and zlib containers support only deflate codec'
+
+
+class NotSeekableError(DeflateError):
+    message = 'Archive has no block index'
+
+
+class NotDictionaryError(DeflateError):
+    message = 'File is not deflate dictionary'
+
+
+class DictionaryRequiredError(DeflateError):
+    message = 'Archive is compressed with dictionary, set it to decompress'
+
+
+class WrongDictionaryError(DeflateError):
+    message = 'Dictionary does not match archive'
+
+
+class DictionaryContainerError(DeflateError):
+    message = 'gzip container does not support dictionaries'
+
+
+class EntryNotFoundError(DeflateError):
+    message = 'Archive has no such entry'
+
+
+class EntriesArchiveError(DeflateError):
+    message = 'Archive contains several files, extract them as entries'
+
+
+class NotAppendableError(DeflateError):
+    message = 'Data can be appended only to indexed dfa or to gzip archive'
+
+
+class AppendedCodecError(DeflateError):
+    message = 'Appended data must be compressed with codec of archive'
+
+
+class WrongBlockChecksumError(WrongChecksumError):
+    message = 'Wrong checksum of block'
+
+    def __init__(self, offset: Optional[int] = None):
+        super().__init__()
+        if offset is not None:
+            self.message = f'Wrong checksum of block at byte {offset}' \
+                           f' of original data'
+
+
+class UnknownChecksumError(DeflateError):
+    message = 'Checksum must be md5, crc32, adler32 or none'
+
+
+class ArchiveOverSourceError(DeflateError):
+    message = 'Archive can not be written over compressed file'
@@ -0,0 +1,137 @@
+"""
+Layout of .dfa archive.
+
+Legacy archive (version 0) has no signature:
+filename length, filename, md5 checksum and one block.
+Stream archive (version 1) starts with MAGIC and version byte,
+then filename length, filename, framed blocks and md5 checksum:
+each block is prefixed with its original and packed length,
+block with zero lengths marks the end of blocks.
+Indexed archive (version 2) has flags byte after version
+and block index after checksum: offsets of every block in original
+and in compressed data with packed length of block,
+then offset of index and count of blocks.
+Since version 3 huffman table of block is stored as code lengths
+of canonical codes instead of json with codes.
+Since version 4 blocks can be DEFLATE bitstreams (RFC 1951),
+if DEFLATE_BLOCKS flag is set: every block is final and padded
+to whole byte, matches can refer to 32 KiB of previous blocks.
+Since version 5 archive can be compressed with preset dictionary,
+if DICTIONARY flag is set: ID of dictionary follows flags byte,
+dictionary content is history of the first block (or of every block,
+if they are independent). Block of lz77 codec with zero width
+of code lengths uses shared table of dictionary.
+Since version 7 block of lz77 codec consists of parts, where
+statistics of codewords change: every part has own table,
+uses shared table or is stored (STORED_PART byte, length, data).
+DEFLATE blocks of archive can consist of several RFC 1951 blocks.
+Since version 8 data can be appended to archive as segments:
+blocks of every segment end with block header of zero original length
+and CHECKSUM_SIZE packed length, then checksum of data of segment
+follows; the last segment ends as before. Segment starts
+with initial history, block index covers blocks of all segments.
+Since version 9 flags byte has type of checksum of data
+(CHECKSUM_TYPES, md5 by default) and BLOCK_CHECKSUMS flag:
+if it is set, packed block starts with CRC-32 of its original data.
+End of segment has SEGMENT_END packed length, checksum of segment
+has size of checksum of archive type.
+
+Archive of several files (entries archive) starts with MAGIC,
+ENTRIES_VERSION and flags byte, then archives of every file follow
+one by one, then central directory: for every entry offset and
+length of its archive, original size, name length and name,
+then offset of directory and count of entries.
+Every entry can be extracted without reading the others.
+"""
+import struct
+from deflate.handlers import containers
+
+MAGIC = b'DFA'
+LEGACY_VERSION = 0
+STREAM_VERSION = 1
+INDEXED_VERSION = 2
+CANONICAL_VERSION = 3
+DEFLATE_VERSION = 4
+DICTIONARY_VERSION = 5
+ENTRIES_VERSION = 6
+SPLIT_VERSION = 7
+SEGMENTS_VERSION = 8
+CHECKSUMS_VERSION = 9
+VERSION = CHECKSUMS_VERSION
+CHUNK_SIZE = 64 * 1024
+
+# блоки не ссылаются на предыдущие и могут разжиматься параллельно
+INDEPENDENT_BLOCKS = 1
+# блоки закодированы битовым потоком DEFLATE, а не кодовыми словами LZ77
+DEFLATE_BLOCKS = 2
+# архив сжат с предустановленным словарем
+DICTIONARY = 4
+# у каждого блока есть CRC-32 исходных данных
+BLOCK_CHECKSUMS = 8
+# биты флагов с номером типа контрольной суммы в CHECKSUM_TYPES
+CHECKSUM_SHIFT = 4
+CHECKSUM_MASK = 3 << CHECKSUM_SHIFT
+
+# кодек блоков: lz77 - кодовые слова LZ77 со сжатием по Хаффману,
+# deflate - RFC 1951 (флаг DEFLATE_BLOCKS)
+LZ77_CODEC = 'lz77'
+DEFLATE_CODEC = 'deflate'
+CODECS = (LZ77_CODEC, DEFLATE_CODEC)
+
+# вместо ширины длин кодов: блок кодирован общей таблицей словаря
+SHARED_TABLE = 0
+# вместо ширины длин кодов: часть блока хранится без сжатия
+STORED_PART = 0xff
+
+# длина упакованного конца сегмента в версии 8 - длина md5
+CHECKSUM_SIZE = 16
+SEGMENT_END = 0xffffffff
+
+FILENAME_LENGTH = struct.Struct('<H')
+BLOCK_HEADER = struct.Struct('<II')
+BITS_LENGTH = struct.Struct('<I')
+STORED_LENGTH = struct.Struct('<I')
+BLOCK_CHECKSUM = struct.Struct('<I')
+INDEX_ENTRY = struct.Struct('<QQI')
+INDEX_FOOTER = struct.Struct('<QI')
+DICTIONARY_ID = struct.Struct('<I')
+DIRECTORY_ENTRY = struct.Struct('<QQQH')
+DIRECTORY_FOOTER = struct.Struct('<QI')
+
+
+class NoChecksum:
+    """Checksum of archive without checksum, digest is empty."""
+
+    def update(self, data: bytes) -> None:
+        pass
+
+    def digest(self) -> bytes:
+        return b''
+
+
+MD5 = 'md5'
+# порядок задает номер типа во флагах, md5 - нулевой для старых архивов;
+# hashlib импортируется при создании суммы md5
+CHECKSUM_TYPES = {
+    MD5: None,
+    'crc32': containers.Crc32,
+    'adler32': containers.Adler32,
+    'none': NoChecksum,
+}
+
+
+def create_checksum(checksum_type: str = MD5):
+    """Get object to calculate checksum of type by parts."""
+
+    if checksum_type == MD5:
+        import hashlib
+        return hashlib.md5()
+    return CHECKSUM_TYPES[checksum_type]()
+
+
+def get_checksum_type(flags: int) -> str:
+    return list(CHECKSUM_TYPES)[(flags & CHECKSUM_MASK) >> CHECKSUM_SHIFT]
+
+
+def get_checksum_flags(checksum_type: str) -> int:
+    return list(CHECKSUM_TYPES).index(checksum_type) << CHECKSUM_SHIFT
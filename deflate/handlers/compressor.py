@@ -1,11 +1,119 @@
-import json
-import struct
+import collections
+import io
+import os
+import re
 import time
-from datetime import datetime
+import zlib
 from pathlib import Path
+from typing import TYPE_CHECKING, BinaryIO, Iterable, Iterator, \
+    NamedTuple, Optional
 from bitarray import bitarray
-from deflate.codecs.huffman import HuffmanCodec
+from deflate.codecs.deflate import DeflateCodec, WINDOW_LENGTH
+from deflate.codecs.huffman import HuffmanCodec, estimate_codes_size, \
+    split_blocks, SPLIT_LENGTH
 from deflate.codecs.lz77 import LZ77Codec
+from deflate.handlers import archive, containers, parallel
+from deflate.handlers.stats import CompressionStats, READ_STAGE, \
+    PRECHECK_STAGE, CHECKSUM_STAGE, LZ77_STAGE, SERIALIZE_STAGE, \
+    HUFFMAN_STAGE, PACK_STAGE, DEFLATE_STAGE, WRITE_STAGE
+from deflate.handlers.dictionary import Dictionary
+from deflate import errors
+
+# asyncio и пул процессов импортируются при первом использовании,
+# так быстрее запуск командной строки
+if TYPE_CHECKING:
+    from concurrent.futures import Executor
+
+
+class Level(NamedTuple):
+    """Parameters of LZ77 match search for compression level."""
+
+    max_chain: int
+    nice_length: int
+    max_lazy: int
+    good_length: int
+    optimal: bool = False
+
+
+# как в zlib: 1-3 жадный поиск, 4-8 ленивый, 9 - оптимальный разбор;
+# 9 ищет совпадения на каждой позиции по длинным цепочкам, поэтому
+# с DEFLATE он в 15-20 раз медленнее уровня 6
+LEVELS = {
+    1: Level(max_chain=4, nice_length=8, max_lazy=0, good_length=0),
+    2: Level(max_chain=8, nice_length=16, max_lazy=0, good_length=0),
+    3: Level(max_chain=32, nice_length=32, max_lazy=0, good_length=0),
+    4: Level(max_chain=16, nice_length=16, max_lazy=4, good_length=4),
+    5: Level(max_chain=32, nice_length=32, max_lazy=16, good_length=8),
+    6: Level(max_chain=128, nice_length=128, max_lazy=16, good_length=8),
+    7: Level(max_chain=256, nice_length=128, max_lazy=32, good_length=8),
+    8: Level(max_chain=1024, nice_length=255, max_lazy=128, good_length=32),
+    9: Level(max_chain=4096, nice_length=255, max_lazy=255, good_length=32,
+             optimal=True),
+}
+DEFAULT_LEVEL = 6
+
+# несжимаемость данных проверяется по стольким окнам такой длины:
+# энтропия байтов окна не меньше MIN_ENTROPY бит и почти нет
+# повторов PROBE_LENGTH байт (у случайных данных их нет совсем)
+SAMPLES_COUNT = 4
+SAMPLE_LENGTH = 4096
+MIN_ENTROPY = 7.8
+PROBE_LENGTH = 4
+MAX_REPEATS = 0.01
+# окна могут попасть на случайные участки почти сжимаемого блока,
+# поэтому затем дёшево проверяется весь блок: энтропия всех байтов
+# и повторы строк ANCHOR_LENGTH байт, начинающихся с байта ANCHOR, -
+# повтор данных с любым сдвигом повторяет и эти строки
+ANCHOR = re.compile(b'\x00')
+ANCHOR_LENGTH = 8
+
+# имена кодеков в archive, чтобы разбор командной строки их не ждал
+LZ77_CODEC = archive.LZ77_CODEC
+DEFLATE_CODEC = archive.DEFLATE_CODEC
+CODECS = archive.CODECS
+
+
+def estimate_part_size(counts: dict) -> float:
+    """
+    Estimate size in bits of part of block by counts of codewords bytes:
+    codes are not shorter than entropy, table has width byte, flag bit
+    for every byte and about 4 bits for every code length.
+    """
+
+    return estimate_codes_size(counts) + 8 * (1 + 4) + 256 + 4 * len(counts)
+
+
+def is_incompressible(data: bytes) -> bool:
+    """
+    Check by sampled windows, if data looks incompressible,
+    like already compressed or encrypted data. Repeats are searched
+    in the window and in previous windows, then entropy and repeats
+    of anchored strings are checked over the whole data.
+    Data shorter than window is always checked by compression.
+    """
+
+    if len(data) < SAMPLE_LENGTH:
+        return False
+    step = max(SAMPLE_LENGTH,
+               (len(data) - SAMPLE_LENGTH) // (SAMPLES_COUNT - 1))
+    probes = set()
+    for start in range(0, len(data) - SAMPLE_LENGTH + 1, step):
+        window = data[start:start + SAMPLE_LENGTH]
+        entropy = estimate_codes_size(collections.Counter(window))
+        if entropy < MIN_ENTROPY * len(window):
+            return False
+        count = len(window) - PROBE_LENGTH + 1
+        known_count = len(probes)
+        probes.update(window[position:position + PROBE_LENGTH]
+                      for position in range(count))
+        if known_count + count - len(probes) > MAX_REPEATS * count:
+            return False
+    entropy = estimate_codes_size(collections.Counter(data))
+    if entropy < MIN_ENTROPY * len(data):
+        return False
+    anchors = [bytes(data[match.start():match.start() + ANCHOR_LENGTH])
+               for match in ANCHOR.finditer(data)]
+    return len(anchors) - len(set(anchors)) <= MAX_REPEATS * len(anchors)
 
 
 class TimeMeasure:
@@ -29,62 +137,643 @@ class Compressor:
     Contain methods to calculate compress ratio,
     read data from file and
     create new archive in File system.
+    Level from 1 (fastest) to 9 (best compression) sets match search.
+    Codec sets format of blocks: LZ77 codewords or DEFLATE bitstream.
+    Container is dfa archive or gzip or zlib with DEFLATE stream,
+    codec is lz77 for dfa and deflate for others by default.
+    Preset dictionary primes LZ77 window of blocks.
+    With stats compressor collects statistics of stages in stats.
     """
 
-    def __init__(self):
+    window_length = 256
+
+    def __init__(self, level: int = DEFAULT_LEVEL,
+                 codec: Optional[str] = None,
+                 container: str = containers.DFA,
+                 dictionary: Optional[Dictionary] = None,
+                 stats: bool = False, checksum_type: str = archive.MD5,
+                 block_checksums: bool = False):
+        if level not in LEVELS:
+            raise errors.WrongLevelError()
+        if checksum_type not in archive.CHECKSUM_TYPES:
+            raise errors.UnknownChecksumError()
+        if container not in containers.CONTAINERS:
+            raise errors.UnknownContainerError()
+        if codec is None:
+            codec = LZ77_CODEC if container == containers.DFA \
+                else DEFLATE_CODEC
+        if codec not in CODECS:
+            raise errors.UnknownCodecError()
+        if container != containers.DFA and codec != DEFLATE_CODEC:
+            raise errors.ContainerCodecError()
+        if container == containers.GZIP and dictionary is not None:
+            raise errors.DictionaryContainerError()
+        self.level = level
+        self.codec = codec
+        self.container = container
+        self.dictionary = dictionary
+        self.stats = CompressionStats() if stats else None
+        # тип суммы и суммы блоков - для dfa, у gzip и zlib свои суммы
+        self.checksum_type = checksum_type
+        self.block_checksums = block_checksums
         self.checksum = ""
 
+    @property
+    def history_length(self) -> int:
+        """Count of previous bytes, which blocks can refer to."""
+
+        if self.codec == DEFLATE_CODEC:
+            return WINDOW_LENGTH
+        return self.window_length
+
+    @property
+    def initial_history(self) -> bytes:
+        """History of the first block: content of dictionary, if it is set."""
+
+        if self.dictionary is None:
+            return b''
+        return self.dictionary.content[-self.history_length:]
+
+    def create_lz77_codec(self) -> LZ77Codec:
+        """Create LZ77 codec with match search parameters of level."""
+
+        if self.codec == DEFLATE_CODEC:
+            return DeflateCodec.create_lz77_codec(
+                **LEVELS[self.level]._asdict())
+        return LZ77Codec(self.window_length, **LEVELS[self.level]._asdict())
+
     def compress(self, data: bytes, filename: str) -> tuple:
         """
         Compress bin data with deflate algorithm.
         At first, compress data with LZ77 and then with huffman.
         """
 
+        compressed_data = io.BytesIO()
+        time_duration = self.compress_stream(io.BytesIO(data),
+                                             compressed_data, filename)[2]
+        return compressed_data.getvalue(), time_duration
+
+    async def compress_async(self, data: bytes, filename: str,
+                             executor: Optional['Executor'] = None) -> tuple:
+        """
+        Compress data like compress, but in executor (default one
+        of event loop if None), so event loop is not blocked.
+        Executor can be pool of processes.
+        """
+
+        import asyncio
+        return await asyncio.get_running_loop().run_in_executor(
+            executor, self.compress, data, filename)
+
+    async def compress_stream_async(self, reader, writer,
+                                    filename: str = '',
+                                    chunk_size: int = archive.CHUNK_SIZE,
+                                    jobs: Optional[int] = None,
+                                    executor: Optional['Executor'] = None
+                                    ) -> tuple:
+        """
+        Compress data like compress_stream in thread of executor.
+        Reader and writer can be asyncio streams or binary files,
+        writer is drained after every block, see streams module.
+        Blocks are compressed in jobs processes, if jobs is set.
+        """
+
+        from deflate.handlers import streams
+        return await streams.run_blocking(executor, self.compress_stream,
+                                          reader, writer, filename,
+                                          chunk_size, jobs)
+
+    def compress_stream(self, src: BinaryIO, dst: BinaryIO,
+                        filename: str = '',
+                        chunk_size: int = archive.CHUNK_SIZE,
+                        jobs: Optional[int] = None) -> tuple:
+        """
+        Compress data from src to dst by blocks of chunk_size bytes.
+        Used memory depends on chunk_size, not on size of data.
+        Without jobs LZ77 window is carried across blocks,
+        else blocks are independent and compressed in jobs processes
+        (0 means all CPUs), result does not depend on count of jobs.
+        Return original size, compressed size and duration.
+        """
+
+        if self.container != containers.DFA:
+            return self._compress_wrapped(src, dst, filename, chunk_size,
+                                          jobs)
+        with TimeMeasure() as measure:
+            flags = 0 if jobs is None else archive.INDEPENDENT_BLOCKS
+            if self.codec == DEFLATE_CODEC:
+                flags |= archive.DEFLATE_BLOCKS
+            if self.dictionary is not None:
+                flags |= archive.DICTIONARY
+            if self.block_checksums:
+                flags |= archive.BLOCK_CHECKSUMS
+            flags |= archive.get_checksum_flags(self.checksum_type)
+            header_size = dst.write(self._pack_header(filename, flags))
+            original_size, compressed_size = self._write_segment(
+                src, dst, chunk_size, jobs, header_size)
+
+        return original_size, compressed_size, measure.work_time
+
+    def append_stream(self, src: BinaryIO, dst: BinaryIO,
+                      filename: str = '',
+                      chunk_size: int = archive.CHUNK_SIZE,
+                      jobs: Optional[int] = None) -> tuple:
+        """
+        Compress data from src and append it to archive dst,
+        which is opened for reading and writing ('r+b').
+        Earlier blocks are not read and not rewritten:
+        dfa archive gets new segment of blocks with own checksum
+        and extended block index, gzip archive gets new member.
+        Blocks of segment refer only to initial history,
+        they are independent, if blocks of archive are.
+        Checksums of segment are of types of archive.
+        Segment is written after the end of archive, so archive is not
+        changed, if data can not be read or compressed.
+        Return original size of appended data, growth of size
+        of archive and duration.
+        """
+
+        if self.container == containers.GZIP:
+            dst.seek(0, io.SEEK_END)
+            return self._compress_wrapped(src, dst, filename, chunk_size,
+                                          jobs)
+        if self.container != containers.DFA:
+            raise errors.NotAppendableError()
+        with TimeMeasure() as measure:
+            version, flags = self._read_appended_header(dst)
+            # блоки сегмента такие же, как блоки архива: независимые
+            # или каждый ссылается на предыдущий
+            if not flags & archive.INDEPENDENT_BLOCKS:
+                jobs = None
+            elif jobs is None:
+                jobs = 1
+            segment_end = archive.SEGMENT_END
+            if version >= archive.CHECKSUMS_VERSION:
+                self.checksum_type = archive.get_checksum_type(flags)
+                self.block_checksums = bool(flags & archive.BLOCK_CHECKSUMS)
+            else:
+                self.checksum_type = archive.MD5
+                self.block_checksums = False
+                segment_end = archive.CHECKSUM_SIZE
+            checksum_size = len(
+                archive.create_checksum(self.checksum_type).digest())
+            archive_size = dst.seek(0, io.SEEK_END)
+            dst.seek(archive_size - archive.INDEX_FOOTER.size)
+            index_offset, count = archive.INDEX_FOOTER.unpack(
+                self._read_exactly(dst, archive.INDEX_FOOTER.size))
+            end_offset = index_offset - checksum_size \
+                - archive.BLOCK_HEADER.size
+            dst.seek(index_offset)
+            index = bytearray(self._read_exactly(
+                dst, count * archive.INDEX_ENTRY.size))
+            original_size = 0
+            if count:
+                original_offset, frame_offset, _ = \
+                    archive.INDEX_ENTRY.unpack_from(index, len(index) -
+                                                    archive.INDEX_ENTRY.size)
+                dst.seek(frame_offset)
+                original_size = original_offset + archive.BLOCK_HEADER.unpack(
+                    self._read_exactly(dst, archive.BLOCK_HEADER.size))[0]
+            dst.seek(end_offset)
+            if self._read_exactly(dst, archive.BLOCK_HEADER.size) != \
+                    archive.BLOCK_HEADER.pack(0, 0):
+                raise errors.BrokenArchiveError()
+            # сегмент пишется за концом архива со смещениями, какие у него
+            # будут на месте старого индекса, при ошибке чтения или сжатия
+            # архив обрезается до прежнего размера
+            dst.seek(archive_size)
+            try:
+                appended_size, compressed_size = self._write_segment(
+                    src, dst, chunk_size, jobs, index_offset, original_size,
+                    index)
+            except BaseException:
+                dst.truncate(archive_size)
+                raise
+            if version < archive.SEGMENTS_VERSION:
+                dst.seek(len(archive.MAGIC))
+                dst.write(bytes([archive.SEGMENTS_VERSION]))
+            # конец блоков становится концом сегмента, его сумма остается
+            dst.seek(end_offset)
+            dst.write(archive.BLOCK_HEADER.pack(0, segment_end))
+            self._move_tail(dst, archive_size, index_offset,
+                            compressed_size - index_offset, chunk_size)
+            dst.truncate(compressed_size)
+
+        return appended_size - original_size, \
+            compressed_size - archive_size, measure.work_time
+
+    def _read_appended_header(self, src: BinaryIO) -> tuple:
+        """
+        Read version and flags of archive to append,
+        check that they match codec and dictionary of compressor.
+        """
+
+        src.seek(0)
+        prefix = self._read_exactly(src, len(archive.MAGIC) + 1)
+        if prefix[:len(archive.MAGIC)] != archive.MAGIC:
+            raise errors.NotAppendableError()
+        version = prefix[-1]
+        if version == archive.ENTRIES_VERSION:
+            raise errors.EntriesArchiveError()
+        if version < archive.INDEXED_VERSION:
+            raise errors.NotAppendableError()
+        if version > archive.VERSION:
+            raise errors.UnknownVersionError()
+        flags = self._read_exactly(src, 1)[0]
+        if bool(flags & archive.DEFLATE_BLOCKS) != \
+                (self.codec == DEFLATE_CODEC):
+            raise errors.AppendedCodecError()
+        if flags & archive.DICTIONARY:
+            if self.dictionary is None:
+                raise errors.DictionaryRequiredError()
+            dictionary_id = archive.DICTIONARY_ID.unpack(
+                self._read_exactly(src, archive.DICTIONARY_ID.size))[0]
+            if dictionary_id != self.dictionary.id:
+                raise errors.WrongDictionaryError()
+        elif self.dictionary is not None:
+            raise errors.WrongDictionaryError()
+        return version, flags
+
+    def _move_tail(self, dst: BinaryIO, offset: int, new_offset: int,
+                   size: int, chunk_size: int) -> None:
+        """
+        Move size bytes of dst from offset to smaller new_offset
+        by chunks, so moved bytes are read before they are overwritten.
+        """
+
+        for position in range(0, size, chunk_size):
+            dst.seek(offset + position)
+            chunk = self._read_exactly(dst, min(chunk_size, size - position))
+            dst.seek(new_offset + position)
+            dst.write(chunk)
+
+    @staticmethod
+    def _read_exactly(src: BinaryIO, size: int) -> bytes:
+        data = src.read(size)
+        if len(data) != size:
+            raise errors.BrokenArchiveError()
+        return data
+
+    def _write_segment(self, src: BinaryIO, dst: BinaryIO, chunk_size: int,
+                       jobs: Optional[int], compressed_size: int,
+                       original_size: int = 0,
+                       index: Optional[bytearray] = None) -> tuple:
+        """
+        Write blocks of data from src, end of blocks, checksum
+        and block index, compressed_size is offset of the first block.
+        Return original size and compressed size of archive.
+        """
+
+        checksum = archive.create_checksum(self.checksum_type)
+        chunks = self._read_chunks(src, chunk_size, checksum)
+        if jobs is None:
+            frames = self._compress_chained(chunks)
+        else:
+            frames = parallel.map_blocks(self._compress_frame, chunks, jobs)
+        if index is None:
+            index = bytearray()
+        for frame in frames:
+            original_length = archive.BLOCK_HEADER.unpack_from(frame)[0]
+            index.extend(archive.INDEX_ENTRY.pack(
+                original_size, compressed_size,
+                len(frame) - archive.BLOCK_HEADER.size))
+            original_size += original_length
+            compressed_size += self._run_stage(WRITE_STAGE, len(frame),
+                                               dst.write, frame)
+        compressed_size += dst.write(archive.BLOCK_HEADER.pack(0, 0))
+        self.checksum = checksum.digest()
+        compressed_size += dst.write(self.checksum)
+        index_offset = compressed_size
+        compressed_size += dst.write(index)
+        compressed_size += dst.write(archive.INDEX_FOOTER.pack(
+            index_offset, len(index) // archive.INDEX_ENTRY.size))
+        return original_size, compressed_size
+
+    def compress_directory(self, directory, dst: BinaryIO,
+                           jobs: Optional[int] = None) -> tuple:
+        """
+        Compress all files of directory to entries archive.
+        Every file is compressed to its own archive,
+        files are compressed in jobs processes, if jobs is set.
+        Return original size, compressed size and duration.
+        """
+
+        if self.container != containers.DFA:
+            raise errors.UnknownContainerError()
         with TimeMeasure() as measure:
-            compressed_data = bytearray()
-            lz77_codec = LZ77Codec(256)
-            huffman_codec = HuffmanCodec()
-            checksum = huffman_codec.get_checksum(data)
-            self.checksum = checksum
-            codewords = lz77_codec.encode(data)
-            codewords_bytes = bytes()
-            for codeword in codewords:
-                codewords_bytes += bytes([codeword.offset])
-                codewords_bytes += bytes([codeword.length])
-                codewords_bytes += bytes([codeword.char])
-            encoded_data, codes_table = huffman_codec.encode(codewords_bytes)
-            packed_data = self._pack_data(encoded_data, checksum, codes_table)
-            compressed_data.extend(struct.pack('H', len(filename)))
-            compressed_data.extend(filename.encode())
-            compressed_data.extend(packed_data)
-
-        time_duration = measure.work_time
-        return compressed_data, time_duration
+            directory = Path.cwd() / directory
+            # архив может создаваться в том же каталоге
+            archive_path = Path(getattr(dst, 'name', '')).resolve()
+            names = [path.relative_to(directory).as_posix()
+                     for path in sorted(directory.rglob('*'))
+                     if path.is_file() and path.resolve() != archive_path]
+            compressed_size = dst.write(b''.join((
+                archive.MAGIC, bytes([archive.ENTRIES_VERSION, 0]))))
+            central_directory = bytearray()
+            original_size = 0
+            entries = self._write_entries(directory, names, dst, jobs)
+            for name, (entry_size, entry_length) in zip(names, entries):
+                encoded_name = name.encode()
+                central_directory.extend(archive.DIRECTORY_ENTRY.pack(
+                    compressed_size, entry_length, entry_size,
+                    len(encoded_name)))
+                central_directory.extend(encoded_name)
+                original_size += entry_size
+                compressed_size += entry_length
+            directory_offset = compressed_size
+            compressed_size += dst.write(central_directory)
+            compressed_size += dst.write(archive.DIRECTORY_FOOTER.pack(
+                directory_offset, len(names)))
+
+        return original_size, compressed_size, measure.work_time
+
+    def _write_entries(self, directory: Path, names: list, dst: BinaryIO,
+                       jobs: Optional[int]) -> Iterator[tuple]:
+        """
+        Compress files to dst one by one, yield original and compressed
+        size of every file. In one process file is compressed to dst
+        by blocks, in jobs processes - to temporary file, so memory
+        does not depend on size of files.
+        """
+
+        if jobs in (None, 1):
+            for name in names:
+                with (directory / name).open('rb') as src:
+                    yield self.compress_stream(src, dst, name)[:2]
+            return
+        import shutil
+        entries = parallel.map_blocks(
+            self._compress_entry, ((directory, name) for name in names),
+            jobs)
+        for original_size, compressed_size, temporary_name in entries:
+            try:
+                with open(temporary_name, 'rb') as src:
+                    shutil.copyfileobj(src, dst, archive.CHUNK_SIZE)
+            finally:
+                os.remove(temporary_name)
+            yield original_size, compressed_size
+
+    def _compress_entry(self, directory_and_name: tuple) -> tuple:
+        import tempfile
+        directory, name = directory_and_name
+        with (directory / name).open('rb') as src, \
+                tempfile.NamedTemporaryFile(delete=False) as compressed:
+            try:
+                original_size, compressed_size, _ = self.compress_stream(
+                    src, compressed, name)
+            except BaseException:
+                compressed.close()
+                os.remove(compressed.name)
+                raise
+        return original_size, compressed_size, compressed.name
+
+    def _compress_wrapped(self, src: BinaryIO, dst: BinaryIO, filename: str,
+                          chunk_size: int, jobs: Optional[int]) -> tuple:
+        """
+        Compress data to gzip or zlib container with one DEFLATE stream.
+        In parallel mode every block ends with empty stored block,
+        so blocks can be encoded separately, like pigz does.
+        """
+
+        with TimeMeasure() as measure:
+            if self.container == containers.GZIP:
+                checksum = containers.Crc32()
+                header = containers.pack_gzip_header(filename, self.level)
+            else:
+                checksum = containers.Adler32()
+                header = containers.pack_zlib_header(
+                    self.level, self.dictionary and self.dictionary.content_id)
+            compressed_size = dst.write(header)
+            original_size = 0
+            chunks = self._with_history(
+                self._read_chunks(src, chunk_size, checksum))
+            if jobs is None:
+                blocks = self._compress_stream_blocks(chunks)
+            else:
+                blocks = parallel.map_blocks(self._compress_synced_block,
+                                             chunks, jobs)
+            for block_size, block in blocks:
+                original_size += block_size
+                compressed_size += self._run_stage(WRITE_STAGE, len(block),
+                                                   dst.write, block)
+            compressed_size += dst.write(DeflateCodec().encode(b''))
+            if self.container == containers.GZIP:
+                trailer = containers.pack_gzip_trailer(checksum,
+                                                       original_size)
+            else:
+                trailer = containers.pack_zlib_trailer(checksum)
+            compressed_size += dst.write(trailer)
+            self.checksum = checksum.digest()
+
+        return original_size, compressed_size, measure.work_time
+
+    def _with_history(self, chunks: Iterable[bytes]) -> Iterator[tuple]:
+        history = self.initial_history
+        for chunk in chunks:
+            yield chunk, history
+            history = (history + chunk)[-self.history_length:]
+
+    def _compress_stream_blocks(self,
+                                chunks: Iterable[tuple]) -> Iterator[tuple]:
+        codec = DeflateCodec(self.create_lz77_codec())
+        for chunk, history in chunks:
+            yield len(chunk), self._encode_deflate(codec, chunk, history,
+                                                   final=False)
+        yield 0, codec.sync()
+
+    def _compress_synced_block(self, chunk_with_history: tuple) -> tuple:
+        chunk, history = chunk_with_history
+        codec = DeflateCodec(self.create_lz77_codec())
+        return len(chunk), self._encode_deflate(codec, chunk, history,
+                                                final=False) + codec.sync()
+
+    def _encode_deflate(self, codec: DeflateCodec, data: bytes,
+                        history: bytes, final: bool = True) -> bytes:
+        if self._run_stage(PRECHECK_STAGE, len(data), is_incompressible,
+                           data):
+            block = codec.encode_stored(data, final)
+            if self.stats is not None:
+                self.stats.add_deflate_block(codec.last_block)
+            return block
+        codewords = self._run_stage(LZ77_STAGE, len(data),
+                                    codec.lz77_codec.encode, data, history)
+        block = self._run_stage(DEFLATE_STAGE, len(data),
+                                codec.encode_codewords, data, codewords,
+                                final)
+        if self.stats is not None:
+            self.stats.add_codewords(codewords)
+            self.stats.add_deflate_block(codec.last_block)
+        return block
+
+    def _run_stage(self, stage: str, size: int, function, *args):
+        """
+        Call function of stage of compression of size bytes.
+        It is measured only if statistics are collected.
+        """
+
+        if self.stats is None:
+            return function(*args)
+        start_time = time.perf_counter()
+        result = function(*args)
+        self.stats.add_stage(stage, time.perf_counter() - start_time, size,
+                             result)
+        return result
+
+    def _read_chunks(self, src: BinaryIO, chunk_size: int,
+                     checksum) -> Iterator[bytes]:
+        while True:
+            chunk = self._run_stage(READ_STAGE, 0, src.read, chunk_size)
+            if not chunk:
+                break
+            self._run_stage(CHECKSUM_STAGE, len(chunk), checksum.update,
+                            chunk)
+            yield chunk
+
+    def _pack_header(self, filename: str, flags: int) -> bytes:
+        encoded_filename = filename.encode()
+        dictionary_id = b''
+        if flags & archive.DICTIONARY:
+            dictionary_id = archive.DICTIONARY_ID.pack(self.dictionary.id)
+        return b''.join((archive.MAGIC,
+                         bytes([archive.VERSION, flags]),
+                         dictionary_id,
+                         archive.FILENAME_LENGTH.pack(len(encoded_filename)),
+                         encoded_filename))
+
+    def _compress_chained(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        history = self.initial_history
+        for chunk in chunks:
+            yield self._compress_frame(chunk, history)
+            history = (history + chunk)[-self.history_length:]
+
+    def _compress_frame(self, data: bytes,
+                        history: Optional[bytes] = None) -> bytes:
+        if history is None:
+            history = self.initial_history
+        if self.codec == DEFLATE_CODEC:
+            block = self._encode_deflate(
+                DeflateCodec(self.create_lz77_codec()), data, history)
+            return self._pack_frame(data, block)
+        if self._run_stage(PRECHECK_STAGE, len(data), is_incompressible,
+                           data):
+            block = self._pack_stored_part(data)
+            if self.stats is not None:
+                self.stats.block_types['stored'] += 1
+            return self._pack_frame(data, block)
+        codeword_array = self._run_stage(LZ77_STAGE, len(data),
+                                         self.create_lz77_codec().encode,
+                                         data, history)
+        codewords = self._run_stage(SERIALIZE_STAGE, 3 * len(codeword_array),
+                                    codeword_array.to_bytes)
+        if self.stats is not None:
+            self.stats.add_codewords(codeword_array)
+        parts = []
+        start = 0
+        for first, last in self._split_codewords(codewords):
+            end = start + codeword_array[first:last].get_data_length()
+            parts.append(self._encode_part(data[start:end],
+                                           codewords[3 * first:3 * last]))
+            start = end
+        block = b''.join(parts)
+        return self._pack_frame(data, block)
+
+    def _pack_frame(self, data: bytes, block: bytes) -> bytes:
+        """Pack block with its header and CRC-32 of data, if it is set."""
+
+        if self.block_checksums:
+            block = archive.BLOCK_CHECKSUM.pack(zlib.crc32(data)) + block
+        return archive.BLOCK_HEADER.pack(len(data), len(block)) + block
+
+    @staticmethod
+    def _split_codewords(codewords: bytes) -> list:
+        """
+        Get ranges of codewords of parts of block,
+        where statistics of codewords bytes change.
+        """
+
+        part_length = 3 * SPLIT_LENGTH
+        parts_counts = [collections.Counter(codewords[start:
+                                                      start + part_length])
+                        for start in range(0, len(codewords), part_length)]
+        starts = split_blocks(parts_counts, estimate_part_size)
+        ends = starts[1:] + [len(parts_counts)]
+        return [(start * SPLIT_LENGTH,
+                 min(end * SPLIT_LENGTH, len(codewords) // 3))
+                for start, end in zip(starts, ends)]
+
+    def _encode_part(self, data: bytes, codewords: bytes) -> bytes:
+        """
+        Encode part of block by its own huffman table
+        or by shared table of dictionary or store it,
+        whichever is shorter.
+        """
+
+        part = self._encode_codewords(codewords)
+        part_type = 'dynamic'
+        if self.dictionary is not None and self.dictionary.code_lengths:
+            shared_part = self._pack_shared_data(codewords)
+            if len(shared_part) < len(part):
+                part = shared_part
+                part_type = 'shared'
+        stored_part = self._pack_stored_part(data)
+        if len(stored_part) < len(part):
+            part = stored_part
+            part_type = 'stored'
+        if self.stats is not None:
+            self.stats.block_types[part_type] += 1
+            if part_type == 'dynamic':
+                code_lengths, table_end = \
+                    HuffmanCodec.unpack_code_lengths(part)
+                self.stats.add_table(code_lengths.values(),
+                                     table_end + archive.BITS_LENGTH.size)
+        return part
+
+    @staticmethod
+    def _pack_stored_part(data: bytes) -> bytes:
+        return b''.join((bytes([archive.STORED_PART]),
+                         archive.STORED_LENGTH.pack(len(data)), data))
+
+    def _encode_codewords(self, codewords: bytes) -> bytes:
+        """Encode codewords by their own huffman table, pack block."""
+
+        encoded_data, codes_table = self._run_stage(
+            HUFFMAN_STAGE, len(codewords), HuffmanCodec().encode, codewords)
+        return self._run_stage(PACK_STAGE, len(encoded_data) // 8,
+                               self._pack_data, encoded_data, codes_table)
+
+    def _pack_shared_data(self, codewords: bytes) -> bytes:
+        """Pack codewords, encoded by shared table of dictionary."""
+
+        encoded_data = bitarray()
+        encoded_data.encode(HuffmanCodec.create_canonical_codes(
+            self.dictionary.code_lengths), codewords)
+        return b''.join((bytes([archive.SHARED_TABLE]),
+                         archive.BITS_LENGTH.pack(len(encoded_data)),
+                         encoded_data.tobytes()))
 
     @staticmethod
     def calculate_compress_ratio(original_size, compressed_size) -> float:
         """
         Calculate compress ratio.
-        Can be < 0, if file is already compressed or is too small.
+        Can be < 0, if file is already compressed or is too small,
+        empty file has ratio 0.
         """
 
+        if not original_size:
+            return 0.0
         return (1 - compressed_size / original_size) * 100
 
     @staticmethod
-    def _pack_data(encoded_data: bitarray, checksum: bytes,
-                   codes_table: dict) -> bytes:
+    def _pack_data(encoded_data: bitarray, codes_table: dict) -> bytes:
         """
         Pack encoded data to write in file.
         Needs because in LZ77 we use Codewords instead of bytes.
         """
 
         packed_data = bytearray()
-        packed_data.extend(checksum)
-        serialized_table = json.dumps({int(i): codes_table[i].to01()
-                                       for i in codes_table}).encode()
-        packed_data.extend(struct.pack('I', len(serialized_table)))
-        packed_data.extend(serialized_table)
-        packed_data.extend(struct.pack('I', len(encoded_data)))
+        packed_data.extend(HuffmanCodec.pack_code_lengths(
+            {char: len(code) for char, code in codes_table.items()}))
+        packed_data.extend(archive.BITS_LENGTH.pack(len(encoded_data)))
         packed_data.extend(encoded_data.tobytes())
         return bytes(packed_data)
 
@@ -96,14 +785,27 @@ class Compressor:
         return file.read_bytes()
 
     @staticmethod
-    def write_archive(archive_name: str, encoded_data: bytes) -> None:
-        """Get name for archive and save it in file system."""
+    def get_archive_path(archive_name: str,
+                         container: str = containers.DFA) -> Path:
+        """
+        Get path for archive by its name.
+        Extension of container is added, if name has no it.
+        """
 
+        suffix = containers.SUFFIXES[container]
         if not archive_name:
+            from datetime import datetime
             archive_name = f'archived by deflate at' \
-                           f' {datetime.today().strftime("%Y-%m-%d")}.dfa'
-        else:
-            archive_name = ''.join((archive_name, '.dfa'))
-        archive_path = Path.cwd() / archive_name
+                           f' {datetime.today().strftime("%Y-%m-%d")}{suffix}'
+        elif not archive_name.endswith(suffix):
+            archive_name = ''.join((archive_name, suffix))
+        return Path.cwd() / archive_name
+
+    @staticmethod
+    def write_archive(archive_name: str, encoded_data: bytes,
+                      container: str = containers.DFA) -> None:
+        """Get name for archive and save it in file system."""
+
+        archive_path = Compressor.get_archive_path(archive_name, container)
         data_to_archive = bytearray(encoded_data)
         archive_path.write_bytes(data_to_archive)
@@ -0,0 +1,176 @@
+"""
+Containers of compressed data.
+
+dfa is the own archive format, see archive module.
+gzip (RFC 1952) and zlib (RFC 1950) wrap one DEFLATE stream:
+gzip header has original filename, trailer has CRC-32
+and size of data, zlib header has level and trailer has Adler-32.
+Gzip file can contain several members, they are decoded one by one.
+"""
+import struct
+import zlib
+from pathlib import Path
+from typing import Callable, Optional
+from deflate import errors
+
+DFA = 'dfa'
+GZIP = 'gzip'
+ZLIB = 'zlib'
+CONTAINERS = (DFA, GZIP, ZLIB)
+SUFFIXES = {DFA: '.dfa', GZIP: '.gz', ZLIB: '.zz'}
+
+GZIP_MAGIC = b'\x1f\x8b'
+DEFLATE_METHOD = 8
+GZIP_HEADER = struct.Struct('<2sBBIBB')
+GZIP_TRAILER = struct.Struct('<II')
+GZIP_TEXT = 1
+GZIP_HEADER_CRC = 2
+GZIP_EXTRA = 4
+GZIP_NAME = 8
+GZIP_COMMENT = 16
+# ОС не указываем, время изменения - 0, чтобы архив не зависел от машины
+GZIP_UNKNOWN_OS = 255
+
+ZLIB_HEADER = struct.Struct('>BB')
+ZLIB_DICTIONARY_ID = struct.Struct('>I')
+ZLIB_TRAILER = struct.Struct('>I')
+# метод 8 с окном 32 КБ
+ZLIB_METHOD = 0x78
+ZLIB_DICTIONARY = 0x20
+
+
+class Crc32:
+    """CRC-32 of gzip, calculated by parts like hashlib objects."""
+
+    def __init__(self):
+        self.value = 0
+
+    def update(self, data: bytes) -> None:
+        self.value = zlib.crc32(data, self.value)
+
+    def digest(self) -> bytes:
+        return self.value.to_bytes(4, 'big')
+
+
+class Adler32:
+    """Adler-32 of zlib, calculated by parts like hashlib objects."""
+
+    def __init__(self):
+        self.value = 1
+
+    def update(self, data: bytes) -> None:
+        self.value = zlib.adler32(data, self.value)
+
+    def digest(self) -> bytes:
+        return self.value.to_bytes(4, 'big')
+
+
+def get_container(path, default: str = DFA) -> str:
+    """Get container by file extension."""
+
+    suffix = Path(path).suffix
+    for container, container_suffix in SUFFIXES.items():
+        if suffix == container_suffix:
+            return container
+    return default
+
+
+def pack_gzip_header(filename: str, level: int) -> bytes:
+    """Get gzip member header with name of original file."""
+
+    name = Path(filename).name.encode('latin-1', 'replace') \
+        if filename else b''
+    flags = GZIP_NAME if name else 0
+    # как в gzip: 2 - лучшее сжатие, 4 - самое быстрое
+    extra_flags = 2 if level == 9 else 4 if level == 1 else 0
+    header = GZIP_HEADER.pack(GZIP_MAGIC, DEFLATE_METHOD, flags, 0,
+                              extra_flags, GZIP_UNKNOWN_OS)
+    return header + name + b'\0' if name else header
+
+
+def read_gzip_header(read: Callable[[int], bytes]) -> Optional[Path]:
+    """
+    Read gzip member header by read function.
+    Return name of original file, if it is in header:
+    like gzip, without directories, so file is written
+    to current directory.
+    """
+
+    header = read(GZIP_HEADER.size)
+    magic, method, flags, _, _, _ = GZIP_HEADER.unpack(header)
+    if magic != GZIP_MAGIC or method != DEFLATE_METHOD:
+        raise errors.BrokenArchiveError()
+    if flags & GZIP_EXTRA:
+        extra_length = int.from_bytes(read(2), 'little')
+        read(extra_length)
+    filename = None
+    if flags & GZIP_NAME:
+        name = Path(_read_zero_terminated(read).decode('latin-1')).name
+        if name not in ('', '..'):
+            filename = Path(name)
+    if flags & GZIP_COMMENT:
+        _read_zero_terminated(read)
+    if flags & GZIP_HEADER_CRC:
+        read(2)
+    return filename
+
+
+def _read_zero_terminated(read: Callable[[int], bytes]) -> bytes:
+    data = bytearray()
+    while True:
+        byte = read(1)
+        if byte == b'\0':
+            return bytes(data)
+        data.extend(byte)
+
+
+def pack_gzip_trailer(checksum: Crc32, size: int) -> bytes:
+    return GZIP_TRAILER.pack(checksum.value, size & 0xffffffff)
+
+
+def check_gzip_trailer(trailer: bytes, checksum: Crc32, size: int) -> None:
+    expected_checksum, expected_size = GZIP_TRAILER.unpack(trailer)
+    if expected_checksum != checksum.value:
+        raise errors.WrongChecksumError()
+    if expected_size != size & 0xffffffff:
+        raise errors.BrokenArchiveError()
+
+
+def pack_zlib_header(level: int,
+                     dictionary_id: Optional[int] = None) -> bytes:
+    """
+    Get zlib header with level, like zlib sets it,
+    and Adler-32 of preset dictionary, if it is set.
+    """
+
+    compression_level = 0 if level < 2 else 1 if level < 6 \
+        else 2 if level == 6 else 3
+    flags = compression_level << 6
+    if dictionary_id is not None:
+        flags |= ZLIB_DICTIONARY
+    flags += 31 - (ZLIB_METHOD << 8 | flags) % 31
+    header = ZLIB_HEADER.pack(ZLIB_METHOD, flags)
+    if dictionary_id is not None:
+        header += ZLIB_DICTIONARY_ID.pack(dictionary_id)
+    return header
+
+
+def read_zlib_header(read: Callable[[int], bytes]) -> Optional[int]:
+    """Read zlib header, return Adler-32 of dictionary, if it is needed."""
+
+    method, flags = ZLIB_HEADER.unpack(read(ZLIB_HEADER.size))
+    if method & 0x0f != DEFLATE_METHOD or method >> 4 > 7 \
+            or (method << 8 | flags) % 31:
+        raise errors.BrokenArchiveError()
+    if flags & ZLIB_DICTIONARY:
+        return ZLIB_DICTIONARY_ID.unpack(read(ZLIB_DICTIONARY_ID.size))[0]
+    return None
+
+
+def pack_zlib_trailer(checksum: Adler32) -> bytes:
+    return ZLIB_TRAILER.pack(checksum.value)
+
+
+def check_zlib_trailer(trailer: bytes, checksum: Adler32) -> None:
+    if ZLIB_TRAILER.unpack(trailer)[0] != checksum.value:
+        raise errors.WrongChecksumError()
@@ -1,23 +1,62 @@
-import json
+import bisect
+import collections
+import contextlib
+import io
+import mmap
 import struct
+import zlib
 from pathlib import Path
+from typing import TYPE_CHECKING, BinaryIO, ContextManager, Iterable, \
+    Iterator, Optional
+from deflate.codecs.deflate import DeflateCodec, DeflateDecoder, BitReader, \
+    WINDOW_LENGTH
 from deflate.codecs.huffman import HuffmanCodec
-from deflate.codecs.lz77 import LZ77Codec, Codeword
+from deflate.codecs.lz77 import LZ77Codec, CodewordArray
+from deflate.handlers import archive, containers, parallel
+from deflate.handlers.dictionary import Dictionary
 from deflate import errors
 
+# asyncio и пул процессов импортируются при первом использовании,
+# так быстрее запуск командной строки
+if TYPE_CHECKING:
+    from concurrent.futures import Executor
+
 
 class Decompressor:
     """
     Contains methods to decompress archive and save data in file.
+    Archive can be dfa, gzip or zlib container,
+    gzip is recognized by signature, zlib must be set explicitly.
+    Dictionary must be set for archives, compressed with it.
     """
 
-    def __init__(self):
+    window_length = 256
+
+    def __init__(self, dictionary: Optional[Dictionary] = None):
         self.offsets = {
             'checksum': 16,
             'unsigned_int': 4,
             'unsigned_short': 2,
             'unsigned_char': 1
         }
+        self.version = archive.VERSION
+        self.flags = 0
+        self.checksum_type = archive.MD5
+        self.container = containers.DFA
+        self.dictionary = dictionary
+
+    @staticmethod
+    def get_archive_path(archive_name) -> Path:
+        """
+        Get path of archive.
+        Check of file if deflate archive.
+        """
+
+        archive_path = Path.cwd() / archive_name
+        if archive_path.suffix not in containers.SUFFIXES.values() \
+                or not archive_path.exists():
+            raise errors.NotArchiveError
+        return archive_path
 
     @staticmethod
     def read_from_archive(archive_name) -> bytes:
@@ -26,56 +65,622 @@ class Decompressor:
         Check of file if deflate archive.
         """
 
-        archive = Path.cwd() / archive_name
-        if archive.suffix != '.dfa' or not archive.exists():
-            raise errors.NotArchiveError
-        return archive.read_bytes()
+        return Decompressor.get_archive_path(archive_name).read_bytes()
+
+    @staticmethod
+    def open_archive(archive_name) -> BinaryIO:
+        """
+        Open file to read archive by blocks.
+        Check of file if deflate archive.
+        """
+
+        return Decompressor.get_archive_path(archive_name).open('rb')
 
-    def decompress(self, data: bytes) -> tuple:
+    @staticmethod
+    @contextlib.contextmanager
+    def map_archive(archive_name) -> ContextManager['BufferReader']:
+        """
+        Memory-map archive file to read it without copies.
+        Check of file if deflate archive.
+        """
+
+        with Decompressor.open_archive(archive_name) as file:
+            if not Path(file.name).stat().st_size:
+                raise errors.BrokenArchiveError()
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                src = BufferReader(data)
+                try:
+                    yield src
+                except BaseException as error:
+                    # виды буфера в кадрах трассировок ошибки и ошибок,
+                    # из-за которых она возникла, не дают закрыть
+                    # отображение, поэтому кадры очищаются
+                    import traceback
+                    cleared = set()
+                    while error is not None and id(error) not in cleared:
+                        cleared.add(id(error))
+                        traceback.clear_frames(error.__traceback__)
+                        error = error.__cause__ or error.__context__
+                    raise
+                finally:
+                    src.close()
+
+    def decompress(self, data: bytes,
+                   container: Optional[str] = None) -> tuple:
         """Decode archive with inflate algorithm (decode of deflate)."""
 
-        huffman_codec = HuffmanCodec()
-        lz77_codec = LZ77Codec(256)
-        offset = self.offsets['unsigned_short']
-        filename_length = struct.unpack('H', data[:offset])[0]
-        filename = data[offset:offset + filename_length].decode()
-        offset += filename_length
-        checksum = data[offset:offset + self.offsets['checksum']]
-        offset += self.offsets['checksum']
-        code_table_length = struct.unpack('I',
-                                          data[offset:
-                                               offset +
-                                               self.offsets
-                                               ['unsigned_int']])[0]
-        offset += self.offsets['unsigned_int']
-        code_table = json.loads(
-            data[offset: offset + code_table_length].decode())
+        decoded = io.BytesIO()
+        filename = self.decompress_buffer(data, decoded,
+                                          container=container)
+        return filename, decoded.getvalue()
+
+    async def decompress_async(self, data: bytes,
+                               container: Optional[str] = None,
+                               executor: Optional['Executor'] = None) -> tuple:
+        """
+        Decode archive like decompress, but in executor (default one
+        of event loop if None), so event loop is not blocked.
+        Executor can be pool of processes.
+        """
+
+        import asyncio
+        return await asyncio.get_running_loop().run_in_executor(
+            executor, self.decompress, data, container)
+
+    async def decompress_stream_async(self, reader, writer,
+                                      jobs: Optional[int] = None,
+                                      container: Optional[str] = None,
+                                      executor: Optional['Executor'] = None
+                                      ) -> Optional[Path]:
+        """
+        Decode archive like decompress_stream in thread of executor.
+        Reader and writer can be asyncio streams or binary files,
+        writer is drained after every block, see streams module.
+        """
+
+        from deflate.handlers import streams
+        return await streams.run_blocking(executor, self.decompress_stream,
+                                          reader, writer, jobs, container)
+
+    def decompress_file(self, archive_name, dst: BinaryIO,
+                        jobs: Optional[int] = None,
+                        container: Optional[str] = None) -> Optional[Path]:
+        """
+        Decode archive file to dst, file is memory-mapped.
+        Return path of original file, if archive has it.
+        """
+
+        with self.map_archive(archive_name) as src:
+            return self.decompress_stream(src, dst, jobs, container)
+
+    def decompress_buffer(self, data, dst: BinaryIO,
+                          jobs: Optional[int] = None,
+                          container: Optional[str] = None) -> Optional[Path]:
+        """
+        Decode archive from bytes-like object, for example mmap.
+        Blocks are decoded from views of buffer without copies.
+        Return path of original file, if archive has it.
+        """
+
+        src = BufferReader(data)
+        try:
+            return self.decompress_stream(src, dst, jobs, container)
+        finally:
+            src.close()
+
+    def decompress_stream(self, src: BinaryIO, dst: BinaryIO,
+                          jobs: Optional[int] = None,
+                          container: Optional[str] = None) -> Optional[Path]:
+        """
+        Decode archive from src to dst block by block.
+        Return path of original file, if archive has it.
+        """
+
+        filename = self.read_header(src, container)
+        self.decompress_blocks(src, dst, jobs)
+        return filename
+
+    def read_header(self, src: BinaryIO,
+                    container: Optional[str] = None) -> Optional[Path]:
+        """
+        Read version and flags of archive and name of original file.
+        zlib container has no name of file, so None is returned.
+        """
+
+        if container is not None \
+                and container not in containers.CONTAINERS:
+            raise errors.UnknownContainerError()
+        if container == containers.ZLIB:
+            self.container = container
+            dictionary_id = containers.read_zlib_header(self._create_read(src))
+            self.flags = 0
+            if dictionary_id is not None:
+                self._check_dictionary(dictionary_id,
+                                       self.dictionary and
+                                       self.dictionary.content_id)
+                self.flags = archive.DICTIONARY
+            return None
+        prefix = self._read_exactly(src, self.offsets['unsigned_short'])
+        if prefix == containers.GZIP_MAGIC and container != containers.DFA:
+            self.container = containers.GZIP
+            return containers.read_gzip_header(
+                self._create_read(src, prefix))
+        if container == containers.GZIP:
+            raise errors.BrokenArchiveError()
+        self.container = containers.DFA
+        # в старых архивах сигнатуры нет, они начинаются с длины имени
+        if prefix == archive.MAGIC[:len(prefix)]:
+            if self._read_exactly(src, len(archive.MAGIC) - len(prefix)) \
+                    != archive.MAGIC[len(prefix):]:
+                raise errors.BrokenArchiveError()
+            self.version = self._read_exactly(
+                src, self.offsets['unsigned_char'])[0]
+            if self.version == archive.STREAM_VERSION:
+                self.flags = 0
+            elif self.version in (archive.INDEXED_VERSION,
+                                  archive.CANONICAL_VERSION,
+                                  archive.DEFLATE_VERSION,
+                                  archive.DICTIONARY_VERSION,
+                                  archive.SPLIT_VERSION,
+                                  archive.SEGMENTS_VERSION,
+                                  archive.CHECKSUMS_VERSION):
+                self.flags = self._read_exactly(
+                    src, self.offsets['unsigned_char'])[0]
+            elif self.version == archive.ENTRIES_VERSION:
+                raise errors.EntriesArchiveError()
+            else:
+                raise errors.UnknownVersionError()
+            self.checksum_type = archive.MD5
+            if self.version >= archive.CHECKSUMS_VERSION:
+                self.checksum_type = archive.get_checksum_type(self.flags)
+            if self.flags & archive.DICTIONARY:
+                dictionary_id = archive.DICTIONARY_ID.unpack(
+                    self._read_exactly(src, archive.DICTIONARY_ID.size))[0]
+                self._check_dictionary(dictionary_id, self.dictionary and
+                                       self.dictionary.id)
+            prefix = self._read_exactly(src, self.offsets['unsigned_short'])
+        else:
+            self.version = archive.LEGACY_VERSION
+            self.flags = 0
+            self.checksum_type = archive.MD5
+        filename_length = archive.FILENAME_LENGTH.unpack(prefix)[0]
+        return Path(bytes(self._read_exactly(src, filename_length)).decode())
+
+    def _check_dictionary(self, expected_id: int,
+                          dictionary_id: Optional[int]) -> None:
+        if self.dictionary is None:
+            raise errors.DictionaryRequiredError()
+        if dictionary_id != expected_id:
+            raise errors.WrongDictionaryError()
+
+    def decompress_blocks(self, src: BinaryIO, dst: BinaryIO,
+                          jobs: Optional[int] = None) -> None:
+        """
+        Decode blocks of archive after header and write them to dst.
+        Independent blocks are decoded in jobs processes, if jobs is set.
+        Check checksum of decoded data.
+        """
+
+        if self.container != containers.DFA:
+            self._decompress_wrapped(src, dst)
+            return
+        checksum = archive.create_checksum(self.checksum_type)
+        if self.version == archive.LEGACY_VERSION:
+            expected_checksum = self._read_exactly(src,
+                                                   self.offsets['checksum'])
+            decoded = self._decompress_block(src.read())
+            checksum.update(decoded)
+            dst.write(decoded)
+        else:
+            # суммы сегментов читаются раньше, чем их блоки разжимаются
+            segment_checksums = collections.deque()
+            frames = self._read_frames(src, segment_checksums)
+            if not self.flags & archive.INDEPENDENT_BLOCKS:
+                decoded_blocks = self._decompress_chained(frames)
+            elif jobs is None:
+                # независимые блоки начинаются с начальной истории
+                decoded_blocks = map(self._decompress_frame, frames)
+            else:
+                # блоки передаются в другие процессы, им нужны копии
+                frames = ((original_length, bytes(block))
+                          for original_length, block in frames)
+                decoded_blocks = parallel.map_blocks(self._decompress_frame,
+                                                     frames, jobs)
+            size = 0
+            try:
+                for decoded in decoded_blocks:
+                    if not decoded:
+                        if checksum.digest() != segment_checksums.popleft():
+                            raise errors.WrongChecksumError
+                        checksum = archive.create_checksum(self.checksum_type)
+                        continue
+                    checksum.update(decoded)
+                    dst.write(decoded)
+                    size += len(decoded)
+            except errors.WrongBlockChecksumError:
+                # испорченный блок - следующий после size байт
+                raise errors.WrongBlockChecksumError(size) from None
+            expected_checksum = self._read_exactly(src, self.checksum_size)
+        if checksum.digest() != expected_checksum:
+            raise errors.WrongChecksumError
+
+    def is_entries_archive(self, archive_name) -> bool:
+        """Check if archive contains several files."""
+
+        with self.open_archive(archive_name) as file:
+            return file.read(len(archive.MAGIC) + 1) == \
+                archive.MAGIC + bytes([archive.ENTRIES_VERSION])
+
+    def list_entries(self, archive_name) -> list:
+        """Get names and original sizes of files in entries archive."""
+
+        with self.map_archive(archive_name) as src:
+            return [(name, original_size) for name, _, _, original_size
+                    in self._read_directory(src.view)]
+
+    def extract_entry(self, archive_name, name: str, dst: BinaryIO) -> None:
+        """
+        Decode one file of entries archive to dst.
+        Archives of other files are not read.
+        """
+
+        with self.map_archive(archive_name) as src:
+            for entry in self._read_directory(src.view):
+                if entry[0] == name:
+                    self._extract_buffer(src.view, entry, dst)
+                    return
+        raise errors.EntryNotFoundError()
+
+    def test_archive(self, archive_name, jobs: Optional[int] = None,
+                     container: Optional[str] = None) -> int:
+        """
+        Check archive by decoding without writing of data:
+        checksums of blocks, segments and data are checked
+        as archive is read, every file of entries archive is checked.
+        Return size of original data.
+        """
+
+        dst = NullWriter()
+        if self.is_entries_archive(archive_name):
+            with self.map_archive(archive_name) as src:
+                for entry in self._read_directory(src.view):
+                    self._extract_buffer(src.view, entry, dst)
+        else:
+            self.decompress_file(archive_name, dst, jobs, container)
+        return dst.size
+
+    def extract_all(self, archive_name, directory='.',
+                    jobs: Optional[int] = None) -> list:
+        """
+        Decode all files of entries archive to directory,
+        files are decoded in jobs processes, if jobs is set.
+        Return names of files.
+        """
+
+        archive_path = self.get_archive_path(archive_name)
+        with self.map_archive(archive_path) as src:
+            entries = self._read_directory(src.view)
+        directory = Path.cwd() / directory
+        tasks = ((archive_path, entry, directory) for entry in entries)
+        jobs = 1 if jobs is None else jobs
+        for _ in parallel.map_blocks(self._extract_to_file, tasks, jobs):
+            pass
+        return [entry[0] for entry in entries]
+
+    def _extract_to_file(self, task: tuple) -> None:
+        archive_path, entry, directory = task
+        path = directory / entry[0]
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self.map_archive(archive_path) as src, path.open('wb') as dst:
+            self._extract_buffer(src.view, entry, dst)
+
+    def _extract_buffer(self, data, entry: tuple, dst: BinaryIO) -> None:
+        _, offset, length, _ = entry
+        self.decompress_buffer(data[offset:offset + length], dst)
+
+    @staticmethod
+    def _read_directory(data) -> list:
+        """
+        Get entries of central directory: name, offset and length
+        of archive of file and original size.
+        """
+
+        if bytes(data[:len(archive.MAGIC) + 1]) != \
+                archive.MAGIC + bytes([archive.ENTRIES_VERSION]):
+            raise errors.BrokenArchiveError()
+        if len(data) < archive.DIRECTORY_FOOTER.size:
+            raise errors.BrokenArchiveError()
+        offset, count = archive.DIRECTORY_FOOTER.unpack_from(
+            data, len(data) - archive.DIRECTORY_FOOTER.size)
+        entries = []
+        for _ in range(count):
+            if offset + archive.DIRECTORY_ENTRY.size > len(data):
+                raise errors.BrokenArchiveError()
+            entry_offset, length, original_size, name_length = \
+                archive.DIRECTORY_ENTRY.unpack_from(data, offset)
+            offset += archive.DIRECTORY_ENTRY.size
+            name = bytes(data[offset:offset + name_length]).decode()
+            offset += name_length
+            path = Path(name)
+            # имена из архива не должны выводить за каталог распаковки
+            if path.is_absolute() or '..' in path.parts \
+                    or entry_offset + length > len(data):
+                raise errors.BrokenArchiveError()
+            entries.append((name, entry_offset, length, original_size))
+        return entries
+
+    def read_range(self, archive_name, start: int, length: int) -> bytes:
+        """
+        Decode length bytes of original data from start.
+        Archive is memory-mapped and only blocks covering the range
+        are found by block index and decoded, if blocks are independent.
+        Chained blocks need history, so they are decoded from
+        the first block up to the end of the range.
+        Checksum of whole data is not checked.
+        """
+
+        if start < 0 or length < 0:
+            raise ValueError('start and length must not be negative')
+        with self.map_archive(archive_name) as src:
+            self.read_header(src, containers.DFA)
+            data = src.view
+            if self.version < archive.INDEXED_VERSION:
+                raise errors.NotSeekableError()
+            index = self._read_index(data)
+            first_block = 0
+            if self.flags & archive.INDEPENDENT_BLOCKS:
+                first_block = max(0, bisect.bisect_right(
+                    [entry[0] for entry in index], start) - 1)
+            decoded = bytearray()
+            history = self.initial_history
+            frame_end = None
+            for original_offset, frame_offset, block_length \
+                    in index[first_block:]:
+                if original_offset >= start + length:
+                    break
+                # между блоками разных сегментов - конец сегмента
+                if frame_offset != frame_end:
+                    history = self.initial_history
+                frame_end = frame_offset + archive.BLOCK_HEADER.size \
+                    + block_length
+                block = self._decompress_frame(
+                    self._read_frame_at(data, frame_offset), history)
+                if original_offset + len(block) > start:
+                    decoded.extend(block[max(0, start - original_offset):])
+                if not self.flags & archive.INDEPENDENT_BLOCKS:
+                    history = (history + block)[-self.history_length:]
+            return bytes(decoded[:length])
+
+    @property
+    def checksum_size(self) -> int:
+        """Size of checksum of data of archive."""
+
+        return len(archive.create_checksum(self.checksum_type).digest())
+
+    @property
+    def history_length(self) -> int:
+        """Count of previous bytes, which chained blocks can refer to."""
+
+        if self.container != containers.DFA \
+                or self.flags & archive.DEFLATE_BLOCKS:
+            return WINDOW_LENGTH
+        return self.window_length
+
+    @property
+    def initial_history(self) -> bytes:
+        """History of the first block: content of dictionary, if it is used."""
+
+        if not self.flags & archive.DICTIONARY:
+            return b''
+        return self.dictionary.content[-self.history_length:]
+
+    @staticmethod
+    def _read_index(data) -> list:
+        """Get entries of block index from the end of archive."""
+
+        index_offset, count = archive.INDEX_FOOTER.unpack_from(
+            data, len(data) - archive.INDEX_FOOTER.size)
+        if index_offset + count * archive.INDEX_ENTRY.size \
+                > len(data) - archive.INDEX_FOOTER.size:
+            raise errors.BrokenArchiveError()
+        return [archive.INDEX_ENTRY.unpack_from(
+            data, index_offset + number * archive.INDEX_ENTRY.size)
+            for number in range(count)]
+
+    @staticmethod
+    def _read_frame_at(data, offset: int) -> tuple:
+        original_length, block_length = archive.BLOCK_HEADER.unpack_from(
+            data, offset)
+        block_offset = offset + archive.BLOCK_HEADER.size
+        if block_offset + block_length > len(data):
+            raise errors.BrokenArchiveError()
+        return original_length, data[block_offset:block_offset + block_length]
+
+    def _decompress_wrapped(self, src: BinaryIO, dst: BinaryIO) -> None:
+        """
+        Decode DEFLATE stream of gzip or zlib container and check trailer.
+        Members of gzip after the first one are decoded too.
+        """
+
+        reader = BitReader(src)
+        while True:
+            if self.container == containers.GZIP:
+                checksum = containers.Crc32()
+            else:
+                checksum = containers.Adler32()
+            size = 0
+            decoder = DeflateDecoder(reader, self.initial_history)
+            for decoded in decoder.decode_blocks():
+                checksum.update(decoded)
+                size += len(decoded)
+                dst.write(decoded)
+            if self.container == containers.ZLIB:
+                containers.check_zlib_trailer(
+                    reader.read_bytes(containers.ZLIB_TRAILER.size),
+                    checksum)
+                return
+            containers.check_gzip_trailer(
+                reader.read_bytes(containers.GZIP_TRAILER.size),
+                checksum, size)
+            if reader.at_end():
+                return
+            containers.read_gzip_header(reader.read_bytes)
+
+    def _read_frames(self, src: BinaryIO,
+                     segment_checksums: collections.deque
+                     ) -> Iterator[tuple]:
+        """
+        Read frames of blocks up to the end of blocks.
+        End of segment is yielded as frame without data,
+        its checksum is added to segment_checksums.
+        """
+
+        while True:
+            original_length, block_length = archive.BLOCK_HEADER.unpack(
+                self._read_exactly(src, archive.BLOCK_HEADER.size))
+            if not original_length:
+                if not block_length:
+                    break
+                if self.version >= archive.CHECKSUMS_VERSION:
+                    segment_end = archive.SEGMENT_END
+                elif self.version == archive.SEGMENTS_VERSION:
+                    segment_end = archive.CHECKSUM_SIZE
+                else:
+                    raise errors.BrokenArchiveError()
+                if block_length != segment_end:
+                    raise errors.BrokenArchiveError()
+                segment_checksums.append(
+                    bytes(self._read_exactly(src, self.checksum_size)))
+                yield 0, b''
+                continue
+            yield original_length, self._read_exactly(src, block_length)
+
+    def _decompress_chained(self, frames: Iterable[tuple]) -> Iterator[bytes]:
+        history = self.initial_history
+        for frame in frames:
+            decoded = self._decompress_frame(frame, history)
+            yield decoded
+            if decoded:
+                history = (history + decoded)[-self.history_length:]
+            else:
+                history = self.initial_history
+
+    def _decompress_frame(self, frame: tuple,
+                          history: Optional[bytes] = None) -> bytes:
+        if history is None:
+            history = self.initial_history
+        original_length, block = frame
+        if not original_length:
+            return b''
+        block_checksum = None
+        if self.flags & archive.BLOCK_CHECKSUMS \
+                and self.version >= archive.CHECKSUMS_VERSION:
+            if len(block) < archive.BLOCK_CHECKSUM.size:
+                raise errors.BrokenArchiveError()
+            block_checksum = archive.BLOCK_CHECKSUM.unpack_from(block)[0]
+            block = block[archive.BLOCK_CHECKSUM.size:]
+        try:
+            decoded = self._decompress_block(block, history)
+            if len(decoded) != original_length:
+                raise errors.BrokenArchiveError()
+        except errors.DeflateError:
+            # с суммами блоков любая ошибка разбора - порча этого блока
+            if block_checksum is None:
+                raise
+            raise errors.WrongBlockChecksumError() from None
+        if block_checksum is not None \
+                and zlib.crc32(decoded) != block_checksum:
+            raise errors.WrongBlockChecksumError()
+        return decoded
+
+    def _decompress_block(self, data: bytes, history: bytes = b'') -> bytes:
+        if self.flags & archive.DEFLATE_BLOCKS:
+            return DeflateCodec.decode(data, history)
+        if self.version >= archive.CANONICAL_VERSION:
+            decoded_huffman = self._decode_canonical_block(data)
+        else:
+            decoded_huffman = self._decode_json_block(data)
+        return LZ77Codec.decode(CodewordArray.from_bytes(decoded_huffman),
+                                history)
+
+    def _decode_canonical_block(self, data: bytes) -> bytes:
+        """
+        Decode codewords of parts of block, since SPLIT_VERSION
+        block can consist of several parts.
+        """
+
+        data = memoryview(data)
+        parts = []
+        offset = 0
+        while offset < len(data):
+            part, offset = self._decode_canonical_part(data, offset)
+            parts.append(part)
+        return b''.join(parts)
+
+    def _decode_canonical_part(self, data: memoryview, offset: int) -> tuple:
+        """Decode codewords of part of block, return them and its end."""
+
+        if data[offset] == archive.STORED_PART \
+                and self.version >= archive.SPLIT_VERSION:
+            offset += 1
+            length = archive.STORED_LENGTH.unpack_from(data, offset)[0]
+            offset += archive.STORED_LENGTH.size
+            chars = data[offset:offset + length]
+            if len(chars) != length:
+                raise errors.BrokenArchiveError()
+            # хранимые байты - кодовые слова без совпадений
+            codewords = bytearray(3 * length)
+            codewords[2::3] = chars
+            return bytes(codewords), offset + length
+        if data[offset] == archive.SHARED_TABLE \
+                and self.flags & archive.DICTIONARY:
+            code_lengths = self.dictionary.code_lengths
+            if not code_lengths:
+                raise errors.BrokenArchiveError()
+            offset += 1
+        else:
+            code_lengths, offset = HuffmanCodec.unpack_code_lengths(data,
+                                                                    offset)
+        if offset + archive.BITS_LENGTH.size > len(data):
+            raise errors.BrokenArchiveError()
+        skip_length = archive.BITS_LENGTH.unpack_from(data, offset)[0]
+        offset += archive.BITS_LENGTH.size
+        end = offset + (skip_length + 7) // 8
+        return HuffmanCodec.decode_canonical(
+            HuffmanCodec.create_decoder(code_lengths),
+            data[offset:end], skip_length), end
+
+    def _decode_json_block(self, data: bytes) -> bytes:
+        # json нужен только для старых архивов, он не замедляет запуск
+        import json
+        data = memoryview(data)
+        code_table_length = struct.unpack_from('I', data)[0]
+        offset = self.offsets['unsigned_int']
+        code_table = json.loads(bytes(data[offset:
+                                           offset + code_table_length]))
         offset += code_table_length
-        skip_length = struct \
-            .unpack('I',
-                    data[offset: offset + self.offsets['unsigned_int']])
-        skip_length = skip_length[0]
+        skip_length = struct.unpack_from('I', data, offset)[0]
         data_to_decode = data[offset + self.offsets['unsigned_int']:]
-        decoded_huffman = huffman_codec.decode(code_table,
-                                               data_to_decode,
-                                               skip_length)
-        decoded = lz77_codec.decode(self._get_codewords_from_bytes
-                                    (decoded_huffman))
-        if huffman_codec.get_checksum(decoded) != checksum:
-            raise errors.WrongChecksumError
-        return Path(filename), decoded
+        return HuffmanCodec.decode(code_table, data_to_decode, skip_length)
+
+    @classmethod
+    def _create_read(cls, src: BinaryIO, prefix: bytes = b''):
+        """Get function to read exactly size bytes, prefix goes first."""
+
+        def read(size: int) -> bytes:
+            nonlocal prefix
+            data = prefix[:size]
+            prefix = prefix[size:]
+            return b''.join((data, cls._read_exactly(src, size - len(data))))
+
+        return read
 
     @staticmethod
-    def _get_codewords_from_bytes(data: bytes) -> list:
-        codewords = []
-        if len(data) % 3 != 0:
+    def _read_exactly(src: BinaryIO, size: int) -> bytes:
+        data = src.read(size)
+        if len(data) != size:
             raise errors.BrokenArchiveError()
-        for i in range(len(data) // 3):
-            offset = data[3 * i]
-            length = data[3 * i + 1]
-            char = data[3 * i + 2]
-            codewords.append(Codeword(offset, length, char))
-        return codewords
+        return data
 
     @staticmethod
     def write_file(file: Path, data: bytes) -> None:
@@ -83,3 +688,35 @@ class Decompressor:
 
         file = Path.cwd() / file
         file.write_bytes(data)
+
+
+class BufferReader:
+    """
+    File-like reader of bytes-like object.
+    read returns views of buffer instead of copies.
+    """
+
+    def __init__(self, data):
+        self.view = memoryview(data)
+        self.position = 0
+
+    def read(self, size: int = -1) -> memoryview:
+        end = len(self.view) if size < 0 \
+            else min(len(self.view), self.position + size)
+        data = self.view[self.position:end]
+        self.position = max(self.position, end)
+        return data
+
+    def close(self) -> None:
+        self.view.release()
+
+
+class NullWriter:
+    """File-like writer, which only counts size of written data."""
+
+    def __init__(self):
+        self.size = 0
+
+    def write(self, data: bytes) -> int:
+        self.size += len(data)
+        return len(data)
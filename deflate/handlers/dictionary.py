@@ -0,0 +1,145 @@
+"""
+Preset dictionaries for small data.
+
+Content of dictionary primes LZ77 window before the first byte of data,
+so short messages can refer to strings, which are common for all of them.
+Dictionary can have shared huffman code lengths for codewords of lz77
+codec, blocks with shared table do not store their own one.
+
+Dictionary file (.dfd) has MAGIC, version, content length, content,
+flags byte and packed code lengths, if table is shared.
+ID of dictionary is Adler-32 of the whole file,
+zlib container uses Adler-32 of content as RFC 1950 requires.
+"""
+import collections
+import struct
+import zlib
+from pathlib import Path
+from typing import Iterable, Optional
+from deflate.codecs.huffman import HuffmanCodec
+from deflate.codecs.lz77 import LZ77Codec
+from deflate import errors
+
+MAGIC = b'DFD'
+VERSION = 1
+SUFFIX = '.dfd'
+SHARED_TABLE = 1
+CONTENT_LENGTH = struct.Struct('<I')
+DICTIONARY_ID = struct.Struct('<I')
+
+# длина отрезков образцов, из которых собирается словарь,
+# и длина подстрок, по которым оцениваются отрезки
+SEGMENT_LENGTH = 32
+KEY_LENGTH = 8
+
+
+class Dictionary:
+    """Preset dictionary: content and optional shared code lengths."""
+
+    def __init__(self, content: bytes,
+                 code_lengths: Optional[dict] = None):
+        self.content = content
+        self.code_lengths = code_lengths
+
+    @property
+    def id(self) -> int:
+        return zlib.adler32(self.to_bytes())
+
+    @property
+    def content_id(self) -> int:
+        return zlib.adler32(self.content)
+
+    def to_bytes(self) -> bytes:
+        flags = SHARED_TABLE if self.code_lengths else 0
+        data = b''.join((MAGIC, bytes([VERSION]),
+                         CONTENT_LENGTH.pack(len(self.content)),
+                         self.content, bytes([flags])))
+        if self.code_lengths:
+            data += HuffmanCodec.pack_code_lengths(self.code_lengths)
+        return data
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'Dictionary':
+        header_length = len(MAGIC) + 1 + CONTENT_LENGTH.size
+        if len(data) < header_length or data[:len(MAGIC)] != MAGIC \
+                or data[len(MAGIC)] != VERSION:
+            raise errors.NotDictionaryError()
+        content_length = CONTENT_LENGTH.unpack_from(data, len(MAGIC) + 1)[0]
+        flags_offset = header_length + content_length
+        if len(data) <= flags_offset:
+            raise errors.NotDictionaryError()
+        content = bytes(data[header_length:flags_offset])
+        code_lengths = None
+        if data[flags_offset] & SHARED_TABLE:
+            try:
+                code_lengths = HuffmanCodec.unpack_code_lengths(
+                    data, flags_offset + 1)[0]
+            except (errors.BrokenArchiveError, IndexError):
+                raise errors.NotDictionaryError()
+        return cls(content, code_lengths)
+
+    @classmethod
+    def load(cls, path) -> 'Dictionary':
+        """Read dictionary from file."""
+
+        path = Path.cwd() / path
+        if not path.exists():
+            raise errors.NotDictionaryError()
+        return cls.from_bytes(path.read_bytes())
+
+    def save(self, path) -> Path:
+        """Write dictionary to file, extension .dfd is added if needed."""
+
+        path = Path.cwd() / path
+        if path.suffix != SUFFIX:
+            path = path.with_name(path.name + SUFFIX)
+        path.write_bytes(self.to_bytes())
+        return path
+
+
+def train(samples: Iterable[bytes], size: int,
+          lz77_codec: Optional[LZ77Codec] = None) -> Dictionary:
+    """
+    Build dictionary of size bytes from samples.
+    Samples are cut into segments, segment is scored by substrings,
+    which are met in many samples. The best segments go last,
+    so they are the closest to data.
+    If lz77_codec is set, code lengths of its codewords are shared.
+    """
+
+    samples = [sample for sample in samples if sample]
+    frequencies = collections.Counter()
+    for sample in samples:
+        frequencies.update({sample[position:position + KEY_LENGTH]
+                            for position
+                            in range(len(sample) - KEY_LENGTH + 1)})
+    scores = {}
+    for sample in samples:
+        for start in range(0, len(sample), SEGMENT_LENGTH // 2):
+            segment = sample[start:start + SEGMENT_LENGTH]
+            # подстрока из одного образца словарю не нужна
+            score = sum(frequencies[segment[position:
+                                            position + KEY_LENGTH]] - 1
+                        for position in range(len(segment) - KEY_LENGTH + 1))
+            if score > scores.get(segment, 0):
+                scores[segment] = score
+    chosen = []
+    chosen_length = 0
+    for segment, _ in sorted(scores.items(), key=lambda item: -item[1]):
+        if chosen_length >= size:
+            break
+        if any(segment in other for other in chosen):
+            continue
+        chosen.append(segment)
+        chosen_length += len(segment)
+    content = b''.join(reversed(chosen))[-size:] if size else b''
+
+    code_lengths = None
+    if lz77_codec is not None:
+        counts = collections.Counter()
+        for sample in samples:
+            counts.update(lz77_codec.encode(sample, content).to_bytes())
+        # таблица должна кодировать любые данные, поэтому в ней все байты
+        code_lengths = HuffmanCodec().get_limited_code_lengths(
+            {byte: counts[byte] + 1 for byte in range(256)})
+    return Dictionary(content, code_lengths)
@@ -0,0 +1,28 @@
+import collections
+import os
+from typing import Callable, Iterable, Iterator
+
+
+def map_blocks(function: Callable, blocks: Iterable,
+               jobs: int) -> Iterator:
+    """
+    Apply function to blocks in jobs worker processes.
+    Results are yielded in order of blocks,
+    only 2 * jobs blocks are processed at the same time.
+    0 jobs means one process for every CPU.
+    """
+
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1:
+        yield from map(function, blocks)
+        return
+    # multiprocessing долго импортируется, а нужен не при каждом запуске
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(jobs) as executor:
+        pending = collections.deque()
+        for block in blocks:
+            pending.append(executor.submit(function, block))
+            if len(pending) >= 2 * jobs:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
@@ -0,0 +1,126 @@
+"""
+Compression of many small inputs.
+
+Compressor creates codecs for every input, so small inputs
+spend most of time on allocation of hash chains and on building
+of huffman tables. Session keeps LZ77 codec with its hash chains
+and recently used huffman tables of lz77 blocks.
+Cached table is reused, if it has codes for all codewords of block
+and block with it is not much longer than with its own table.
+"""
+import collections
+import math
+from typing import Iterable, Iterator, NamedTuple, Optional
+from bitarray import bitarray
+from deflate.codecs.huffman import HuffmanCodec
+from deflate.codecs.lz77 import LZ77Codec
+from deflate.handlers import archive, containers
+from deflate.handlers.compressor import Compressor, DEFAULT_LEVEL
+from deflate.handlers.dictionary import Dictionary
+
+
+class CachedTable(NamedTuple):
+    """Huffman table of block with packed code lengths."""
+
+    code_lengths: dict
+    codes: dict
+    packed_lengths: bytes
+    # отношение размера блока с таблицей к наименьшему возможному
+    redundancy: float
+
+
+class CompressionSession(Compressor):
+    """
+    Compressor, which keeps codecs and huffman tables between inputs.
+    Every input is compressed to its own archive, like by Compressor.
+    tables_count limits count of cached tables, tolerance is part
+    of size of block, which can be lost by reusing of cached table.
+    """
+
+    def __init__(self, level: int = DEFAULT_LEVEL,
+                 codec: Optional[str] = None,
+                 container: str = containers.DFA,
+                 dictionary: Optional[Dictionary] = None,
+                 tables_count: int = 8, tolerance: float = 0.02):
+        super().__init__(level, codec, container, dictionary)
+        self.tolerance = tolerance
+        # недавно использованные таблицы в начале
+        self.tables = collections.deque(maxlen=tables_count)
+        self.lz77_codec = None
+
+    def create_lz77_codec(self) -> LZ77Codec:
+        """Get LZ77 codec of level, it is created once for session."""
+
+        if self.lz77_codec is None:
+            self.lz77_codec = super().create_lz77_codec()
+        return self.lz77_codec
+
+    def compress_many(self, inputs: Iterable[bytes]) -> Iterator[bytes]:
+        """Compress every input to separate archive."""
+
+        for data in inputs:
+            yield self.compress(data, '')[0]
+
+    def _encode_codewords(self, codewords: bytes) -> bytes:
+        counts = collections.Counter(codewords)
+        table = self._find_table(counts)
+        if table is None:
+            code_lengths = HuffmanCodec().get_limited_code_lengths(counts)
+            table = CachedTable(
+                code_lengths,
+                HuffmanCodec.create_canonical_codes(code_lengths),
+                HuffmanCodec.pack_code_lengths(code_lengths), 1)
+            size, min_size = self._get_sizes(counts, table)
+            table = table._replace(redundancy=size / min_size)
+            self.tables.appendleft(table)
+        encoded_data = bitarray()
+        encoded_data.encode(table.codes, codewords)
+        return b''.join((table.packed_lengths,
+                         archive.BITS_LENGTH.pack(len(encoded_data)),
+                         encoded_data.tobytes()))
+
+    def _find_table(self, counts: dict) -> Optional[CachedTable]:
+        """
+        Find cached table for counts of codewords bytes.
+        Table fits, if it is not much further from the least size
+        of block, than it is for block, which it was built for.
+        """
+
+        for index, table in enumerate(self.tables):
+            if not all(char in table.code_lengths for char in counts):
+                continue
+            size, min_size = self._get_sizes(counts, table)
+            if size <= min_size * table.redundancy * (1 + self.tolerance):
+                del self.tables[index]
+                self.tables.appendleft(table)
+                return table
+        return None
+
+    @staticmethod
+    def _get_sizes(counts: dict, table: CachedTable) -> tuple:
+        """
+        Get size in bits of block with table and the least size
+        of block with any table: entropy of bytes and code lengths
+        of met bytes, packed with the same width.
+        """
+
+        total = sum(counts.values())
+        entropy = sum(count * math.log2(total / count)
+                      for count in counts.values())
+        width = table.packed_lengths[0]
+        min_size = entropy + 8 * (1 + -(-(256 + len(counts) * width) // 8))
+        size = sum(count * table.code_lengths[char]
+                   for char, count in counts.items()) \
+            + 8 * len(table.packed_lengths)
+        return size, min_size
+
+
+def compress_many(inputs: Iterable[bytes], level: int = DEFAULT_LEVEL,
+                  codec: Optional[str] = None,
+                  container: str = containers.DFA,
+                  dictionary: Optional[Dictionary] = None,
+                  **session_parameters) -> Iterator[bytes]:
+    """Compress every input to separate archive in one session."""
+
+    return CompressionSession(level, codec, container, dictionary,
+                              **session_parameters).compress_many(inputs)
@@ -0,0 +1,128 @@
+"""
+Statistics of compression.
+
+Compressor with stats measures duration and sizes of data
+of every stage of compression: reading, checksum, check
+of compressibility, LZ77, serialization of codewords, huffman encoding
+and packing of block or DEFLATE encoding, writing. It also counts
+literals and matches with histograms of match lengths and offsets
+and collects code lengths of huffman tables and types of blocks.
+Stages of blocks, compressed in other processes (jobs),
+are not measured.
+"""
+import collections
+import itertools
+from typing import Iterable, Optional
+from bitarray import bitarray
+from deflate.codecs.deflate import BlockInfo
+from deflate.codecs.lz77 import CodewordArray
+
+READ_STAGE = 'read'
+PRECHECK_STAGE = 'precheck'
+CHECKSUM_STAGE = 'checksum'
+LZ77_STAGE = 'lz77'
+SERIALIZE_STAGE = 'serialize'
+HUFFMAN_STAGE = 'huffman'
+PACK_STAGE = 'pack'
+DEFLATE_STAGE = 'deflate'
+WRITE_STAGE = 'write'
+
+BLOCK_TYPES = ('stored', 'fixed', 'dynamic')
+
+
+class StageStats:
+    """Count of calls, duration and sizes of data of one stage."""
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def to_dict(self) -> dict:
+        return dict(vars(self))
+
+
+class CompressionStats:
+    """Statistics of all data, compressed by one compressor."""
+
+    def __init__(self):
+        self.stages = collections.defaultdict(StageStats)
+        self.literals = 0
+        self.matches = 0
+        self.match_lengths = collections.Counter()
+        # расстояния группируются по степеням двойки: 1, 2-3, 4-7, ...
+        self.offset_bits = collections.Counter()
+        self.tables = 0
+        self.table_bytes = 0
+        self.code_lengths = collections.Counter()
+        self.block_types = collections.Counter()
+
+    def add_stage(self, stage: str, seconds: float, bytes_in: int,
+                  result=None) -> None:
+        """Add call of stage with size of its input and its result."""
+
+        stage_stats = self.stages[stage]
+        stage_stats.calls += 1
+        stage_stats.seconds += seconds
+        stage_stats.bytes_in += bytes_in
+        stage_stats.bytes_out += get_size(result)
+
+    def add_codewords(self, codewords: CodewordArray) -> None:
+        matches = [(offset, length) for offset, length
+                   in zip(codewords.offsets, codewords.lengths) if offset]
+        self.matches += len(matches)
+        self.literals += len(codewords) - len(matches)
+        self.match_lengths.update(length for _, length in matches)
+        self.offset_bits.update(offset.bit_length() for offset, _ in matches)
+
+    def add_table(self, code_lengths: Iterable[int],
+                  table_bytes: float) -> None:
+        """Add huffman table by its code lengths and size in archive."""
+
+        self.tables += 1
+        self.table_bytes += table_bytes
+        self.code_lengths.update(code_lengths)
+
+    def add_deflate_block(self, block: Optional[BlockInfo]) -> None:
+        if block is None:
+            return
+        self.block_types[BLOCK_TYPES[block.block_type]] += 1
+        if block.header_length:
+            self.add_table(itertools.chain(block.literal_lengths.values(),
+                                           block.distance_lengths.values()),
+                           block.header_length / 8)
+
+    def to_dict(self) -> dict:
+        """Get statistics as dict of JSON types."""
+
+        return {
+            'stages': {stage: stage_stats.to_dict()
+                       for stage, stage_stats in self.stages.items()},
+            'literals': self.literals,
+            'matches': self.matches,
+            'match_lengths': dict(sorted(self.match_lengths.items())),
+            'offsets': {f'{1 << bits >> 1}-{(1 << bits) - 1}': count
+                        for bits, count in sorted(self.offset_bits.items())},
+            'huffman': {
+                'tables': self.tables,
+                'table_bytes': self.table_bytes,
+                'code_lengths': dict(sorted(self.code_lengths.items())),
+                'max_code_length': max(self.code_lengths, default=0),
+            },
+            'block_types': dict(self.block_types),
+        }
+
+
+def get_size(result) -> int:
+    """Get size in bytes of result of stage, 0 if it is not data."""
+
+    if isinstance(result, tuple) and result:
+        return get_size(result[0])
+    if isinstance(result, CodewordArray):
+        return 3 * len(result)
+    if isinstance(result, bitarray):
+        return (len(result) + 7) // 8
+    if isinstance(result, (bytes, bytearray, memoryview)):
+        return len(result)
+    return 0
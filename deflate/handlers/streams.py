@@ -0,0 +1,84 @@
+"""
+Blocking file-like objects over asyncio streams.
+
+Compressor and Decompressor read and write files synchronously,
+so async methods run them in worker thread with these wrappers.
+Every read and write of worker waits for the event loop,
+written data is drained before the next block is encoded,
+so buffered data is limited by size of block, even if
+destination is slow. Ordinary binary files are used as is,
+they are read and written by worker thread.
+"""
+import asyncio
+import inspect
+
+
+class LoopReader:
+    """Reader of stream with async read method, like StreamReader."""
+
+    def __init__(self, reader, loop: asyncio.AbstractEventLoop):
+        self.reader = reader
+        self.loop = loop
+
+    def read(self, size: int = -1) -> bytes:
+        return asyncio.run_coroutine_threadsafe(self._read(size),
+                                                self.loop).result()
+
+    async def _read(self, size: int) -> bytes:
+        if size is None or size < 0:
+            return await self.reader.read()
+        # как файл, возвращаем меньше size байт только в конце потока
+        chunks = []
+        while size > 0:
+            chunk = await self.reader.read(size)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b''.join(chunks)
+
+
+class LoopWriter:
+    """
+    Writer of stream with drain method, like StreamWriter,
+    or with async write method.
+    """
+
+    def __init__(self, writer, loop: asyncio.AbstractEventLoop):
+        self.writer = writer
+        self.loop = loop
+
+    def write(self, data: bytes) -> int:
+        asyncio.run_coroutine_threadsafe(self._write(bytes(data)),
+                                         self.loop).result()
+        return len(data)
+
+    async def _write(self, data: bytes) -> None:
+        result = self.writer.write(data)
+        if inspect.isawaitable(result):
+            await result
+        drain = getattr(self.writer, 'drain', None)
+        if drain is not None:
+            await drain()
+
+
+def is_async_reader(reader) -> bool:
+    return inspect.iscoroutinefunction(reader.read)
+
+
+def is_async_writer(writer) -> bool:
+    return inspect.iscoroutinefunction(writer.write) \
+        or hasattr(writer, 'drain')
+
+
+async def run_blocking(executor, function, reader, writer, *args):
+    """
+    Call function(src, dst, *args) in executor (default one if None),
+    async streams are wrapped by LoopReader and LoopWriter.
+    Executor must run functions in threads of this process.
+    """
+
+    loop = asyncio.get_running_loop()
+    src = LoopReader(reader, loop) if is_async_reader(reader) else reader
+    dst = LoopWriter(writer, loop) if is_async_writer(writer) else writer
+    return await loop.run_in_executor(executor, function, src, dst, *args)
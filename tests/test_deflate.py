@@ -1,16 +1,35 @@
+import asyncio
+import contextlib
+import gzip
+import io
+import random
+import struct
+import subprocess
+import sys
+import tracemalloc
 import unittest
+import zlib
 from bitarray import bitarray
-from deflate.codecs.huffman import HuffmanCodec, Node
-from deflate.codecs.lz77 import LZ77Codec, Codeword
+from deflate.codecs.huffman import HuffmanCodec, Node, \
+    get_huffman_code_lengths, package_merge
+from deflate.codecs.lz77 import LZ77Codec, Codeword, CodewordArray
+from deflate.codecs.deflate import DeflateCodec, DYNAMIC_BLOCK, \
+    FIXED_STRATEGY
 import tempfile
-from deflate.handlers.compressor import Compressor
+from deflate.handlers.compressor import Compressor, LEVELS, \
+    is_incompressible
+from deflate import errors
+from deflate.__main__ import batch, compress, create_cmd_parser
+from deflate.handlers import archive
 from deflate.handlers.decompressor import Decompressor
+from deflate.handlers.dictionary import Dictionary, train
+from deflate.handlers.session import CompressionSession, compress_many
 from pathlib import Path
 
 
 class TestHuffman(unittest.TestCase):
     def test_encode(self):
-        expected_data = bitarray([1, 1, 1, 1, 1])
+        expected_data = bitarray([0, 0, 0, 0, 0])
         huffman_codec = HuffmanCodec()
         result = huffman_codec.encode(b'aaaaa')[0]
         self.assertEqual(expected_data, result)
@@ -22,6 +41,37 @@ class TestHuffman(unittest.TestCase):
                                      5)
         self.assertEqual(expected_data, result)
 
+    def test_canonical_codes(self):
+        codes_table = HuffmanCodec.create_canonical_codes(
+            {97: 1, 98: 2, 99: 3, 100: 3})
+        self.assertEqual({97: bitarray('0'), 98: bitarray('10'),
+                          99: bitarray('110'), 100: bitarray('111')},
+                         codes_table)
+
+    def test_pack_code_lengths(self):
+        code_lengths = {0: 1, 97: 2, 255: 2}
+        packed = HuffmanCodec.pack_code_lengths(code_lengths)
+        self.assertEqual(34, len(packed))
+        self.assertEqual((code_lengths, len(packed)),
+                         HuffmanCodec.unpack_code_lengths(packed))
+        # три кода длины 1 не образуют префиксный код
+        packed = HuffmanCodec.pack_code_lengths({0: 1, 97: 1, 255: 1})
+        with self.assertRaises(errors.BrokenArchiveError):
+            HuffmanCodec.unpack_code_lengths(packed)
+
+    def test_decode_canonical(self):
+        decoder = HuffmanCodec.create_decoder({97: 1, 98: 2, 99: 2})
+        result = HuffmanCodec.decode_canonical(
+            decoder, bytes(bitarray('01110000')), 6)
+        self.assertEqual(b'acba', result)
+        result = HuffmanCodec.decode_canonical(decoder, b'\x80', 2)
+        self.assertEqual(b'b', result)
+
+    def test_decode_canonical_broken(self):
+        decoder = HuffmanCodec.create_decoder({97: 1, 98: 2})
+        with self.assertRaises(errors.BrokenArchiveError):
+            HuffmanCodec.decode_canonical(decoder, b'\xc0', 2)
+
     def test_create_tree(self):
         expected_tree = Node(97, 5)
         huffman_codec = HuffmanCodec()
@@ -29,6 +79,28 @@ class TestHuffman(unittest.TestCase):
         tree = huffman_codec.create_tree(freq)
         self.assertEqual(expected_tree, tree)
 
+    def test_limited_code_lengths(self):
+        # веса Фибоначчи дают самое глубокое дерево Хаффмана
+        counts = [1, 1]
+        while len(counts) < 25:
+            counts.append(counts[-1] + counts[-2])
+        self.assertEqual(24, max(get_huffman_code_lengths(counts)))
+        lengths = get_huffman_code_lengths(counts, 15)
+        self.assertEqual(15, max(lengths))
+        self.assertEqual(1, sum(2 ** -length for length in lengths))
+        self.assertEqual(get_huffman_code_lengths([5, 0, 3, 1, 1]),
+                         package_merge([5, 0, 3, 1, 1], 15))
+        self.assertEqual([0, 1, 0], get_huffman_code_lengths([0, 7, 0], 15))
+        data = b''.join(bytes([char]) * count
+                        for char, count in enumerate(counts))
+        encoded_data, codes_table = HuffmanCodec().encode(data)
+        self.assertEqual(15, max(map(len, codes_table.values())))
+        code_lengths = {char: len(code)
+                        for char, code in codes_table.items()}
+        self.assertEqual(data, HuffmanCodec.decode_canonical(
+            HuffmanCodec.create_decoder(code_lengths),
+            encoded_data.tobytes(), len(encoded_data)))
+
     def test_checksum(self):
         expected_checksum = b'YO\x80;8\nA9n\xd6=\xca9P5B'
         checksum = HuffmanCodec.get_checksum(b'aaaaa')
@@ -59,6 +131,56 @@ class TestLZ77(unittest.TestCase):
             self.assertEqual(expected_data[i].offset, codeword.offset)
             i += 1
 
+    def test_encode_short_matches(self):
+        data = b'abxaby'
+        expected_data = [Codeword(0, 0, 97),
+                         Codeword(0, 0, 98),
+                         Codeword(0, 0, 120),
+                         Codeword(3, 2, 121)]
+        lz77_codec = LZ77Codec(256)
+        encoded = lz77_codec.encode(data)
+        self.assertEqual(expected_data, encoded)
+
+    def test_encode_max_chain(self):
+        data = b'abcd1abce2abcf3abcd!'
+        full_search = LZ77Codec(256).encode(data)
+        short_search = LZ77Codec(256, max_chain=1).encode(data)
+        self.assertEqual(Codeword(15, 4, 33), full_search[-1])
+        self.assertEqual(Codeword(5, 3, 100), short_search[-2])
+        self.assertEqual(data, LZ77Codec.decode(short_search))
+
+    def test_encode_decode_window(self):
+        data = bytes(range(200)) * 5 + b'tail'
+        lz77_codec = LZ77Codec(256)
+        encoded = lz77_codec.encode(data)
+        for codeword in encoded:
+            self.assertLess(codeword.offset, 256)
+            self.assertLess(codeword.length, 256)
+        self.assertEqual(data, lz77_codec.decode(encoded))
+
+    def test_encode_with_history(self):
+        lz77_codec = LZ77Codec(256)
+        encoded = lz77_codec.encode(b'abcdx', b'abcd')
+        self.assertEqual([Codeword(4, 4, 120)], encoded)
+        self.assertEqual(b'abcdx', lz77_codec.decode(encoded, b'abcd'))
+
+    def test_encode_optimal(self):
+        data = b'abcabd abcabd abcab abcabcabd ' * 20 + b'abcab'
+        lazy = LZ77Codec(256, max_lazy=16).encode(data)
+        optimal = LZ77Codec(256, max_lazy=16, optimal=True).encode(data)
+        self.assertEqual(data, LZ77Codec.decode(optimal))
+        self.assertLessEqual(len(HuffmanCodec().encode(optimal.to_bytes())[0]),
+                             len(HuffmanCodec().encode(lazy.to_bytes())[0]))
+
+    def test_codeword_array_bytes(self):
+        codewords = CodewordArray([0, 2], [0, 11], [97, 98])
+        self.assertEqual(b'\x00\x00a\x02\x0bb', codewords.to_bytes())
+        self.assertEqual(codewords,
+                         CodewordArray.from_bytes(codewords.to_bytes()))
+        self.assertEqual(Codeword(2, 11, 98), codewords[1])
+        with self.assertRaises(errors.BrokenArchiveError):
+            CodewordArray.from_bytes(b'\x00\x00')
+
     def test_decode(self):
         expected_data = b'ababababababab'
         data = [Codeword(0, 0, 97),
@@ -68,6 +190,19 @@ class TestLZ77(unittest.TestCase):
         decoded = lz77_codec.decode(data)
         self.assertEqual(expected_data, decoded)
 
+    def test_decode_overlapping(self):
+        data = [Codeword(0, 0, 97),
+                Codeword(0, 0, 98),
+                Codeword(0, 0, 99),
+                Codeword(3, 10, 120),
+                Codeword(4, 2, 121)]
+        decoded = LZ77Codec.decode(data)
+        self.assertEqual(b'abcabcabcabcaxbcy', decoded)
+
+    def test_decode_not_in_window(self):
+        with self.assertRaises(errors.CodewordNotInWindowError):
+            LZ77Codec.decode([Codeword(0, 0, 97), Codeword(2, 1, 98)])
+
     def test_decode_large(self):
         expected_data = b'ababababababab' * 10
         data = [Codeword(0, 0, 97),
@@ -78,6 +213,71 @@ class TestLZ77(unittest.TestCase):
         self.assertEqual(expected_data, decoded)
 
 
+class TestDeflate(unittest.TestCase):
+    data = b'deflate bitstream with length and distance codes. ' * 200
+
+    def test_encode_decode(self):
+        encoded = DeflateCodec().encode(self.data)
+        self.assertLess(len(encoded), len(self.data) // 10)
+        self.assertEqual(self.data, DeflateCodec.decode(encoded))
+
+    def test_zlib_decodes_encoded(self):
+        for data in (b'', b'a', self.data):
+            encoded = DeflateCodec().encode(data)
+            self.assertEqual(data, zlib.decompress(encoded, -15))
+
+    def test_decode_zlib_stream(self):
+        compressor = zlib.compressobj(9, zlib.DEFLATED, -15)
+        encoded = compressor.compress(self.data) + compressor.flush()
+        self.assertEqual(self.data, DeflateCodec.decode(encoded))
+
+    def test_encode_fixed(self):
+        encoded = DeflateCodec(strategy=FIXED_STRATEGY).encode(self.data)
+        self.assertEqual(1, encoded[0] >> 1 & 3)
+        self.assertEqual(self.data, zlib.decompress(encoded, -15))
+
+    def test_encode_stored(self):
+        data = random.Random(0).randbytes(70000)
+        encoded = DeflateCodec().encode(data)
+        self.assertEqual(0, encoded[0] >> 1 & 3)
+        self.assertEqual(data, DeflateCodec.decode(encoded))
+        self.assertEqual(data, zlib.decompress(encoded, -15))
+
+    def test_encode_with_history(self):
+        codec = DeflateCodec()
+        first = codec.encode(self.data, final=False)
+        second = codec.encode(self.data, self.data)
+        self.assertLess(len(second), 64)
+        self.assertEqual(self.data * 2, zlib.decompress(first + second, -15))
+        self.assertEqual(self.data * 2, DeflateCodec.decode(first + second))
+        self.assertEqual(self.data, DeflateCodec.decode(
+            DeflateCodec().encode(self.data, self.data), self.data))
+        # совпадение с началом истории длиннее max_length
+        history = random.Random(0).randbytes(4096)
+        encoded = DeflateCodec().encode(history[:200], history)
+        self.assertLess(len(encoded), 16)
+        self.assertEqual(history[:200], DeflateCodec.decode(encoded, history))
+
+    def test_encode_optimal(self):
+        data = b'optimal parsing of matches, optimal parse of match. ' * 50
+        lazy = DeflateCodec().encode(data)
+        optimal = DeflateCodec(DeflateCodec.create_lz77_codec(
+            optimal=True)).encode(data)
+        self.assertEqual(data, zlib.decompress(optimal, -15))
+        self.assertLessEqual(len(optimal), len(lazy))
+
+    def test_decode_broken(self):
+        with self.assertRaises(errors.BrokenArchiveError):
+            DeflateCodec.decode(b'\x07')
+        with self.assertRaises(errors.BrokenArchiveError):
+            DeflateCodec.decode(DeflateCodec().encode(self.data)[:-4])
+        # динамический блок с четырьмя кодами длин по 1 биту
+        lengths = sum(1 << shift for shift in (17, 20, 23, 26))
+        header = 1 | DYNAMIC_BLOCK << 1 | lengths
+        with self.assertRaises(errors.BrokenArchiveError):
+            DeflateCodec.decode(header.to_bytes(4, 'little'))
+
+
 class TestCompressor(unittest.TestCase):
     def test_compressor_read_from_file(self):
         compressor = Compressor()
@@ -109,3 +309,578 @@ class TestCompressor(unittest.TestCase):
         self.assertEqual(decoded_data, data_from_file)
         self.assertIsNotNone(data_to_decode)
         archive.unlink()
+
+    def test_compress_levels(self):
+        data = b'level test data, level test data ' * 20
+        decompressor = Decompressor()
+        for level in LEVELS:
+            encoded_data = Compressor(level).compress(data, 'levels')[0]
+            decoded_data = decompressor.decompress(bytes(encoded_data))[1]
+            self.assertEqual(data, decoded_data)
+
+    def test_compress_wrong_level(self):
+        with self.assertRaises(errors.WrongLevelError):
+            Compressor(10)
+
+    def test_compress_and_decompress_stream(self):
+        data = b'stream block data ' * 1000
+        compressed = io.BytesIO()
+        original_size, compressed_size, _ = Compressor().compress_stream(
+            io.BytesIO(data), compressed, 'stream.txt', chunk_size=1000)
+        self.assertEqual(len(data), original_size)
+        self.assertEqual(len(compressed.getvalue()), compressed_size)
+        compressed.seek(0)
+        decompressed = io.BytesIO()
+        file = Decompressor().decompress_stream(compressed, decompressed)
+        self.assertEqual(Path('stream.txt'), file)
+        self.assertEqual(data, decompressed.getvalue())
+
+    def test_decompress_legacy_archive(self):
+        data = bytes.fromhex(LEGACY_ARCHIVE)
+        file, decoded_data = Decompressor().decompress(data)
+        self.assertEqual(Path('legacy.txt'), file)
+        self.assertEqual(b'legacy legacy archive', decoded_data)
+
+    def test_decompress_wrong_checksum(self):
+        compressor = Compressor()
+        data = bytearray(compressor.compress(b'checksum', 'file')[0])
+        data[data.rfind(compressor.checksum)] ^= 1
+        with self.assertRaises(errors.WrongChecksumError):
+            Decompressor().decompress(bytes(data))
+
+    def test_decompress_file_broken(self):
+        # ошибка разжатия не скрывается ошибкой закрытия отображения
+        data = b'memory mapped archive ' * 3000
+        compressed = bytearray(Compressor().compress(data, 'file')[0])
+        compressed[len(compressed) // 2] ^= 0x55
+        with tempfile.TemporaryDirectory() as directory:
+            archive_path = Path(directory) / 'broken.dfa'
+            archive_path.write_bytes(compressed)
+            with self.assertRaises(errors.DeflateError):
+                Decompressor().decompress_file(archive_path, io.BytesIO())
+
+    def test_compress_parallel(self):
+        data = b'parallel blocks ' * 3000
+        archives = []
+        for jobs in (1, 2):
+            compressed = io.BytesIO()
+            Compressor().compress_stream(io.BytesIO(data), compressed,
+                                         'file', chunk_size=4096, jobs=jobs)
+            archives.append(compressed.getvalue())
+        self.assertEqual(archives[0], archives[1])
+        decompressed = io.BytesIO()
+        Decompressor().decompress_stream(io.BytesIO(archives[0]),
+                                         decompressed, jobs=2)
+        self.assertEqual(data, decompressed.getvalue())
+
+    def test_compress_deflate_codec(self):
+        data = b'deflate codec in archive ' * 5000
+        for jobs in (None, 2):
+            compressed = io.BytesIO()
+            Compressor(codec='deflate').compress_stream(
+                io.BytesIO(data), compressed, 'file', chunk_size=8192,
+                jobs=jobs)
+            decompressed = io.BytesIO()
+            Decompressor().decompress_stream(
+                io.BytesIO(compressed.getvalue()), decompressed, jobs=jobs)
+            self.assertEqual(data, decompressed.getvalue())
+
+    def test_compress_gzip_and_zlib(self):
+        data = b'gzip and zlib containers ' * 3000
+        for jobs in (None, 2):
+            for container, decompress in (('gzip', gzip.decompress),
+                                          ('zlib', zlib.decompress)):
+                compressed = io.BytesIO()
+                compressor = Compressor(container=container)
+                compressor.compress_stream(io.BytesIO(data), compressed,
+                                           'dir/file', chunk_size=8192,
+                                           jobs=jobs)
+                self.assertEqual(data, decompress(compressed.getvalue()))
+                filename, decompressed = Decompressor().decompress(
+                    compressed.getvalue(), container)
+                self.assertEqual(data, decompressed)
+                self.assertEqual(Path('file') if container == 'gzip'
+                                 else None, filename)
+
+    def test_decompress_gzip_members(self):
+        compressed = gzip.compress(b'first member ') + \
+            gzip.compress(b'second member')
+        filename, decompressed = Decompressor().decompress(compressed)
+        self.assertIsNone(filename)
+        self.assertEqual(b'first member second member', decompressed)
+
+    def test_decompress_gzip_name_with_directories(self):
+        data = b'name of file from foreign gzip'
+        for name, expected in ((b'../escaped.txt', Path('escaped.txt')),
+                               (b'/tmp/abs.txt', Path('abs.txt')),
+                               (b'..', None)):
+            encoder = zlib.compressobj(wbits=-15)
+            compressed = b'\x1f\x8b\x08\x08' + bytes(6) + name + b'\0' \
+                + encoder.compress(data) + encoder.flush() \
+                + struct.pack('<II', zlib.crc32(data), len(data))
+            self.assertEqual((expected, data),
+                             Decompressor().decompress(compressed))
+
+    def test_decompress_gzip_wrong_checksum(self):
+        compressed = bytearray(gzip.compress(b'checksum of gzip'))
+        compressed[-8] ^= 1
+        with self.assertRaises(errors.WrongChecksumError):
+            Decompressor().decompress(bytes(compressed))
+
+    def test_compress_gzip_lz77_codec(self):
+        with self.assertRaises(errors.ContainerCodecError):
+            Compressor(codec='lz77', container='gzip')
+
+    def test_read_range(self):
+        data = bytes(range(256)) * 100 + b'range of blocks ' * 1000
+        with tempfile.TemporaryDirectory() as directory:
+            for codec, jobs in (('lz77', 1), ('lz77', None),
+                                ('deflate', 1), ('deflate', None)):
+                archive_path = Path(directory) / f'{codec}{jobs}.dfa'
+                with archive_path.open('wb') as dst:
+                    Compressor(codec=codec).compress_stream(
+                        io.BytesIO(data), dst, 'file', chunk_size=4096,
+                        jobs=jobs)
+                decompressor = Decompressor()
+                for start, length in ((0, 10), (4090, 20), (10000, 9000),
+                                      (len(data) - 5, 100),
+                                      (len(data) + 1, 1), (100, 0)):
+                    self.assertEqual(data[start:start + length],
+                                     decompressor.read_range(
+                                         archive_path, start, length))
+
+    def test_append_stream(self):
+        parts = [b'log line %d\n' % number * 50 for number in range(3)]
+        data = b''.join(parts)
+        with tempfile.TemporaryDirectory() as directory:
+            for codec, jobs in (('lz77', None), ('deflate', 1)):
+                archive_path = Path(directory) / f'{codec}.dfa'
+                compressor = Compressor(codec=codec)
+                with archive_path.open('wb') as dst:
+                    compressor.compress_stream(io.BytesIO(parts[0]), dst,
+                                               'log', chunk_size=256,
+                                               jobs=jobs)
+                for part in parts[1:]:
+                    size = archive_path.stat().st_size
+                    with archive_path.open('r+b') as dst:
+                        appended_size, growth, _ = compressor.append_stream(
+                            io.BytesIO(part), dst, chunk_size=256)
+                    self.assertEqual(len(part), appended_size)
+                    self.assertEqual(size + growth,
+                                     archive_path.stat().st_size)
+                decompressor = Decompressor()
+                self.assertEqual(data, decompressor.decompress(
+                    archive_path.read_bytes())[1])
+                decoded = io.BytesIO()
+                decompressor.decompress_file(archive_path, decoded, jobs=2)
+                self.assertEqual(data, decoded.getvalue())
+                self.assertEqual(data[500:1500], decompressor.read_range(
+                    archive_path, 500, 1000))
+                with self.assertRaises(errors.AppendedCodecError), \
+                        archive_path.open('r+b') as dst:
+                    Compressor(codec='lz77' if codec == 'deflate'
+                               else 'deflate').append_stream(
+                        io.BytesIO(b'x'), dst)
+            # сумма сегмента проверяется при распаковке
+            compressed = bytearray((Path(directory) / 'lz77.dfa').read_bytes())
+            compressed[compressed.index(archive.BLOCK_HEADER.pack(
+                0, archive.SEGMENT_END)) + archive.BLOCK_HEADER.size] ^= 1
+            with self.assertRaises(errors.WrongChecksumError):
+                Decompressor().decompress(bytes(compressed))
+        dst = io.BytesIO(gzip.compress(parts[0]))
+        Compressor(container='gzip').append_stream(io.BytesIO(parts[1]), dst)
+        self.assertEqual(parts[0] + parts[1], gzip.decompress(dst.getvalue()))
+
+    def test_append_stream_failed(self):
+        class BrokenReader(io.BytesIO):
+            def read(self, size=-1):
+                if self.tell():
+                    raise OSError('read failed')
+                return super().read(size)
+
+        data = b'log line\n' * 100
+        for codec, jobs in (('lz77', None), ('deflate', 1)):
+            compressor = Compressor(codec=codec)
+            dst = io.BytesIO()
+            compressor.compress_stream(io.BytesIO(data), dst, 'log',
+                                       chunk_size=256, jobs=jobs)
+            compressed = dst.getvalue()
+            # часть сегмента уже сжата, когда чтение ломается
+            with self.assertRaises(OSError):
+                compressor.append_stream(BrokenReader(data), dst,
+                                         chunk_size=256)
+            self.assertEqual(compressed, dst.getvalue())
+            self.assertEqual(data, Decompressor().decompress(
+                dst.getvalue())[1])
+
+    def test_append_stream_with_dictionary(self):
+        dictionary = Dictionary(b'{"event": "append", "user": ')
+        parts = [b'{"event": "append", "user": %d}\n' % number * 40
+                 for number in range(2)]
+        for codec in ('lz77', 'deflate'):
+            compressor = Compressor(codec=codec, dictionary=dictionary)
+            dst = io.BytesIO()
+            compressor.compress_stream(io.BytesIO(parts[0]), dst, 'log',
+                                       chunk_size=256)
+            # блоки архива связаны, поэтому сегмент сжимается без процессов
+            compressor.append_stream(io.BytesIO(parts[1]), dst,
+                                     chunk_size=256, jobs=2)
+            self.assertEqual(b''.join(parts), Decompressor(
+                dictionary).decompress(dst.getvalue())[1])
+
+    def test_checksum_types(self):
+        data = b'checksum of every block ' * 2000
+        for checksum_type in ('md5', 'crc32', 'adler32', 'none'):
+            compressor = Compressor(checksum_type=checksum_type,
+                                    block_checksums=True)
+            compressed = compressor.compress(data, 'a')[0]
+            self.assertEqual(len(archive.create_checksum(
+                checksum_type).digest()), len(compressor.checksum))
+            self.assertEqual(data, Decompressor().decompress(compressed)[1])
+        with self.assertRaises(errors.UnknownChecksumError):
+            Compressor(checksum_type='sha1')
+
+    def test_test_archive(self):
+        data = bytes(range(256)) * 200
+        with tempfile.TemporaryDirectory() as directory:
+            archive_path = Path(directory) / 'a.dfa'
+            with archive_path.open('wb') as dst:
+                Compressor(block_checksums=True).compress_stream(
+                    io.BytesIO(data), dst, 'a', chunk_size=8192)
+            self.assertEqual(len(data),
+                             Decompressor().test_archive(archive_path))
+            # порча второго блока находится по его сумме
+            compressed = bytearray(archive_path.read_bytes())
+            index_offset = archive.INDEX_FOOTER.unpack_from(
+                compressed, len(compressed) - archive.INDEX_FOOTER.size)[0]
+            frame_offset = archive.INDEX_ENTRY.unpack_from(
+                compressed, index_offset + archive.INDEX_ENTRY.size)[1]
+            compressed[frame_offset + archive.BLOCK_HEADER.size + 10] ^= 1
+            archive_path.write_bytes(compressed)
+            with self.assertRaises(errors.WrongBlockChecksumError) as error:
+                Decompressor().test_archive(archive_path)
+            self.assertIn('8192', error.exception.message)
+
+    def test_read_range_not_seekable(self):
+        with tempfile.TemporaryDirectory() as directory:
+            archive_path = Path(directory) / 'legacy.dfa'
+            archive_path.write_bytes(bytes.fromhex(LEGACY_ARCHIVE))
+            with self.assertRaises(errors.NotSeekableError):
+                Decompressor().read_range(archive_path, 0, 1)
+
+    def test_compress_with_dictionary(self):
+        samples = [b'{"event": "login", "user": "%d", "ok": true}\n' % number
+                   for number in range(100)]
+        message = b'{"event": "login", "user": "1000", "ok": true}\n'
+        for codec in ('lz77', 'deflate'):
+            lz77_codec = Compressor(codec=codec).create_lz77_codec() \
+                if codec == 'lz77' else None
+            dictionary = Dictionary.from_bytes(
+                train(samples, 256, lz77_codec).to_bytes())
+            self.assertIn(b'"event": "login"', dictionary.content)
+            plain = Compressor(codec=codec).compress(message, 'm')[0]
+            compressed = Compressor(codec=codec, dictionary=dictionary) \
+                .compress(message, 'm')[0]
+            self.assertLess(len(compressed), len(plain))
+            self.assertEqual(message, Decompressor(dictionary).decompress(
+                compressed)[1])
+            with self.assertRaises(errors.DictionaryRequiredError):
+                Decompressor().decompress(compressed)
+            with self.assertRaises(errors.WrongDictionaryError):
+                Decompressor(Dictionary(b'other')).decompress(compressed)
+            # независимые блоки разжимаются со словарем и без процессов
+            data = message * 100
+            compressed = io.BytesIO()
+            Compressor(codec=codec, dictionary=dictionary).compress_stream(
+                io.BytesIO(data), compressed, 'm', chunk_size=1024, jobs=1)
+            self.assertEqual(data, Decompressor(dictionary).decompress(
+                compressed.getvalue())[1])
+
+    def test_compress_zlib_with_dictionary(self):
+        dictionary = Dictionary(b'preset dictionary of zlib stream')
+        data = b'zlib stream with preset dictionary'
+        compressed = Compressor(container='zlib', dictionary=dictionary) \
+            .compress(data, 'file')[0]
+        decompressor = zlib.decompressobj(zdict=dictionary.content)
+        self.assertEqual(data, decompressor.decompress(compressed))
+        compressor = zlib.compressobj(zdict=dictionary.content)
+        compressed = compressor.compress(data) + compressor.flush()
+        self.assertEqual(data, Decompressor(dictionary).decompress(
+            compressed, 'zlib')[1])
+
+    def test_compress_directory(self):
+        files = {'a.txt': b'first file ' * 100, 'sub/b.bin': bytes(range(256)),
+                 'sub/deep/c.txt': b'', 'd.txt': b'last file ' * 300}
+        with tempfile.TemporaryDirectory() as directory:
+            source = Path(directory) / 'source'
+            for name, data in files.items():
+                (source / name).parent.mkdir(parents=True, exist_ok=True)
+                (source / name).write_bytes(data)
+            archive_path = Path(directory) / 'dir.dfa'
+            archives = []
+            for jobs in (None, 2):
+                with archive_path.open('wb') as dst:
+                    original_size = Compressor().compress_directory(
+                        source, dst, jobs)[0]
+                archives.append(archive_path.read_bytes())
+            self.assertEqual(archives[0], archives[1])
+            self.assertEqual(sum(map(len, files.values())), original_size)
+
+            decompressor = Decompressor()
+            self.assertTrue(decompressor.is_entries_archive(archive_path))
+            self.assertEqual(sorted((name, len(data))
+                                    for name, data in files.items()),
+                             decompressor.list_entries(archive_path))
+            entry = io.BytesIO()
+            decompressor.extract_entry(archive_path, 'sub/b.bin', entry)
+            self.assertEqual(files['sub/b.bin'], entry.getvalue())
+            with self.assertRaises(errors.EntryNotFoundError):
+                decompressor.extract_entry(archive_path, 'e.txt', entry)
+            with self.assertRaises(errors.EntriesArchiveError):
+                decompressor.decompress(archives[0])
+
+            for jobs in (None, 0, 2):
+                target = Path(directory) / 'target{}'.format(jobs)
+                self.assertEqual(sorted(files), decompressor.extract_all(
+                    archive_path, target, jobs))
+                for name, data in files.items():
+                    self.assertEqual(data, (target / name).read_bytes())
+
+    def test_compress_directory_memory(self):
+        # файл сжимается блоками сразу в архив, а не целиком в память
+        data = random.Random(0).randbytes(2 << 20)
+        with tempfile.TemporaryDirectory() as directory:
+            source = Path(directory) / 'source'
+            source.mkdir()
+            (source / 'big.bin').write_bytes(data)
+            archive_path = Path(directory) / 'dir.dfa'
+            for jobs in (None, 2):
+                with archive_path.open('wb') as dst:
+                    tracemalloc.start()
+                    try:
+                        Compressor().compress_directory(source, dst, jobs)
+                        peak = tracemalloc.get_traced_memory()[1]
+                    finally:
+                        tracemalloc.stop()
+                self.assertLess(peak, len(data))
+                entry = io.BytesIO()
+                Decompressor().extract_entry(archive_path, 'big.bin', entry)
+                self.assertEqual(data, entry.getvalue())
+
+    def test_compression_session(self):
+        records = [b'{"id": %d, "name": "record"}' % (index % 7)
+                   for index in range(50)]
+        for codec, container in (('lz77', 'dfa'), ('deflate', 'dfa'),
+                                 ('deflate', 'zlib')):
+            session = CompressionSession(codec=codec, container=container)
+            archives = list(session.compress_many(records))
+            for record, compressed in zip(records, archives):
+                self.assertEqual(record, Decompressor().decompress(
+                    compressed, container)[1])
+            self.assertIs(session.create_lz77_codec(),
+                          session.create_lz77_codec())
+        # повторяющиеся записи кодируются уже построенными таблицами
+        session = CompressionSession(tolerance=0)
+        archives = list(session.compress_many(records))
+        self.assertEqual(7, len(session.tables))
+        self.assertEqual(archives, list(compress_many(records,
+                                                      tolerance=0)))
+        self.assertEqual([Compressor().compress(record, '')[0]
+                          for record in records[:7]], archives[:7])
+
+    def test_compress_async(self):
+        data = b''.join(b'%d async line\n' % (index % 97)
+                        for index in range(2000))
+
+        class Reader:
+            def __init__(self, content: bytes):
+                self.src = io.BytesIO(content)
+
+            async def read(self, size: int = -1) -> bytes:
+                await asyncio.sleep(0)
+                return self.src.read(size)
+
+        class SlowWriter:
+            def __init__(self):
+                self.data = bytearray()
+                self.buffered = 0
+                self.max_buffered = 0
+
+            def write(self, chunk: bytes) -> None:
+                self.data.extend(chunk)
+                self.buffered += len(chunk)
+                self.max_buffered = max(self.max_buffered, self.buffered)
+
+            async def drain(self) -> None:
+                await asyncio.sleep(0.001)
+                self.buffered = 0
+
+        async def run():
+            compressed = (await Compressor().compress_async(data, 'a'))[0]
+            self.assertEqual(data, (await Decompressor().decompress_async(
+                compressed))[1])
+
+            writer = SlowWriter()
+            await Compressor(container='gzip').compress_stream_async(
+                Reader(data), writer, 'a', chunk_size=1024)
+            self.assertEqual(data, gzip.decompress(writer.data))
+            writer = SlowWriter()
+            original_size = (await Compressor().compress_stream_async(
+                Reader(data), writer, 'a', chunk_size=1024))[0]
+            self.assertEqual(len(data), original_size)
+            self.assertLessEqual(writer.max_buffered, 1024)
+
+            decoded = SlowWriter()
+            filename = await Decompressor().decompress_stream_async(
+                Reader(bytes(writer.data)), decoded)
+            self.assertEqual(Path('a'), filename)
+            self.assertEqual(data, decoded.data)
+            self.assertLessEqual(decoded.max_buffered, 1024)
+            # обычные файлы читаются и пишутся в потоке исполнителя
+            decoded = io.BytesIO()
+            await Decompressor().decompress_stream_async(
+                io.BytesIO(writer.data), decoded)
+            self.assertEqual(data, decoded.getvalue())
+
+        asyncio.run(run())
+
+    def test_compress_stats(self):
+        data = b'statistics of stages ' * 200 + bytes(range(256))
+        for codec, stages in (('lz77', {'read', 'checksum', 'precheck',
+                                        'lz77', 'serialize', 'huffman',
+                                        'pack', 'write'}),
+                              ('deflate', {'read', 'checksum', 'precheck',
+                                           'lz77', 'deflate', 'write'})):
+            compressor = Compressor(codec=codec, stats=True)
+            compressed = compressor.compress(data, 'a')[0]
+            self.assertEqual(Compressor(codec=codec).compress(data, 'a')[0],
+                             compressed)
+            stats = compressor.stats.to_dict()
+            self.assertEqual(stages, set(stats['stages']))
+            self.assertEqual(len(data), stats['stages']['lz77']['bytes_in'])
+            self.assertGreater(stats['matches'], 0)
+            self.assertEqual(stats['matches'],
+                             sum(stats['match_lengths'].values()))
+            self.assertEqual(stats['matches'],
+                             sum(stats['offsets'].values()))
+            block_types = stats['block_types']
+            self.assertEqual(block_types.get('dynamic', 0)
+                             if codec == 'deflate' else 1,
+                             stats['huffman']['tables'])
+        self.assertEqual(1, sum(block_types.values()))
+        self.assertIsNone(Compressor().stats)
+
+    def test_compress_split_blocks(self):
+        random.seed(20)
+        text = b' '.join(random.choice((b'split', b'block', b'table'))
+                         for _ in range(5000))
+        noise = bytes(random.getrandbits(8) for _ in range(20000))
+        data = text + noise + text
+        for codec in ('lz77', 'deflate'):
+            compressor = Compressor(codec=codec, stats=True)
+            compressed = compressor.compress(data, 'a')[0]
+            self.assertEqual(data, Decompressor().decompress(compressed)[1])
+            self.assertLess(len(compressed), len(noise) + len(text) // 2)
+            self.assertGreater(compressor.stats.block_types['dynamic'], 1)
+            # несжимаемые данные хранятся почти без увеличения
+            compressed = compressor.compress(noise[:5000], 'a')[0]
+            self.assertEqual(noise[:5000],
+                             Decompressor().decompress(compressed)[1])
+            self.assertLess(len(compressed), 5000 + 100)
+        compressed = Compressor(codec='deflate',
+                                container='zlib').compress(data, '')[0]
+        self.assertEqual(data, zlib.decompress(compressed))
+
+    def test_compress_incompressible(self):
+        random.seed(21)
+        noise = bytes(random.getrandbits(8) for _ in range(20000))
+        self.assertTrue(is_incompressible(noise))
+        self.assertFalse(is_incompressible(noise[:1000]))
+        self.assertFalse(is_incompressible(noise[:10000] * 2))
+        self.assertFalse(is_incompressible(b'text ' * 4000))
+        # случайные данные только в проверяемых окнах блока
+        block = bytearray(random.Random(0).randbytes(64 * 1024))
+        self.assertTrue(is_incompressible(bytes(block)))
+        for start in range(4096, len(block), 20480):
+            block[start:start + 16384] = (b'some text ' * 1639)[:16384]
+        self.assertFalse(is_incompressible(bytes(block)))
+        # повтор случайных данных между окнами
+        block = random.Random(0).randbytes(64 * 1024)
+        self.assertFalse(is_incompressible(
+            block[:8192] + block[:8192] + block[16384:]))
+        for codec in ('lz77', 'deflate'):
+            compressor = Compressor(codec=codec, stats=True)
+            compressed = compressor.compress(noise, 'a')[0]
+            self.assertEqual(noise, Decompressor().decompress(compressed)[1])
+            self.assertNotIn('lz77', compressor.stats.stages)
+            self.assertEqual({'stored': 1}, compressor.stats.block_types)
+        compressed = Compressor(container='gzip').compress(noise, 'a')[0]
+        self.assertEqual(noise, gzip.decompress(compressed))
+
+    def test_compress_wrong_codec(self):
+        with self.assertRaises(errors.UnknownCodecError):
+            Compressor(codec='zip')
+
+
+class TestCommandLine(unittest.TestCase):
+    def test_lazy_imports(self):
+        # разбор аргументов не импортирует кодеки, asyncio, json и hashlib
+        code = ('import sys\n'
+                'from deflate.__main__ import create_cmd_parser\n'
+                'create_cmd_parser().parse_args(["a.txt"])\n'
+                'print(" ".join(sorted(set(sys.modules) & {"asyncio",'
+                ' "json", "hashlib", "bitarray", "multiprocessing",'
+                ' "deflate.handlers.compressor"})))')
+        output = subprocess.run((sys.executable, '-c', code), check=True,
+                                capture_output=True, text=True,
+                                cwd=Path(__file__).parent.parent).stdout
+        self.assertEqual('', output.strip())
+
+    def test_negative_jobs(self):
+        parser = create_cmd_parser()
+        self.assertEqual(0, parser.parse_args(['a.txt', '-j', '0']).jobs)
+        with self.assertRaises(SystemExit), \
+                contextlib.redirect_stderr(io.StringIO()):
+            parser.parse_args(['a.txt', '-j', '-2'])
+
+    def test_batch(self):
+        # пустой файл и архив в списке не прерывают обработку
+        files = {'a.txt': b'first file ' * 100, 'b.bin': bytes(range(256)),
+                 'empty.txt': b'', 'keep.gz': gzip.compress(b'keep')}
+        with tempfile.TemporaryDirectory() as directory:
+            paths = [Path(directory) / name for name in files]
+            for path, data in zip(paths, files.values()):
+                path.write_bytes(data)
+            list_path = Path(directory) / 'list.txt'
+            list_path.write_text('\n'.join(map(str, paths)) + '\n\n')
+            parser = create_cmd_parser()
+            with contextlib.redirect_stdout(io.StringIO()):
+                args = parser.parse_args(['--batch', str(list_path)])
+                self.assertEqual(0, batch(args, args.batch))
+                for path, data in zip(paths, files.values()):
+                    archive_path = Path(f'{path}.dfa')
+                    self.assertEqual(data, Decompressor().decompress(
+                        archive_path.read_bytes())[1])
+                    self.assertEqual(data, path.read_bytes())
+                with self.assertRaises(errors.ArchiveOverSourceError):
+                    compress(str(paths[3]), str(paths[3]), None, None, None,
+                             None, '')
+                self.assertEqual(files['keep.gz'], paths[3].read_bytes())
+                list_path.write_text('\n'.join(
+                    [f'{paths[0]}.dfa', str(paths[1]), f'{paths[1]}.dfa']))
+                args = parser.parse_args(['-t', '--batch', str(list_path)])
+                with self.assertLogs(level='ERROR'):
+                    self.assertEqual(1, batch(args, args.batch))
+
+
+# архив, созданный до появления блочного формата
+LEGACY_ARCHIVE = (
+    '0a006c65676163792e74787464b21ad9704bc1974484574bba06a390e00000007b2239'
+    '37223a202230303030222c2022313138223a20223030303130222c202231223a202230'
+    '30303131222c2022313231223a20223030313030222c2022313035223a202230303130'
+    '31222c2022313134223a20223030313130222c202235223a20223030313131222c2022'
+    '313034223a20223031303030222c2022313033223a20223031303031222c2022313031'
+    '223a202230313031222c202237223a202230313130222c20223332223a202230313131'
+    '30222c2022313038223a2022303131313130222c20223939223a202230313131313122'
+    '2c202230223a202231227d67000000ded74e1bf9373306638d19716a'
+)